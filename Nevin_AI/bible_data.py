@@ -12,6 +12,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from tenacity import retry, stop_after_attempt, wait_exponential
 from models import BibleVerse, db
 from cache_manager import cache_manager
+from bible_books import BIBLE_DATASET_TAG
 
 # Configuración de logging estructurado
 logging.basicConfig(
@@ -48,7 +49,7 @@ class BibleData:
         try:
             # Verificar caché
             cache_key = f"search:{query}:{limit}"
-            cached_results = self.cache.get(cache_key)
+            cached_results = await self.cache.aget(cache_key, tags=[BIBLE_DATASET_TAG])
             if cached_results:
                 logger.info(f"Cache hit para búsqueda: {query}")
                 return cached_results
@@ -65,16 +66,16 @@ class BibleData:
             results = []
             for verse in verses:
                 result = {
-                    'content': verse.spanish_text,
-                    'content_tzotzil': verse.tzotzil_text,
-                    'reference': f"{verse.book} {verse.chapter}:{verse.verse}",
+                    'content': verse['spanish_text'],
+                    'content_tzotzil': verse['tzotzil_text'],
+                    'reference': f"{verse['book']} {verse['chapter']}:{verse['verse']}",
                     'score': self._calculate_relevance_score(verse, query),
                     'type': 'bible'
                 }
                 results.append(result)
 
             # Guardar en caché distribuido
-            self.cache.set(cache_key, results, ttl=900)  # 15 minutos TTL
+            await self.cache.aset(cache_key, results, ttl=900, tags=[BIBLE_DATASET_TAG])  # 15 minutos TTL
 
             # Registrar métricas
             logger.info(
@@ -100,9 +101,14 @@ class BibleData:
             )
             return []
 
-    @cache_manager.cached(ttl=3600)
-    def _execute_search(self, query: str, limit: int) -> List[BibleVerse]:
-        """Ejecuta la búsqueda en la base de datos con caché."""
+    @cache_manager.cached(ttl=3600, tags=[BIBLE_DATASET_TAG])
+    def _execute_search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Ejecuta la búsqueda en la base de datos con caché.
+
+        Devuelve dicts en lugar de objetos ORM para que el resultado pueda guardarse en
+        Redis y compartirse entre workers.
+        """
         try:
             # Construir consulta optimizada
             verses = BibleVerse.query.filter(
@@ -110,7 +116,16 @@ class BibleData:
                 (BibleVerse.tzotzil_text.ilike(f"%{query}%"))
             ).limit(limit).all()
 
-            return verses
+            return [
+                {
+                    'book': verse.book,
+                    'chapter': verse.chapter,
+                    'verse': verse.verse,
+                    'spanish_text': verse.spanish_text,
+                    'tzotzil_text': verse.tzotzil_text,
+                }
+                for verse in verses
+            ]
 
         except SQLAlchemyError as e:
             logger.error(
@@ -130,18 +145,20 @@ class BibleData:
             )
             return []
 
-    def _calculate_relevance_score(self, verse: BibleVerse, query: str) -> float:
+    def _calculate_relevance_score(self, verse: Dict[str, Any], query: str) -> float:
         """Calcula un score de relevancia para el versículo."""
         score = 1.0
+        spanish_text = verse['spanish_text'] or ''
+        tzotzil_text = verse['tzotzil_text'] or ''
 
         # Aumentar score si la coincidencia es exacta
-        if query.lower() in verse.spanish_text.lower():
+        if query.lower() in spanish_text.lower():
             score *= 1.2
-        if query.lower() in verse.tzotzil_text.lower():
+        if query.lower() in tzotzil_text.lower():
             score *= 1.2
 
         # Ajustar por longitud del versículo
-        text_length = len(verse.spanish_text) + len(verse.tzotzil_text)
+        text_length = len(spanish_text) + len(tzotzil_text)
         length_factor = 1.0 / (1.0 + (text_length / 500))
         score *= (1.0 + length_factor)
 
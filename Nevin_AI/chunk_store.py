@@ -0,0 +1,191 @@
+"""
+ChunkStore - Textos de los chunks de la base de conocimientos en un archivo columnar mapeable
+"""
+import logging
+import mmap
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHUNKS_FILE = 'chunks.bin'
+MAGIC = b'NVCHUNK1'
+_HEADER_SIZE = len(MAGIC) + 8
+
+
+class ChunkStore:
+    """
+    Textos de chunks indexados por id de vector, en un único archivo:
+
+        MAGIC | n (uint64) | offsets (n + 1 x uint64) | textos UTF-8 concatenados
+
+    El texto del chunk i ocupa blob[offsets[i]:offsets[i + 1]]. El archivo se abre con
+    mmap, así que abrirlo no lee nada y get_bytes() devuelve una vista sin copia; solo
+    decodificar a str copia el texto de ese chunk. Un chunk sin texto tiene longitud 0.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} no es un almacén de chunks")
+        self.count = int.from_bytes(self._mmap[len(MAGIC):_HEADER_SIZE], 'little')
+        self.offsets = np.frombuffer(self._mmap, dtype='<u8', count=self.count + 1, offset=_HEADER_SIZE)
+        self._blob_start = _HEADER_SIZE + 8 * (self.count + 1)
+        self._view = memoryview(self._mmap)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get_bytes(self, vector_id: int) -> Optional[memoryview]:
+        """Vista sin copia del texto UTF-8 de un chunk; None si no existe o está vacío."""
+        if vector_id < 0 or vector_id >= self.count:
+            return None
+        start, end = int(self.offsets[vector_id]), int(self.offsets[vector_id + 1])
+        if start == end:
+            return None
+        return self._view[self._blob_start + start:self._blob_start + end]
+
+    def get(self, vector_id: int) -> Optional[str]:
+        data = self.get_bytes(vector_id)
+        return str(data, 'utf-8') if data is not None else None
+
+    def close(self):
+        del self.offsets
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    @staticmethod
+    def write(path: str, texts: Iterable[Optional[str]]) -> int:
+        """
+        Escribe los textos en orden de id (None para chunks sin texto).
+
+        Returns:
+            Número de chunks escritos
+        """
+        encoded = [text.encode('utf-8') if text else b'' for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(encoded).to_bytes(8, 'little'))
+            f.write(offsets.tobytes())
+            for data in encoded:
+                f.write(data)
+        os.replace(tmp_path, path)
+        return len(encoded)
+
+
+class _PickledDocstore:
+    """Sustituto de InMemoryDocstore de LangChain: solo conserva {id: documento}."""
+
+    def search(self, doc_id: str) -> Any:
+        return self.__dict__.get('_dict', {}).get(doc_id)
+
+
+class _PickledDocument:
+    """Sustituto de Document de LangChain (modelo pydantic): texto y metadatos."""
+
+    def __setstate__(self, state: Dict[str, Any]):
+        fields = state.get('__dict__', state) if isinstance(state, dict) else {}
+        self.page_content = fields.get('page_content')
+        self.metadata = fields.get('metadata') or {}
+
+
+class RestrictedUnpickler(pickle.Unpickler):
+    """
+    Unpickler de los .pkl de la base de conocimientos que no ejecuta código arbitrario.
+
+    Solo resuelve las clases de LangChain que aparecen en esos archivos, y las resuelve a
+    sustitutos locales (no hace falta tener LangChain instalado), además de set y frozenset
+    (protocolos anteriores al 4 los guardan como referencia global). Cualquier otra clase o
+    función referenciada por el archivo eleva UnpicklingError.
+    """
+
+    ALLOWED = {
+        ('builtins', 'set'): set,
+        ('builtins', 'frozenset'): frozenset,
+        ('langchain_community.docstore.in_memory', 'InMemoryDocstore'): _PickledDocstore,
+        ('langchain.docstore.in_memory', 'InMemoryDocstore'): _PickledDocstore,
+        ('langchain_core.documents.base', 'Document'): _PickledDocument,
+        ('langchain.schema.document', 'Document'): _PickledDocument,
+        ('langchain.docstore.document', 'Document'): _PickledDocument,
+    }
+
+    def find_class(self, module: str, name: str):
+        if module == '__builtin__':  # nombre de Python 2 en los protocolos 0-2
+            module = 'builtins'
+        try:
+            return self.ALLOWED[(module, name)]
+        except KeyError:
+            raise pickle.UnpicklingError(f"Clase no permitida en metadatos de chunks: {module}.{name}")
+
+
+def load_pickled_chunks(path: str) -> Any:
+    """Carga un .pkl de metadatos con RestrictedUnpickler."""
+    with open(path, 'rb') as f:
+        return RestrictedUnpickler(f).load()
+
+
+def pickled_chunk_texts(data: Any, count: int) -> List[Optional[str]]:
+    """
+    Textos de los chunks 0..count-1 de un .pkl ya cargado.
+
+    Admite la tupla (docstore, index_to_docstore_id) de LangChain y listas de textos.
+    """
+    if isinstance(data, tuple) and len(data) == 2 and hasattr(data[0], 'search'):
+        docstore, id_map = data
+        texts = []
+        for idx in range(count):
+            doc = docstore.search(id_map.get(idx)) if idx in id_map else None
+            texts.append(getattr(doc, 'page_content', None))
+        return texts
+    return [str(data[idx]) if idx < len(data) else None for idx in range(count)]
+
+
+def convert_pickles(books: List[Dict], sources: Dict[str, str], path: str) -> Dict[str, int]:
+    """
+    Convierte los .pkl por obra en un ChunkStore con el orden de ids del índice unificado.
+
+    Args:
+        books: Tabla de obras del manifiesto ({'source', 'book', 'start', 'count'}) en orden de id
+        sources: {fuente: directorio} donde están los <obra>.pkl
+        path: Archivo de salida
+
+    Returns:
+        {'chunks': n, 'missing': chunks sin texto, 'books_without_data': n}
+    """
+    texts: List[Optional[str]] = []
+    books_without_data = 0
+    for book in books:
+        pkl_file = Path(sources[book['source']]) / f"{book['book']}.pkl"
+        book_texts: List[Optional[str]] = [None] * book['count']
+        if pkl_file.exists():
+            try:
+                book_texts = pickled_chunk_texts(load_pickled_chunks(str(pkl_file)), book['count'])
+            except Exception as e:
+                logger.warning(f"Error convirtiendo {pkl_file}: {str(e)}")
+                books_without_data += 1
+        else:
+            books_without_data += 1
+        if len(texts) != book['start']:
+            raise ValueError(f"La obra {book['book']} no empieza en el id {len(texts)}")
+        texts.extend(book_texts)
+
+    ChunkStore.write(path, texts)
+    return {
+        'chunks': len(texts),
+        'missing': sum(1 for text in texts if not text),
+        'books_without_data': books_without_data,
+    }
@@ -0,0 +1,135 @@
+"""
+EmbeddingProviders - Proveedores de embeddings intercambiables para la base de conocimientos
+"""
+import hashlib
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Proveedor por defecto: 'openai', 'local' o 'hashing'
+DEFAULT_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "openai")
+OPENAI_MODEL = os.environ.get("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+LOCAL_MODEL = os.environ.get("LOCAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+# Dimensión de text-embedding-ada-002, la de los índices FAISS de la base de conocimientos
+DEFAULT_DIMENSION = 1536
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class EmbeddingProvider(ABC):
+    """
+    Convierte textos en vectores float32 de forma (n, dimension).
+
+    `model` identifica el espacio de embeddings: las claves del almacén de embeddings
+    lo incluyen, así que dos proveedores nunca comparten entradas.
+    """
+
+    model: str = ''
+    dimension: int = 0
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embeddings de los textos, una fila por texto."""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings de la API de OpenAI, con una petición por cada `batch_size` textos."""
+
+    def __init__(self, model: str = OPENAI_MODEL, dimension: int = DEFAULT_DIMENSION,
+                 batch_size: int = 2048, client=None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI()
+        self.client = client
+        self.model = model
+        self.dimension = dimension
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.embeddings.create(model=self.model,
+                                                     input=texts[start:start + self.batch_size])
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return np.array(vectors, dtype='float32').reshape(len(texts), -1)
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    Modelo de sentence-transformers ejecutado en CPU, sin red ni claves.
+
+    Sus vectores no son comparables con los de OpenAI: para buscar con él hay que
+    construir el índice con el mismo modelo.
+    """
+
+    def __init__(self, model: str = LOCAL_MODEL, device: str = 'cpu', batch_size: int = 64):
+        if SentenceTransformer is None:
+            raise RuntimeError("sentence-transformers no está instalado (pip install sentence-transformers)")
+        self._model = SentenceTransformer(model, device=device)
+        self.model = model
+        self.dimension = self._model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(list(texts), batch_size=self.batch_size,
+                                     normalize_embeddings=True, convert_to_numpy=True)
+        return np.asarray(vectors, dtype='float32').reshape(len(texts), self.dimension)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Embeddings deterministas por hashing de palabras, sin modelo ni red.
+
+    Cada palabra (en minúsculas) suma ±1 en una posición elegida por su hash y el vector
+    se normaliza, así que textos con palabras en común quedan cerca. No captura
+    semántica: sirve para pruebas y benchmarks de latencia sin conexión, con la
+    dimensión de los índices reales.
+    """
+
+    def __init__(self, dimension: int = DEFAULT_DIMENSION, seed: int = 0):
+        self.dimension = dimension
+        self.seed = seed
+        self.model = f"hashing-{dimension}-{seed}"
+
+    def _token_slot(self, token: str):
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8,
+                                 key=self.seed.to_bytes(8, 'little')).digest()
+        value = int.from_bytes(digest, 'little')
+        return value % self.dimension, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for token in _TOKEN_PATTERN.findall(text.lower()):
+                slot, sign = self._token_slot(token)
+                vectors[row, slot] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+
+PROVIDERS = {
+    'openai': OpenAIEmbeddingProvider,
+    'local': LocalEmbeddingProvider,
+    'hashing': HashingEmbeddingProvider,
+}
+
+
+def provider_from_env(name: Optional[str] = None) -> EmbeddingProvider:
+    """Proveedor indicado (o EMBEDDING_PROVIDER) con su configuración por defecto."""
+    name = (name or DEFAULT_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Proveedor de embeddings desconocido: {name} (opciones: {', '.join(PROVIDERS)})")
+    return PROVIDERS[name]()
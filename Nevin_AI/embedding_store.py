@@ -0,0 +1,120 @@
+"""
+EmbeddingStore - Embeddings persistentes en disco, compartidos por workers y reinicios
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from cache_keys import stable_digest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = os.environ.get("EMBEDDING_STORE_PATH", "instance/embeddings.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (model, digest)
+) WITHOUT ROWID;
+"""
+
+
+class EmbeddingStore:
+    """
+    Embeddings en un archivo SQLite (modo WAL) con clave (modelo, digest del texto).
+
+    El embedding de un texto con un modelo dado no cambia, así que las entradas no
+    expiran: una pregunta repetida no vuelve a pagar la latencia ni el coste de la API,
+    tampoco tras un reinicio o en otro worker del mismo host. Los vectores se guardan en
+    float16 (la mitad de espacio; el error relativo, ~1e-3, no altera el orden de los
+    resultados) y se devuelven en float32.
+
+    El almacén es una optimización: si SQLite falla se registra el error y las lecturas
+    se tratan como fallos de caché.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión del hilo actual; se reabre tras un fork (p. ej. workers de gunicorn)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Embeddings guardados de cada texto (float32), o None si no están."""
+        digests = [stable_digest(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        try:
+            conn = self._connection()
+            unique = list(dict.fromkeys(digests))
+            # SQLite limita el número de parámetros por consulta
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT digest, dim, vector FROM embeddings WHERE model = ? "
+                    f"AND digest IN ({','.join('?' * len(chunk))})",
+                    (model, *chunk)
+                ).fetchall()
+                for digest, dim, vector in rows:
+                    found[digest] = np.frombuffer(vector, dtype='<f2', count=dim).astype('float32')
+        except sqlite3.Error as e:
+            logger.warning(f"Error leyendo embeddings de {self.path}: {str(e)}")
+        return [found.get(digest) for digest in digests]
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: np.ndarray) -> int:
+        """
+        Guarda los embeddings de los textos (una fila de `vectors` por texto).
+
+        Returns:
+            Número de embeddings escritos
+        """
+        vectors = np.asarray(vectors, dtype='<f2').reshape(len(texts), -1)
+        now = time.time()
+        rows = [(model, stable_digest(text), vectors.shape[1], vector.tobytes(), now)
+                for text, vector in zip(texts, vectors)]
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, digest, dim, vector, created) "
+                    "VALUES (?, ?, ?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Error guardando embeddings en {self.path}: {str(e)}")
+            return 0
+        return len(rows)
+
+    def info(self) -> Dict[str, object]:
+        """Embeddings guardados por modelo, para diagnóstico."""
+        rows = self._connection().execute(
+            "SELECT model, COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings GROUP BY model"
+        ).fetchall()
+        return {
+            'path': self.path,
+            'models': {model: {'entries': entries, 'bytes': size} for model, entries, size in rows},
+        }
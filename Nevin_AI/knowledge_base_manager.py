@@ -8,12 +8,17 @@ from faiss import IndexFlatL2
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import os
-from openai import OpenAI
-from cachetools import TTLCache, LRUCache
+from cachetools import LRUCache
 from datetime import datetime, timedelta
 import asyncio
-from functools import lru_cache
-import pickle
+import threading
+from cache_manager import cache_manager
+from cache_keys import stable_digest
+from Nevin_AI.chunk_store import load_pickled_chunks
+from Nevin_AI.embedding_providers import EmbeddingProvider, provider_from_env
+from Nevin_AI.embedding_store import DEFAULT_STORE_PATH, EmbeddingStore
+from Nevin_AI.knowledge_index import (DEFAULT_INDEX_DIR, KNOWLEDGE_BASE_TAG, SEARCH_TIMEOUT, ChunkRef,
+                                      KnowledgeIndex, matches_filters, open_index)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,26 +27,43 @@ logger = logging.getLogger(__name__)
 class KnowledgeBaseManager:
     """Gestiona búsquedas en la base de conocimientos teológicos usando FAISS."""
 
-    def __init__(self, egw_dir: str = "nevin_knowledge", other_dir: str = "other_authors"):
+    def __init__(self, egw_dir: str = "nevin_knowledge", other_dir: str = "other_authors",
+                 index_dir: Optional[str] = DEFAULT_INDEX_DIR,
+                 embedding_store_path: Optional[str] = DEFAULT_STORE_PATH,
+                 embedding_provider: Optional[EmbeddingProvider] = None):
         """
         Inicializa el gestor de la base de conocimientos.
         
         Args:
             egw_dir: Directorio que contiene los archivos FAISS de EGW
             other_dir: Directorio que contiene los archivos FAISS de otros autores
+            index_dir: Directorio del índice unificado (python -m Nevin_AI.knowledge_index);
+                si no existe se busca obra por obra en los índices de egw_dir y other_dir
+            embedding_store_path: Archivo SQLite de embeddings persistentes (None lo desactiva)
+            embedding_provider: Proveedor de embeddings; por defecto el de EMBEDDING_PROVIDER
         """
         self.egw_dir = Path(egw_dir)
         self.other_dir = Path(other_dir)
-        self.client = OpenAI()
+        self.index_dir = Path(index_dir) if index_dir else None
+        self.embedder = embedding_provider or provider_from_env()
+        self.knowledge_index: Optional[KnowledgeIndex] = None
         self.faiss_indexes = {'egw': {}, 'other': {}}
+        # Metadatos (.pkl) por obra: se cargan en el primer uso, no al arrancar
         self.faiss_data = {'egw': {}, 'other': {}}
+        self._data_files: Dict[str, Dict[str, Path]] = {'egw': {}, 'other': {}}
+        self._data_lock = threading.Lock()
         self.faiss_index_path = {'egw': self.egw_dir, 'other': self.other_dir}
 
-        # Sistema de caché multinivel
-        self.embeddings_cache = TTLCache(maxsize=1000,
-                                         ttl=3600)  # Caché de embeddings
-        self.results_cache = TTLCache(maxsize=500,
-                                      ttl=3600)  # Caché de resultados
+        # Embeddings ya calculados, persistentes y compartidos entre workers
+        self.embedding_store: Optional[EmbeddingStore] = None
+        if embedding_store_path:
+            try:
+                self.embedding_store = EmbeddingStore(embedding_store_path)
+            except Exception as e:
+                logger.warning(f"Almacén de embeddings no disponible ({embedding_store_path}): {str(e)}")
+
+        # Caché multinivel compartido entre workers (resultados de búsqueda)
+        self.cache = cache_manager
         self.frequent_queries = LRUCache(
             maxsize=100)  # Caché de consultas frecuentes
 
@@ -54,10 +76,21 @@ class KnowledgeBaseManager:
         """
         try:
             self._load_faiss_indexes()
-            if not self.faiss_indexes['egw'] and not self.faiss_indexes['other']:
+            if not self._has_indexes():
                 logger.error("No se pudieron cargar los índices FAISS")
                 return False
-                
+
+            dimension = (self.knowledge_index.dimension if self.knowledge_index is not None else
+                         next(index.d for indexes in self.faiss_indexes.values() for index in indexes.values()))
+            if dimension != self.embedder.dimension:
+                logger.error(f"El proveedor de embeddings {self.embedder.model} genera vectores de "
+                             f"dimensión {self.embedder.dimension} y los índices tienen {dimension}")
+                return False
+
+            if self.knowledge_index is not None:
+                logger.info(f"FAISS inicializado exitosamente: índice unificado con "
+                            f"{self.knowledge_index.ntotal} vectores de {len(self.knowledge_index.books)} obras")
+                return True
             logger.info(f"FAISS inicializado exitosamente: {len(self.faiss_indexes['egw'])} índices EGW y {len(self.faiss_indexes['other'])} índices de otros autores cargados")
             return True
             
@@ -76,6 +109,12 @@ class KnowledgeBaseManager:
     def _load_faiss_indexes(self):
         """Carga los índices FAISS desde el directorio de conocimiento."""
         try:
+            if self.index_dir is not None and KnowledgeIndex.exists(self.index_dir):
+                try:
+                    self.knowledge_index = KnowledgeIndex.load(self.index_dir)
+                except Exception as e:
+                    logger.warning(f"Error cargando índice unificado {self.index_dir}: {str(e)}")
+
             if not os.path.exists(self.egw_dir) or not os.path.exists(self.other_dir):
                 logger.error("Directorios de índices FAISS no encontrados")
                 return False
@@ -104,19 +143,20 @@ class KnowledgeBaseManager:
                 for index_file in index_files:
                     try:
                         base_name = index_file.stem
-                        index = faiss.read_index(str(index_file))
+                        # Con el índice unificado solo hacen falta los textos de los chunks
+                        # (y ni eso si ya están convertidos en chunks.bin)
+                        if self.knowledge_index is None:
+                            index = open_index(index_file)
 
-                        if not index.is_trained:
-                            logger.warning(f"Índice {base_name} para {source} no está entrenado")
-                            continue
+                            if not index.is_trained:
+                                logger.warning(f"Índice {base_name} para {source} no está entrenado")
+                                continue
 
-                        self.faiss_indexes[source][base_name] = index
+                            self.faiss_indexes[source][base_name] = index
 
                         pkl_file = index_file.with_suffix('.pkl')
                         if pkl_file.exists():
-                            with open(str(pkl_file), 'rb') as f:
-                                self.faiss_data[source][base_name] = pickle.load(f)
-
+                            self._data_files[source][base_name] = pkl_file
 
                     except Exception as e:
                         logger.warning(
@@ -128,44 +168,154 @@ class KnowledgeBaseManager:
             logger.info(
                 "El sistema continuará funcionando con capacidades reducidas")
 
-    async def _generate_embedding_async(self,
-                                        text: str) -> Optional[List[float]]:
-        """Genera embedding usando OpenAI de forma asíncrona con caché."""
-        try:
-            # Verificar caché de embeddings
-            if text in self.embeddings_cache:
-                logger.debug(f"Embedding encontrado en caché para: {text}")
-                return self.embeddings_cache[text]
+    def get_chunk_text(self, source: str, index_name: str, idx: int) -> Optional[str]:
+        """
+        Obtiene el texto de un chunk a partir de su posición en el índice FAISS.
 
-            # Generar embedding de forma asíncrona
-            try:
-                response = await asyncio.to_thread(
-                    self.client.embeddings.create,
-                    model="text-embedding-ada-002",
-                    input=text)
+        Con el índice unificado se lee del ChunkStore (chunks.bin). Si no, de los .pkl, que
+        pueden ser una lista de textos o la tupla (docstore, index_to_docstore_id) que
+        guarda LangChain; ambos formatos se resuelven aquí.
+        """
+        if self.knowledge_index is not None and self.knowledge_index.chunks is not None:
+            vector_id = self.knowledge_index.vector_id(source, index_name, idx)
+            return self.knowledge_index.chunk_text(vector_id) if vector_id is not None else None
 
-                if not response.data:
+        data = self._book_data(source, index_name)
+        if data is None or idx < 0:
+            return None
+        try:
+            if isinstance(data, tuple) and len(data) == 2 and hasattr(data[0], 'search'):
+                docstore, id_map = data
+                doc_id = id_map.get(idx)
+                if doc_id is None:
                     return None
+                doc = docstore.search(doc_id)
+                return getattr(doc, 'page_content', None)
+            if idx < len(data):
+                return str(data[idx])
+        except Exception as e:
+            logger.warning(f"Error resolviendo chunk {idx} de {source}/{index_name}: {str(e)}")
+        return None
+
+    def _book_data(self, source: str, index_name: str) -> Any:
+        """Metadatos de una obra; se cargan una sola vez, en el primer chunk que se pide."""
+        books = self.faiss_data.setdefault(source, {})
+        if index_name in books:
+            return books[index_name]
+        with self._data_lock:
+            if index_name not in books:
+                data = None
+                pkl_file = self._data_files.get(source, {}).get(index_name)
+                if pkl_file is not None:
+                    try:
+                        data = load_pickled_chunks(str(pkl_file))
+                    except Exception as e:
+                        logger.warning(f"Error cargando metadatos de {source}/{index_name}: {str(e)}")
+                # Un fallo también se recuerda para no releer el archivo en cada búsqueda
+                books[index_name] = data
+        return books[index_name]
+
+    def iter_chunks(self):
+        """Itera sobre todos los chunks cargados como (source, index_name, idx, texto)."""
+        if self.knowledge_index is not None:
+            books = [(b['source'], b['book'], b['count']) for b in self.knowledge_index.iter_books()]
+        else:
+            books = [(source, index_name, index.ntotal)
+                     for source, indexes in self.faiss_indexes.items()
+                     for index_name, index in indexes.items()]
+        for source, index_name, count in books:
+            for idx in range(count):
+                content = self.get_chunk_text(source, index_name, idx)
+                if content:
+                    yield source, index_name, idx, content
+
+    def _has_indexes(self) -> bool:
+        return self.knowledge_index is not None or any(self.faiss_indexes.values())
+
+    def _search_vectors(self, query_vectors: np.ndarray, k: int, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None,
+                        timeout: Optional[float] = SEARCH_TIMEOUT,
+                        filters: Optional[Dict[str, Any]] = None) -> Tuple[List[List[Tuple[float, ChunkRef]]], int]:
+        """
+        Top-k global de cada consulta como [(distancia, (fuente, obra, chunk))], de menor a mayor
+        distancia, y el número de shards omitidos por el plazo en esta búsqueda.
 
-                embedding = response.data[0].embedding
-
-                # Guardar en caché
-                self.embeddings_cache[text] = embedding
-                return embedding
-
-            except Exception as e:
-                logger.error(f"Error generando embedding asíncrono: {str(e)}")
-                return None
+        Todas las consultas (matriz nq x d) van en la misma llamada a FAISS. Con el índice
+        unificado es una sola llamada (nprobe y ef_search ajustan los índices IVF y HNSW,
+        timeout es el plazo para los shards y filters se aplica dentro de FAISS); sin él,
+        una por obra con búsqueda exacta, solo en las obras que cumplen los filtros.
+        """
+        if self.knowledge_index is not None:
+            D, I, skipped = self.knowledge_index.search_with_skipped(query_vectors, k, nprobe=nprobe,
+                                                                     ef_search=ef_search, timeout=timeout,
+                                                                     filters=filters)
+            return [[(float(distance), ref)
+                     for distance, ref in zip(row_D, self.knowledge_index.locate(row_I))
+                     if ref is not None]
+                    for row_D, row_I in zip(D, I)], skipped
+
+        hits: List[List[Tuple[float, ChunkRef]]] = [[] for _ in range(len(query_vectors))]
+        for source, indexes in self.faiss_indexes.items():
+            for index_name, index in indexes.items():
+                if filters and not matches_filters({'source': source, 'book': index_name}, filters):
+                    continue
+                try:
+                    D, I = index.search(query_vectors, k)
+                    for query_hits, row_D, row_I in zip(hits, D, I):
+                        query_hits.extend((float(distance), (source, index_name, int(idx)))
+                                          for distance, idx in zip(row_D, row_I) if idx >= 0)
+                except Exception as e:
+                    logger.warning(f"Error en índice {index_name} de {source}: {str(e)}")
+        return [sorted(query_hits, key=lambda hit: hit[0])[:k] for query_hits in hits], 0
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeddings de varios textos. Los que ya están en el almacén no se piden; el resto
+        (sin repetidos) se pide al proveedor en una sola llamada y se guarda.
+        """
+        model = self.embedder.model
+        stored = ([None] * len(texts) if self.embedding_store is None
+                  else self.embedding_store.get_many(model, texts))
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, stored) if vector is None))
+        if missing:
+            new = self.embedder.embed(missing)
+            if self.embedding_store:
+                self.embedding_store.put_many(model, missing, new)
+                # Misma precisión que al leerlos del almacén: una consulta puntúa igual
+                # la primera vez y las siguientes
+                new = np.asarray(new, dtype='float16').astype('float32')
+            computed = dict(zip(missing, new))
+            stored = [vector if vector is not None else computed[text] for text, vector in zip(texts, stored)]
+        else:
+            logger.debug(f"{len(texts)} embeddings encontrados en el almacén")
+        return np.array(stored, dtype='float32').reshape(len(texts), -1)
+
+    def _knowledge_results(self, hits: List[Tuple[float, ChunkRef]]) -> List[Dict[str, Any]]:
+        results = []
+        for distance, (source, index_name, idx) in hits:
+            content = self.get_chunk_text(source, index_name, idx)
+            if content is not None:
+                results.append({
+                    'content': content,
+                    'metadata': {'source': source, 'index': index_name},
+                    'score': 1.0 - (distance / 2.0)
+                })
+        return results
 
+    async def _generate_embedding_async(self,
+                                        text: str) -> Optional[List[float]]:
+        """Genera el embedding de un texto de forma asíncrona, usando el almacén de embeddings."""
+        try:
+            vectors = await asyncio.to_thread(self._embed_texts, [text])
+            return vectors[0].tolist() if len(vectors) else None
         except Exception as e:
-            logger.error(f"Error en _generate_embedding_async: {str(e)}")
+            logger.error(f"Error generando embedding asíncrono: {str(e)}")
             return None
 
-    @lru_cache(maxsize=100)
-    def _get_cached_search_results(
+    async def _get_cached_search_results(
             self, cache_key: str) -> Optional[List[Dict[str, Any]]]:
         """Obtiene resultados cacheados de búsqueda."""
-        return self.results_cache.get(cache_key)
+        return await self.cache.aget(cache_key, tags=[KNOWLEDGE_BASE_TAG])
 
     async def _process_search_queue(self):
         """Procesa la cola de búsquedas pendientes."""
@@ -179,68 +329,86 @@ class KnowledgeBaseManager:
             finally:
                 self.processing_queue.task_done()
 
-    def search_knowledge_base(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Busca en la base de conocimientos de forma síncrona."""
-        try:
-            if not self.faiss_indexes['egw'] and not self.faiss_indexes['other']:
-                logger.info("No hay índices FAISS disponibles")
-                return []
+    def search_knowledge_base(self, query: str, top_k: int = 3, nprobe: Optional[int] = None,
+                              ef_search: Optional[int] = None,
+                              timeout: Optional[float] = SEARCH_TIMEOUT,
+                              filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Busca en la base de conocimientos de forma síncrona.
 
-            # Generar embedding de forma síncrona
-            response = self.client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=query)
-            
-            query_embedding = response.data[0].embedding
-            query_vector = np.array(query_embedding).reshape(1, -1).astype('float32')
+        nprobe (IVF) y ef_search (HNSW) cambian el equilibrio entre recall y latencia solo
+        para esta consulta; por defecto se usan los del índice. Con timeout, los shards que no
+        responden a tiempo se omiten. filters limita la búsqueda por fuente, obra o idioma,
+        p. ej. {'book': 'El Conflicto de los Siglos'}.
+        """
+        return self.search_batch([query], top_k, nprobe, ef_search, timeout, filters)[0]
 
-            results = []
-            for source, indexes in self.faiss_indexes.items():
-                for index_name, index in indexes.items():
-                    try:
-                        D, I = index.search(query_vector, top_k)
-                        if index_name in self.faiss_data[source]:
-                            data = self.faiss_data[source][index_name]
-                            for i, (distance, idx) in enumerate(zip(D[0], I[0])):
-                                if idx < len(data):
-                                    score = 1.0 - (distance / 2.0)
-                                    results.append({
-                                        'content': str(data[idx]),
-                                        'metadata': {'source': source, 'index': index_name},
-                                        'score': float(score)
-                                    })
-                    except Exception as e:
-                        logger.warning(f"Error en índice {index_name} de {source}: {str(e)}")
-                        continue
+    def search_batch(self, queries: List[str], top_k: int = 3, nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None,
+                     timeout: Optional[float] = SEARCH_TIMEOUT,
+                     filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Busca varias consultas a la vez: una petición de embeddings y una búsqueda FAISS con nq > 1.
 
-            return sorted(results, key=lambda x: x['score'], reverse=True)[:top_k]
+        Args:
+            queries: Consultas (p. ej. las partes de una pregunta o sus expansiones)
+            top_k: Resultados por consulta
+            nprobe: Listas visitadas si el índice es IVF
+            ef_search: Amplitud de búsqueda si el índice es HNSW
+            timeout: Segundos máximos de espera por los shards del índice
+            filters: {'source' | 'book' | 'language': valor o lista de valores}
 
-        except Exception as e:
-            logger.error(f"Error en search_knowledge_base: {str(e)}")
+        Returns:
+            Una lista de resultados por consulta, en el mismo orden que `queries`
+        """
+        if not queries:
             return []
+        try:
+            if not self._has_indexes():
+                logger.info("No hay índices FAISS disponibles")
+                return [[] for _ in queries]
+
+            query_vectors = self._embed_texts(list(queries))
+            hits, _ = self._search_vectors(query_vectors, top_k, nprobe, ef_search, timeout, filters)
+            return [self._knowledge_results(query_hits) for query_hits in hits]
+
+        except Exception as e:
+            logger.error(f"Error en search_batch: {str(e)}")
+            return [[] for _ in queries]
 
     async def search_related_content(
             self,
             query: str,
-            threshold: float = 0.5) -> Tuple[List[Dict[str, Any]], bool]:
+            threshold: float = 0.5,
+            top_k: int = 10,
+            nprobe: Optional[int] = None,
+            ef_search: Optional[int] = None,
+            timeout: Optional[float] = SEARCH_TIMEOUT,
+            filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
         """
         Busca contenido teológico relacionado usando FAISS con caché y procesamiento asíncrono.
         
         Args:
             query: Texto a buscar
-            threshold: Umbral de similitud mínimo
+            threshold: Distancia L2 máxima de los resultados
+            top_k: Candidatos más cercanos (en toda la base) antes de aplicar el umbral
+            nprobe: Listas visitadas si el índice es IVF
+            ef_search: Amplitud de búsqueda si el índice es HNSW
+            timeout: Segundos máximos de espera por los shards del índice
+            filters: {'source' | 'book' | 'language': valor o lista de valores}
             
         Returns:
             Tuple[List[Dict[str, Any]], bool]: (resultados, from_cache)
         """
         try:
             # Verificar caché de consultas frecuentes
-            cache_key = f"{query}_{threshold}"
-            if cache_key in self.results_cache:
+            cache_key = f"retrieval:{stable_digest([query, threshold, top_k, nprobe, ef_search, filters])}"
+            cached_results = await self._get_cached_search_results(cache_key)
+            if cached_results is not None:
                 logger.info(f"Resultado encontrado en caché para: {query}")
-                return self.results_cache[cache_key], True
+                return cached_results, True
 
-            if not self.faiss_indexes['egw'] and not self.faiss_indexes['other']:
+            if not self._has_indexes():
                 logger.info(
                     "No hay índices FAISS disponibles para la búsqueda")
                 return [], False
@@ -255,39 +423,28 @@ class KnowledgeBaseManager:
             query_vector = np.array(query_embedding).reshape(
                 1, -1).astype('float32')
 
-            for source, indexes in self.faiss_indexes.items():
-                for index_name, index in indexes.items():
-                    try:
-                        D, I = index.search(query_vector, k=5)
-
-                        if index_name in self.faiss_data[source]:
-                            data = self.faiss_data[source][index_name]
-                            for i, (distance, idx) in enumerate(zip(D[0], I[0])):
-                                if idx < len(data) and distance < threshold:
-                                    score = 1.0 - (distance / 2.0)
-                                    content = str(data[idx])
-                                    # Verificar si el contenido es un UUID
-                                    if len(content) == 36 and '-' in content:
-                                        continue
-                                    results.append({
-                                        'content': content,
-                                        'source': f"{source}/{index_name}",
-                                        'index': index_name,
-                                        'score': float(score),
-                                        'type': 'theological'
-                                    })
-
-                    except Exception as e:
-                        logger.warning(
-                            f"Error buscando en índice {index_name} de {source}: {str(e)}")
-                        continue
-
-            sorted_results = sorted(results,
-                                    key=lambda x: x['score'],
-                                    reverse=True)
-            # Guardar en caché antes de retornar
-            self.results_cache[cache_key] = sorted_results
-            return sorted_results, False
+            hits, skipped = await asyncio.to_thread(self._search_vectors, query_vector, top_k, nprobe,
+                                                    ef_search, timeout, filters)
+            partial = skipped > 0
+            for distance, (source, index_name, idx) in hits[0]:
+                if distance >= threshold:
+                    break
+                content = self.get_chunk_text(source, index_name, idx)
+                # Descartar chunks sin texto o cuyo contenido es un UUID
+                if content is None or (len(content) == 36 and '-' in content):
+                    continue
+                results.append({
+                    'content': content,
+                    'source': f"{source}/{index_name}",
+                    'index': index_name,
+                    'score': 1.0 - (distance / 2.0),
+                    'type': 'theological'
+                })
+
+            # Guardar en caché antes de retornar, salvo si algún shard no respondió a tiempo
+            if not partial:
+                await self.cache.aset(cache_key, results, ttl=3600, tags=[KNOWLEDGE_BASE_TAG])
+            return results, False
 
         except Exception as e:
             logger.warning(f"Error en búsqueda teológica: {str(e)}")
@@ -0,0 +1,558 @@
+"""
+KnowledgeIndex - Índice FAISS unificado de todas las obras de la base de conocimientos
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from Nevin_AI.chunk_store import CHUNKS_FILE, ChunkStore, convert_pickles
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.environ.get("KNOWLEDGE_INDEX_DIR", "instance/knowledge_index")
+DEFAULT_SOURCES = {'egw': 'Nevin_AI/nevin_knowledge', 'other': 'other_authors'}
+MANIFEST_NAME = 'manifest.json'
+FORMAT_VERSION = 1
+INDEX_TYPES = ('flat', 'ivf', 'hnsw', 'sq8', 'ivfpq')
+RERANK_FILE = 'vectors_f16.npy'
+# Abrir los shards con mmap: arranque inmediato y páginas compartidas entre workers
+MMAP_ENABLED = os.environ.get("KNOWLEDGE_INDEX_MMAP", "1") != "0"
+# Hilos para buscar en los shards en paralelo y plazo por búsqueda (segundos, 0 = sin plazo)
+SEARCH_WORKERS = int(os.environ.get("KNOWLEDGE_SEARCH_WORKERS", 4))
+SEARCH_TIMEOUT = float(os.environ.get("KNOWLEDGE_SEARCH_TIMEOUT", 0)) or None
+# Idioma de las obras cuando el manifiesto no lo indica
+DEFAULT_LANGUAGE = 'es'
+# Campos de las obras por los que se puede filtrar una búsqueda
+FILTER_FIELDS = ('source', 'book', 'language')
+# En HNSW, un filtro que deja esta fracción de un shard o menos se resuelve con búsqueda
+# exacta sobre los vectores del grafo: recorrerlo apenas encuentra vecinos dentro del filtro
+EXACT_FILTER_FRACTION = 0.25
+# Etiqueta de caché de los resultados de búsqueda; main() la invalida tras escribir el índice
+KNOWLEDGE_BASE_TAG = 'dataset:knowledge_base'
+
+# Referencia a un chunk: (fuente, obra, posición dentro del índice original de la obra)
+ChunkRef = Tuple[str, str, int]
+
+
+class KnowledgeIndex:
+    """
+    Índice FAISS de todas las obras con ids globales contiguos.
+
+    Los vectores se ordenan por fuente y obra, de modo que cada obra ocupa un rango
+    [start, start + count) de ids y el chunk i de una obra tiene id start + i. La tabla
+    de rangos sustituye a un mapa por vector: resolver un id es un searchsorted sobre
+    ~75 inicios. Los vectores pueden repartirse en varios shards (p. ej. uno por fuente);
+    cada shard cubre también un rango contiguo de ids globales.
+
+    Tipos de índice: 'flat' (exacto), 'ivf' (IVF-Flat, se ajusta con nprobe), 'hnsw'
+    (se ajusta con efSearch), 'sq8' (cuantización escalar a 8 bits, 4x menos memoria) e
+    'ivfpq' (IVF con cuantización de producto, ~100x menos memoria; también usa nprobe).
+    nprobe y efSearch pueden indicarse en cada búsqueda; si no, se usan los del manifiesto.
+
+    Los índices cuantizados pueden guardar una copia float16 de los vectores
+    (vectors_f16.npy, abierta con mmap): cada búsqueda pide rerank * k candidatos y los
+    reordena por distancia exacta, recuperando casi todo el recall perdido al cuantizar.
+
+    Al cargar, los shards se abren con mmap: los vectores no se copian al heap de cada
+    worker sino que se leen de la caché de páginas del sistema, compartida por todos los
+    procesos que abren el mismo archivo. Los textos de los chunks están en un ChunkStore
+    (chunks.bin) con el mismo orden de ids.
+
+    Con varios shards, cada búsqueda se reparte en un pool de hilos acotado (FAISS libera
+    el GIL) y los resultados se combinan con un heap. Si se indica un plazo, los shards que
+    no terminan a tiempo se omiten y la respuesta se construye con los demás.
+
+    Las búsquedas pueden filtrarse por fuente, obra o idioma. Como cada obra es un rango
+    contiguo de ids, el filtro se traduce en rangos que FAISS aplica durante la búsqueda
+    (IDSelectorRange, o IDSelectorBitmap si hay varios): no se piden resultados de más
+    para descartarlos después, y los shards sin ids en el filtro no se consultan. En
+    HNSW, los filtros muy selectivos se resuelven con búsqueda exacta sobre el rango.
+    """
+
+    def __init__(self, manifest: Dict, shards: List[faiss.Index], chunks: Optional[ChunkStore] = None,
+                 rerank_vectors: Optional[np.ndarray] = None):
+        self.manifest = manifest
+        self.chunks = chunks
+        self.rerank_vectors = rerank_vectors
+        self.books: List[Dict] = manifest['books']
+        self.shard_info: List[Dict] = manifest['shards']
+        self.shards = shards
+        self.dimension: int = manifest['dimension']
+        self.ntotal: int = manifest['ntotal']
+        self.index_type: str = manifest.get('index_type', 'flat')
+        self.search_defaults: Dict[str, int] = manifest.get('search_defaults', {})
+        self._book_starts = np.array([book['start'] for book in self.books], dtype=np.int64)
+        self._book_positions = {(book['source'], book['book']): i for i, book in enumerate(self.books)}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.skipped_shard_searches = 0
+
+    @classmethod
+    def build(cls, sources: Optional[Dict[str, str]] = None, shard_by: str = 'none',
+              index_type: str = 'flat', nlist: Optional[int] = None, nprobe: int = 16,
+              hnsw_m: int = 32, ef_construction: int = 200, ef_search: int = 64,
+              pq_m: int = 64, rerank_copy: bool = False, rerank: int = 8,
+              languages: Optional[Dict[str, str]] = None) -> 'KnowledgeIndex':
+        """
+        Fusiona los índices por obra (<obra>.faiss) en uno o varios shards.
+
+        Args:
+            sources: {fuente: directorio}; el orden determina el de los ids
+            shard_by: 'none' para un solo shard o 'source' para uno por fuente
+            index_type: 'flat', 'ivf', 'hnsw', 'sq8' o 'ivfpq'
+            nlist: Listas invertidas de IVF (por defecto 4 * sqrt(vectores del shard))
+            nprobe: Listas visitadas por defecto en IVF
+            hnsw_m: Vecinos por nodo en HNSW
+            ef_construction: Amplitud de búsqueda al construir HNSW
+            ef_search: Amplitud de búsqueda por defecto en HNSW
+            pq_m: Subcuantizadores de IVF-PQ (bytes por vector); debe dividir la dimensión
+            rerank_copy: Guardar la copia float16 para reordenar por distancia exacta
+            rerank: Factor de candidatos por defecto al reordenar
+            languages: {fuente: idioma} de las obras (por defecto DEFAULT_LANGUAGE)
+
+        Returns:
+            KnowledgeIndex en memoria (usar save() para escribirlo)
+        """
+        if shard_by not in ('none', 'source'):
+            raise ValueError(f"shard_by no soportado: {shard_by}")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Tipo de índice no soportado: {index_type}")
+        sources = sources or DEFAULT_SOURCES
+        languages = languages or {}
+
+        books: List[Dict] = []
+        shard_vectors: Dict[str, List[np.ndarray]] = {}
+        dimension = None
+        next_id = 0
+        for source, directory in sources.items():
+            for index_file in sorted(Path(directory).glob('*.faiss')):
+                index = faiss.read_index(str(index_file))
+                if index.ntotal == 0:
+                    continue
+                if dimension is None:
+                    dimension = index.d
+                elif index.d != dimension:
+                    raise ValueError(f"{index_file}: dimensión {index.d}, se esperaba {dimension}")
+                if index.metric_type != faiss.METRIC_L2:
+                    raise ValueError(f"{index_file}: solo se admiten índices con métrica L2")
+
+                books.append({'source': source, 'book': index_file.stem,
+                              'language': languages.get(source, DEFAULT_LANGUAGE),
+                              'start': next_id, 'count': int(index.ntotal)})
+                shard_name = source if shard_by == 'source' else 'all'
+                shard_vectors.setdefault(shard_name, []).append(index.reconstruct_n(0, index.ntotal))
+                next_id += index.ntotal
+
+        if not books:
+            raise ValueError("No se encontraron índices FAISS para fusionar")
+
+        shards, shard_info = [], []
+        start = 0
+        build_params = {'nlist': nlist, 'hnsw_m': hnsw_m, 'ef_construction': ef_construction, 'pq_m': pq_m}
+        rerank_parts = []
+        for name, parts in shard_vectors.items():
+            vectors = np.ascontiguousarray(np.vstack(parts), dtype='float32')
+            if rerank_copy:
+                rerank_parts.append(vectors.astype(np.float16))
+            index = _new_index(index_type, dimension, len(vectors), build_params)
+            if not index.is_trained:
+                index.train(vectors)
+            index.add(vectors)
+            shards.append(index)
+            shard_info.append({'name': name, 'file': f"{name}.faiss", 'start': start, 'count': int(index.ntotal)})
+            start += index.ntotal
+
+        search_defaults: Dict[str, int] = {}
+        if index_type in ('ivf', 'ivfpq'):
+            search_defaults['nprobe'] = nprobe
+        if index_type == 'hnsw':
+            search_defaults['ef_search'] = ef_search
+        if rerank_copy:
+            search_defaults['rerank'] = rerank
+
+        manifest = {
+            'version': FORMAT_VERSION,
+            'built': datetime.utcnow().isoformat(),
+            'dimension': dimension,
+            'metric': 'l2',
+            'index_type': index_type,
+            'index_params': {key: value for key, value in build_params.items() if value is not None},
+            'search_defaults': search_defaults,
+            'rerank_file': RERANK_FILE if rerank_copy else None,
+            'ntotal': next_id,
+            'sources': {source: str(directory) for source, directory in sources.items()},
+            'shards': shard_info,
+            'books': books,
+        }
+        return cls(manifest, shards, rerank_vectors=np.vstack(rerank_parts) if rerank_copy else None)
+
+    def save(self, directory: str = DEFAULT_INDEX_DIR):
+        """Escribe los shards y el manifiesto; el manifiesto se escribe al final."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for info, index in zip(self.shard_info, self.shards):
+            faiss.write_index(index, str(directory / info['file']))
+        if self.rerank_vectors is not None:
+            np.save(directory / RERANK_FILE, self.rerank_vectors)
+        tmp_path = directory / f"{MANIFEST_NAME}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, directory / MANIFEST_NAME)
+
+    @classmethod
+    def exists(cls, directory: str = DEFAULT_INDEX_DIR) -> bool:
+        return (Path(directory) / MANIFEST_NAME).exists()
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_INDEX_DIR, mmap: bool = MMAP_ENABLED) -> 'KnowledgeIndex':
+        directory = Path(directory)
+        with open(directory / MANIFEST_NAME, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Versión de índice no soportada: {manifest.get('version')}")
+        index_type = manifest.get('index_type', 'flat')
+        shards = [open_index(directory / info['file'], index_type, mmap) for info in manifest['shards']]
+        chunks_path = directory / CHUNKS_FILE
+        chunks = ChunkStore(chunks_path) if chunks_path.exists() else None
+        rerank_vectors = None
+        if manifest.get('rerank_file'):
+            rerank_vectors = np.load(directory / manifest['rerank_file'], mmap_mode='r' if mmap else None)
+        return cls(manifest, shards, chunks, rerank_vectors)
+
+    def vector_id(self, source: str, book: str, chunk: int) -> Optional[int]:
+        """Id global del chunk `chunk` de una obra; None si la obra o el chunk no existen."""
+        position = self._book_positions.get((source, book))
+        if position is None or not 0 <= chunk < self.books[position]['count']:
+            return None
+        return self.books[position]['start'] + chunk
+
+    def chunk_text(self, vector_id: int) -> Optional[str]:
+        return self.chunks.get(vector_id) if self.chunks is not None else None
+
+    def locate(self, ids: np.ndarray) -> List[Optional[ChunkRef]]:
+        """Resuelve ids globales a (fuente, obra, chunk); None para -1 o ids fuera de rango."""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self._book_starts, ids, side='right') - 1
+        refs: List[Optional[ChunkRef]] = []
+        for vector_id, position in zip(ids.tolist(), positions.tolist()):
+            if vector_id < 0 or vector_id >= self.ntotal or position < 0:
+                refs.append(None)
+                continue
+            book = self.books[position]
+            refs.append((book['source'], book['book'], vector_id - book['start']))
+        return refs
+
+    def iter_books(self) -> Iterator[Dict]:
+        return iter(self.books)
+
+    def id_ranges(self, filters: Dict[str, Any]) -> List[Tuple[int, int]]:
+        """
+        Rangos [inicio, fin) de ids de las obras que cumplen los filtros.
+
+        Args:
+            filters: {campo: valor o lista de valores} con campos de FILTER_FIELDS; un
+                campo con None no filtra
+
+        Returns:
+            Rangos ordenados, con los de obras consecutivas fusionados
+        """
+        ranges: List[Tuple[int, int]] = []
+        for book in self.books:
+            if matches_filters(book, filters):
+                start, end = book['start'], book['start'] + book['count']
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1] = (ranges[-1][0], end)
+                else:
+                    ranges.append((start, end))
+        return ranges
+
+    def search_parameters(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                          selector: Optional[faiss.IDSelector] = None,
+                          fraction: float = 1.0) -> Optional[faiss.SearchParameters]:
+        """
+        Parámetros de búsqueda de una petición; no modifican el índice compartido.
+
+        Con un selector que deja pasar solo `fraction` de los vectores del shard, nprobe y
+        efSearch se escalan por 1 / fraction para que los candidatos visitados dentro del
+        filtro (y con ellos el recall) sean los mismos que sin filtrar.
+        """
+        extra = {'sel': selector} if selector is not None else {}
+        if self.index_type in ('ivf', 'ivfpq'):
+            nprobe = nprobe or self.search_defaults.get('nprobe', 16)
+            # FAISS limita nprobe a nlist
+            return faiss.SearchParametersIVF(nprobe=math.ceil(nprobe / fraction), **extra)
+        if self.index_type == 'hnsw':
+            ef_search = ef_search or self.search_defaults.get('ef_search', 64)
+            return faiss.SearchParametersHNSW(efSearch=math.ceil(ef_search / fraction), **extra)
+        return faiss.SearchParameters(**extra) if extra else None
+
+    def search(self, vectors: np.ndarray, k: int, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, rerank: Optional[int] = None,
+               timeout: Optional[float] = SEARCH_TIMEOUT,
+               filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k global de cada consulta sobre todos los shards.
+
+        Args:
+            vectors: Matriz (nq, d) de consultas
+            k: Resultados por consulta
+            nprobe: Listas visitadas (solo IVF e IVF-PQ)
+            ef_search: Amplitud de búsqueda (solo HNSW)
+            rerank: Candidatos por resultado a reordenar con la copia float16 (0 desactiva)
+            timeout: Segundos máximos de espera por los shards; los que no terminan se omiten
+            filters: Solo obras con esos valores de fuente, obra o idioma (ver id_ranges)
+
+        Returns:
+            (D, I) de forma (nq, k), con ids globales y -1 donde no hay resultado
+        """
+        D, I, _ = self.search_with_skipped(vectors, k, nprobe, ef_search, rerank, timeout, filters)
+        return D, I
+
+    def search_with_skipped(self, vectors: np.ndarray, k: int, nprobe: Optional[int] = None,
+                            ef_search: Optional[int] = None, rerank: Optional[int] = None,
+                            timeout: Optional[float] = SEARCH_TIMEOUT,
+                            filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Como search(), más el número de shards omitidos por el plazo en esta llamada.
+
+        Con búsquedas concurrentes, skipped_shard_searches acumula las omisiones de todas;
+        solo este valor indica si un resultado concreto está incompleto.
+        """
+        vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype='float32')
+        rerank = self.search_defaults.get('rerank', 0) if rerank is None else rerank
+        ranges = self.id_ranges(filters) if filters else None
+        if rerank > 1 and self.rerank_vectors is not None:
+            _, I, skipped = self._search_shards(vectors, k * rerank, nprobe, ef_search, timeout, ranges)
+            return (*self._rerank(vectors, I, k), skipped)
+        return self._search_shards(vectors, k, nprobe, ef_search, timeout, ranges)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=max(1, min(len(self.shards), SEARCH_WORKERS)),
+                                                    thread_name_prefix="knowledge-shard")
+        return self._pool
+
+    def _shard_plan(self, nprobe: Optional[int], ef_search: Optional[int],
+                    ranges: Optional[List[Tuple[int, int]]]) -> List[Tuple[Dict, faiss.Index, Any]]:
+        """(info, índice, parámetros) de cada shard a consultar, con el selector del filtro."""
+        plan = []
+        for info, index in zip(self.shard_info, self.shards):
+            if ranges is None:
+                plan.append((info, index, self.search_parameters(nprobe, ef_search)))
+                continue
+            start, end = info['start'], info['start'] + info['count']
+            local = [(max(lo, start) - start, min(hi, end) - start) for lo, hi in ranges if lo < end and hi > start]
+            selected = sum(hi - lo for lo, hi in local)
+            if not selected:
+                continue
+            if selected == info['count']:
+                plan.append((info, index, self.search_parameters(nprobe, ef_search)))
+                continue
+            if len(local) == 1:
+                selector = faiss.IDSelectorRange(*local[0])
+            else:
+                mask = np.zeros(info['count'], dtype=bool)
+                for lo, hi in local:
+                    mask[lo:hi] = True
+                # El selector conserva la referencia al bitmap
+                selector = faiss.IDSelectorBitmap(np.packbits(mask, bitorder='little'))
+            fraction = selected / info['count']
+            if self.index_type == 'hnsw' and fraction <= EXACT_FILTER_FRACTION:
+                plan.append((info, faiss.downcast_index(index.storage), faiss.SearchParameters(sel=selector)))
+            else:
+                plan.append((info, index, self.search_parameters(nprobe, ef_search, selector, fraction)))
+        return plan
+
+    def _search_shards(self, vectors: np.ndarray, k: int, nprobe: Optional[int], ef_search: Optional[int],
+                       timeout: Optional[float],
+                       ranges: Optional[List[Tuple[int, int]]] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """(D, I, shards omitidos por el plazo) de los shards del plan."""
+        plan = self._shard_plan(nprobe, ef_search, ranges)
+        if len(plan) == 1:
+            info, index, params = plan[0]
+            D, I = index.search(vectors, k, params=params)
+            return D, np.where(I >= 0, I + info['start'], -1), 0
+
+        executor = self._executor()
+        futures = {executor.submit(index.search, vectors, k, params=params): info
+                   for info, index, params in plan}
+        done, pending = wait(futures, timeout=timeout)
+        if pending:
+            # Una búsqueda FAISS en curso no se puede interrumpir: termina en su hilo y se descarta
+            self.skipped_shard_searches += len(pending)
+            logger.warning(f"Shards omitidos por superar {timeout}s: "
+                           f"{', '.join(futures[future]['name'] for future in pending)}")
+
+        results = []
+        for future in done:
+            D, I = future.result()
+            results.append((D, np.where(I >= 0, I + futures[future]['start'], -1)))
+        return (*_merge_top_k(results, len(vectors), k), len(pending))
+
+    def _rerank(self, vectors: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Reordena los candidatos por distancia L2 exacta con la copia float16."""
+        D = np.full((len(vectors), k), np.finfo('float32').max, dtype='float32')
+        I = np.full((len(vectors), k), -1, dtype='int64')
+        for row, (query, ids) in enumerate(zip(vectors, candidates)):
+            ids = ids[ids >= 0]
+            if not len(ids):
+                continue
+            exact = ((self.rerank_vectors[ids].astype('float32') - query) ** 2).sum(axis=1)
+            order = np.argsort(exact, kind='stable')[:k]
+            D[row, :len(order)] = exact[order]
+            I[row, :len(order)] = ids[order]
+        return D, I
+
+
+def matches_filters(book: Dict, filters: Dict[str, Any]) -> bool:
+    """True si la obra ({'source', 'book', 'language'}) cumple todos los filtros."""
+    for field, value in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Filtro no soportado: {field} (opciones: {', '.join(FILTER_FIELDS)})")
+        if value is None:
+            continue
+        values = {value} if isinstance(value, str) else set(value)
+        if book.get(field, DEFAULT_LANGUAGE) not in values:
+            return False
+    return True
+
+
+def _merge_top_k(results: List[Tuple[np.ndarray, np.ndarray]], nq: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Combina los top-k (ya ordenados) de cada shard en el top-k global de cada consulta."""
+    D = np.full((nq, k), np.finfo('float32').max, dtype='float32')
+    I = np.full((nq, k), -1, dtype='int64')
+    for row in range(nq):
+        merged = heapq.merge(*(zip(shard_D[row].tolist(), shard_I[row].tolist()) for shard_D, shard_I in results))
+        hits = itertools.islice((hit for hit in merged if hit[1] >= 0), k)
+        for column, (distance, vector_id) in enumerate(hits):
+            D[row, column] = distance
+            I[row, column] = vector_id
+    return D, I
+
+
+def open_index(path, index_type: str = 'flat', mmap: bool = MMAP_ENABLED) -> faiss.Index:
+    """
+    Abre un índice FAISS, con mmap si se pide.
+
+    IVF e IVF-PQ mapean sus listas invertidas (IO_FLAG_MMAP); flat, SQ8 y HNSW mapean los
+    códigos de IndexFlatCodes (IO_FLAG_MMAP_IFC). FAISS no admite combinar ambos indicadores.
+    """
+    if not mmap:
+        return faiss.read_index(str(path))
+    flags = faiss.IO_FLAG_MMAP if index_type in ('ivf', 'ivfpq') else faiss.IO_FLAG_MMAP_IFC
+    return faiss.read_index(str(path), flags)
+
+
+def _new_index(index_type: str, dimension: int, count: int, params: Dict) -> faiss.Index:
+    if index_type in ('ivf', 'ivfpq'):
+        nlist = params['nlist'] or int(4 * np.sqrt(count))
+        # FAISS necesita al menos un vector de entrenamiento por lista
+        nlist = max(1, min(nlist, count))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == 'ivf':
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_L2)
+        if dimension % params['pq_m']:
+            raise ValueError(f"pq_m={params['pq_m']} no divide la dimensión {dimension}")
+        # 8 bits por subcuantizador (256 centroides) salvo con muy pocos vectores
+        nbits = min(8, max(1, int(np.log2(count))))
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, params['pq_m'], nbits, faiss.METRIC_L2)
+    if index_type == 'sq8':
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, params['hnsw_m'], faiss.METRIC_L2)
+        index.hnsw.efConstruction = params['ef_construction']
+        return index
+    return faiss.IndexFlatL2(dimension)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el índice FAISS unificado de la base de conocimientos")
+    parser.add_argument('--output', default=DEFAULT_INDEX_DIR, help='Directorio de salida')
+    parser.add_argument('--egw-dir', default=DEFAULT_SOURCES['egw'])
+    parser.add_argument('--other-dir', default=DEFAULT_SOURCES['other'])
+    parser.add_argument('--shard-by', choices=('none', 'source'), default='none')
+    parser.add_argument('--type', dest='index_type', choices=INDEX_TYPES, default='flat')
+    parser.add_argument('--nlist', type=int, help='Listas invertidas de IVF')
+    parser.add_argument('--nprobe', type=int, default=16, help='nprobe por defecto de IVF')
+    parser.add_argument('--hnsw-m', type=int, default=32)
+    parser.add_argument('--ef-construction', type=int, default=200)
+    parser.add_argument('--ef-search', type=int, default=64, help='efSearch por defecto de HNSW')
+    parser.add_argument('--pq-m', type=int, default=64, help='Bytes por vector de IVF-PQ')
+    parser.add_argument('--rerank-copy', action='store_true',
+                        help='Guardar una copia float16 de los vectores para reordenar (sq8, ivfpq)')
+    parser.add_argument('--rerank', type=int, default=8, help='Factor de candidatos por defecto al reordenar')
+    parser.add_argument('--language', action='append', default=[], metavar='FUENTE=IDIOMA',
+                        help=f'Idioma de las obras de una fuente (por defecto {DEFAULT_LANGUAGE})')
+    parser.add_argument('--no-chunks', action='store_true', help='No convertir los .pkl a chunks.bin')
+    parser.add_argument('--chunks-only', action='store_true',
+                        help='Solo convertir los .pkl a chunks.bin para un índice ya construido')
+    args = parser.parse_args()
+
+    sources = {'egw': args.egw_dir, 'other': args.other_dir}
+    if args.chunks_only:
+        _write_chunks(KnowledgeIndex.load(args.output, mmap=True), sources, args.output)
+        _invalidate_search_cache()
+        return
+
+    started = time.perf_counter()
+    index = KnowledgeIndex.build(sources, shard_by=args.shard_by,
+                                 index_type=args.index_type, nlist=args.nlist, nprobe=args.nprobe,
+                                 hnsw_m=args.hnsw_m, ef_construction=args.ef_construction,
+                                 ef_search=args.ef_search, pq_m=args.pq_m, rerank_copy=args.rerank_copy,
+                                 rerank=args.rerank,
+                                 languages=dict(item.split('=', 1) for item in args.language))
+    index.save(args.output)
+    logger.info(f"Índice unificado: {index.ntotal} vectores de {len(index.books)} obras en "
+                f"{len(index.shards)} shard(s), {time.perf_counter() - started:.1f}s -> {args.output}")
+    if not args.no_chunks:
+        _write_chunks(index, sources, args.output)
+    _invalidate_search_cache()
+
+
+def _write_chunks(index: KnowledgeIndex, sources: Dict[str, str], directory: str):
+    started = time.perf_counter()
+    stats = convert_pickles(index.books, sources, str(Path(directory) / CHUNKS_FILE))
+    logger.info(f"Chunks: {stats['chunks']} ({stats['missing']} sin texto, {stats['books_without_data']} "
+                f"obras sin .pkl válido), {time.perf_counter() - started:.1f}s")
+
+
+def _invalidate_search_cache() -> bool:
+    """
+    Descarta las búsquedas cacheadas con el índice anterior en todos los workers.
+
+    El CLI no pasa por create_app(), así que conecta aquí el mismo nivel L2 que los
+    workers (CACHE_BACKEND, REDIS_URL, CACHE_SQLITE_PATH): sin él la invalidación solo
+    afectaría a este proceso.
+    """
+    from cache_manager import cache_manager
+    if cache_manager.redis is None and not cache_manager.init_backend_from_env():
+        logger.warning(f"Sin caché L2 configurado: los workers en marcha seguirán sirviendo búsquedas "
+                       f"del índice anterior hasta reiniciarse (etiqueta {KNOWLEDGE_BASE_TAG})")
+        return False
+    try:
+        if not cache_manager.invalidate(tag=KNOWLEDGE_BASE_TAG):
+            logger.warning("Las búsquedas cacheadas en otros workers no se invalidaron: "
+                           f"invalide la etiqueta {KNOWLEDGE_BASE_TAG} cuando el caché L2 esté disponible")
+            return False
+        return True
+    finally:
+        cache_manager.stop_invalidation_listener()
+
+if __name__ == "__main__":
+    main()
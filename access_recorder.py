@@ -0,0 +1,183 @@
+"""
+AccessRecorder - Frecuencia de acceso a claves del caché con un count-min sketch acotado
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cache_metrics import namespace_of
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Namespaces cuyas claves se registran y se guardan en disco: solo los que CacheWarmer sabe
+# reconstruir y que no contienen texto de los usuarios (las claves search: llevan la consulta)
+TRACKED_NAMESPACES = tuple(
+    name.strip() for name in
+    os.environ.get('CACHE_ACCESS_NAMESPACES', 'chapter,verse,chapters,books,promises').split(',')
+    if name.strip()
+)
+
+
+class CountMinSketch:
+    """
+    Count-min sketch de `depth` filas x `width` contadores de 32 bits.
+
+    Las filas son array('I') en lugar de numpy: con 4 filas, indexar escalares en
+    Python puro es varias veces más rápido que la indexación avanzada de numpy.
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = [array('I', bytes(4 * width)) for _ in range(depth)]
+
+    def _columns(self, key: str) -> List[int]:
+        # Doble hashing: h1 + i*h2 genera `depth` columnas independientes con un solo hash
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Suma `count` accesos a la clave y devuelve su frecuencia estimada."""
+        estimate = None
+        for row, column in zip(self.table, self._columns(key)):
+            value = min(row[column] + count, 0xFFFFFFFF)
+            row[column] = value
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        """Frecuencia estimada (cota superior) de la clave."""
+        return min(row[column] for row, column in zip(self.table, self._columns(key)))
+
+    def decay(self) -> None:
+        """Divide todos los contadores entre dos para que pese más lo reciente."""
+        self.table = [array('I', (value >> 1 for value in row)) for row in self.table]
+
+
+class AccessRecorder:
+    """
+    Registra accesos a claves lógicas del caché y conserva las más frecuentes.
+
+    La memoria es fija: el sketch tiene tamaño constante y solo se guardan como
+    candidatas hasta 2 * top_k claves. Cada `decay_every` accesos los contadores
+    se reducen a la mitad.
+    """
+
+    def __init__(self, top_k: int = 200, width: int = 4096, depth: int = 4,
+                 decay_every: int = 100_000, namespaces: Optional[Iterable[str]] = TRACKED_NAMESPACES):
+        """
+        Args:
+            namespaces: Namespaces de claves a registrar (None registra todos); el resto
+                de accesos se ignora y no llega nunca al archivo de claves frecuentes
+        """
+        self.top_k = top_k
+        self.namespaces = frozenset(namespaces) if namespaces is not None else None
+        self.decay_every = decay_every
+        self.sketch = CountMinSketch(width, depth)
+        self._top: Dict[str, int] = {}
+        self._floor = 0  # Frecuencia mínima entre las candidatas (puede quedar por debajo)
+        self._since_decay = 0
+        self._lock = threading.Lock()
+        self._persist_thread: Optional[threading.Thread] = None
+        self._persist_stop = threading.Event()
+
+    def record(self, key: str) -> None:
+        """Registra un acceso a la clave."""
+        if not self.tracks(key):
+            return
+        with self._lock:
+            estimate = self.sketch.add(key)
+            if key in self._top or len(self._top) < 2 * self.top_k:
+                self._top[key] = estimate
+            elif estimate > self._floor:
+                # Reemplazar a la candidata menos frecuente solo si esta clave la supera
+                weakest = min(self._top, key=self._top.get)
+                self._floor = self._top[weakest]
+                if estimate > self._floor:
+                    del self._top[weakest]
+                    self._top[key] = estimate
+                    self._floor = min(self._top.values())
+
+            self._since_decay += 1
+            if self._since_decay >= self.decay_every:
+                self.sketch.decay()
+                self._top = {k: v >> 1 for k, v in self._top.items()}
+                self._floor >>= 1
+                self._since_decay = 0
+
+    def tracks(self, key: str) -> bool:
+        """True si los accesos a la clave se registran."""
+        return self.namespaces is None or namespace_of(key) in self.namespaces
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Claves más frecuentes con su frecuencia estimada, de mayor a menor."""
+        with self._lock:
+            ranked = sorted(self._top.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n or self.top_k]
+
+    def save(self, path: str) -> int:
+        """
+        Guarda las claves más frecuentes combinándolas con las ya guardadas por otros workers.
+
+        Returns:
+            Número de claves guardadas
+        """
+        # Las claves de otros workers (o de versiones anteriores) pasan el mismo filtro
+        merged = {key: count for key, count in load_hot_keys(path) if self.tracks(key)}
+        for key, count in self.top():
+            merged[key] = max(count, merged.get(key, 0))
+        ranked = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:self.top_k]
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'updated': datetime.utcnow().isoformat(), 'keys': ranked}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return len(ranked)
+
+    def _persist_loop(self, path: str, interval: float) -> None:
+        while not self._persist_stop.wait(interval):
+            try:
+                count = self.save(path)
+                logger.debug(f"{count} claves frecuentes guardadas en {path}")
+            except Exception as e:
+                logger.warning(f"Error guardando claves frecuentes: {str(e)}")
+
+    def start_persisting(self, path: str, interval: float = 300.0) -> None:
+        """Guarda periódicamente las claves más frecuentes en un hilo de fondo."""
+        if self._persist_thread is not None and self._persist_thread.is_alive():
+            return
+        self._persist_stop.clear()
+        self._persist_thread = threading.Thread(
+            target=self._persist_loop, args=(path, interval), name="cache-hot-keys", daemon=True
+        )
+        self._persist_thread.start()
+
+    def stop_persisting(self) -> None:
+        self._persist_stop.set()
+        if self._persist_thread is not None:
+            self._persist_thread.join(timeout=2.0)
+        self._persist_thread = None
+
+
+def load_hot_keys(path: str) -> List[Tuple[str, int]]:
+    """Lee las claves frecuentes guardadas; lista vacía si no existen o están corruptas."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [(key, int(count)) for key, count in json.load(f).get('keys', [])]
+    except FileNotFoundError:
+        return []
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Archivo de claves frecuentes inválido ({path}): {str(e)}")
+        return []
@@ -1,12 +1,14 @@
 import os
 import sys
 import logging
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from database import db_manager
 from routes import init_routes
 from extensions import init_extensions
 from error_handlers import register_error_handlers
 from db_monitor import db_monitor
+from cache_manager import cache_manager
+from cache_warmer import cache_warmer
 from nevin_routes import init_nevin_routes
 from auth import init_auth_routes
 
@@ -41,6 +43,9 @@ def create_app():
             return None
         logger.info("Extensiones inicializadas")
 
+        # Inicializar caché L2: Redis, o SQLite compartido por los workers del host
+        cache_manager.init_backend_from_env(app.instance_path)
+
         # Inicializar monitor de base de datos
         db_monitor.init_app(app)
         db_monitor.start()
@@ -80,7 +85,8 @@ def create_app():
                 "status": "healthy" if db_status['is_healthy'] else "unhealthy",
                 "version": "1.0.0",
                 "debug": app.debug,
-                "database": db_status
+                "database": db_status,
+                "cache": cache_manager.health()
             })
 
         @app.route('/api/health')
@@ -90,9 +96,31 @@ def create_app():
                 "status": "healthy" if db_status['is_healthy'] else "unhealthy",
                 "version": "1.0.0",
                 "debug": app.debug,
-                "database": db_status
+                "database": db_status,
+                "cache": cache_manager.health()
             })
 
+        @app.route('/ready')
+        def readiness_check():
+            """Listo para recibir tráfico cuando termina el precalentamiento del caché"""
+            status = cache_warmer.status()
+            return jsonify({
+                "status": "ready" if status['ready'] else "warming",
+                "cache_warmup": status
+            }), 200 if status['ready'] else 503
+
+        @app.route('/metrics')
+        def metrics():
+            """Métricas del caché en formato de texto de Prometheus"""
+            return Response(cache_manager.prometheus_metrics(),
+                            mimetype='text/plain; version=0.0.4')
+
+        # Precalentar el caché con las claves más accedidas antes de declarar /ready
+        if os.environ.get("CACHE_WARMUP", "1") == "1":
+            cache_warmer.start(app)
+        else:
+            cache_warmer.ready.set()
+
         return app
 
     except Exception as e:
@@ -0,0 +1,140 @@
+"""
+Benchmark de codecs para el nivel L2 (Redis) del caché
+
+Compara el JSON de texto que se guardaba antes con CacheCodec (json, orjson y msgpack,
+con y sin zstd) sobre tres cargas típicas de la aplicación:
+  - chapter: respuesta de BibleDataAccess.get_chapter (capítulo completo, es + tzo)
+  - search:  resultados de BibleData.search_verses
+  - faiss:   fragmentos devueltos por KnowledgeBaseManager.search_knowledge_base
+
+Con --redis-url también mide la memoria que ocupa cada valor en Redis (MEMORY USAGE).
+
+Uso:
+    python benchmarks/bench_cache_codec.py
+    python benchmarks/bench_cache_codec.py --redis-url redis://localhost:6379/15
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_codec import CacheCodec
+
+WORDS = ("Dios Jehová Señor pueblo tierra cielo hijo padre palabra camino vida luz "
+         "y de la el que en a los se no por con su para como pero sus le ha me si "
+         "Kajvaltik Dios ta yo'on li balumile ja' ti ak'o yu'un skotol mu'yuk "
+         "amor paz justicia misericordia salvación reino gloria espíritu corazón").split()
+
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + '.'
+
+
+def chapter_payload(rng):
+    return {
+        'success': True,
+        'error': None,
+        'data': [{
+            'book': 'Salmos', 'chapter': 119, 'verse': verse,
+            'spanish_text': _sentence(rng, 12, 30),
+            'tzotzil_text': _sentence(rng, 12, 30),
+        } for verse in range(1, 41)],
+    }
+
+
+def search_payload(rng):
+    return [{
+        'content': _sentence(rng, 12, 30),
+        'content_tzotzil': _sentence(rng, 12, 30),
+        'reference': f"Juan {rng.randint(1, 21)}:{rng.randint(1, 40)}",
+        'score': rng.random(),
+        'type': 'bible',
+    } for _ in range(10)]
+
+
+def faiss_payload(rng):
+    return [{
+        'content': ' '.join(_sentence(rng, 15, 25) for _ in range(8)),
+        'source': 'egw',
+        'book': 'El Conflicto de los Siglos',
+        'distance': rng.random() * 0.5,
+        'relevance': rng.random(),
+    } for _ in range(5)]
+
+
+class LegacyJSON:
+    """Formato previo: json.dumps/json.loads sin cabecera."""
+    name = 'json (legacy)'
+
+    def encode(self, value):
+        return json.dumps(value)
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+def _timeit(fn, repeat):
+    best = float('inf')
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', help='Redis para medir MEMORY USAGE (se usan claves bench:codec:*)')
+    parser.add_argument('--repeat', type=int, default=200, help='Iteraciones por medición')
+    args = parser.parse_args()
+
+    client = None
+    if args.redis_url:
+        import redis
+        client = redis.from_url(args.redis_url)
+
+    rng = random.Random(3)
+    payloads = {
+        'chapter': chapter_payload(rng),
+        'search': search_payload(rng),
+        'faiss': faiss_payload(rng),
+    }
+
+    codecs = [LegacyJSON()]
+    for serializer in ('json', 'orjson', 'msgpack'):
+        for threshold in (0, 1024):
+            codec = CacheCodec(serializer=serializer, compress_threshold=threshold)
+            if codec.name != serializer:
+                continue  # Serializador no instalado
+            codec.label = f"{serializer}{' + zstd' if codec.compress_threshold else ''}"
+            codecs.append(codec)
+
+    header = f"{'carga':<9}{'codec':<17}{'bytes':>9}{'encode µs':>11}{'decode µs':>11}"
+    if client:
+        header += f"{'Redis bytes':>13}"
+    print(header)
+    for name, value in payloads.items():
+        for codec in codecs:
+            encoded = codec.encode(value)
+            assert codec.decode(encoded) == value
+            size = len(encoded.encode('utf-8') if isinstance(encoded, str) else encoded)
+            encode_us = _timeit(lambda: codec.encode(value), args.repeat)
+            decode_us = _timeit(lambda: codec.decode(encoded), args.repeat)
+            label = getattr(codec, 'label', codec.name)
+            line = f"{name:<9}{label:<17}{size:>9}{encode_us:>11.1f}{decode_us:>11.1f}"
+            if client:
+                key = f"bench:codec:{name}:{label}"
+                client.set(key, encoded)
+                line += f"{client.memory_usage(key):>13}"
+                client.delete(key)
+            print(line)
+        print()
+
+
+if __name__ == "__main__":
+    main()
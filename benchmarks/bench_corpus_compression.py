@@ -0,0 +1,172 @@
+"""
+Benchmark del corpus bíblico en memoria: RSS y latencia de lectura por capítulo
+
+Compara tres formas de guardar una traducción:
+  - plain:  un str de Python por versículo en un dict (referencia)
+  - buffer: TranslationBuffer (un buffer UTF-8 + offsets)
+  - zstd:   CompressedTranslationBuffer (capítulos comprimidos con diccionario)
+
+Cada modo carga los datos en un proceso aparte; "heap MB" es la memoria retenida según
+tracemalloc tras liberar las filas de origen y "RSS MB" el crecimiento del proceso.
+
+Uso:
+    python benchmarks/bench_corpus_compression.py                 # corpus sintético
+    python benchmarks/bench_corpus_compression.py --csv datos.csv # Libro,Capítulo,Versículo,Texto Tzotzil,Texto Español
+    python benchmarks/bench_corpus_compression.py --database      # tablas de la app (DATABASE_URL)
+"""
+import argparse
+import csv
+import gc
+import multiprocessing
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import psutil
+
+from bible_books import BIBLE_BOOKS_ORDER, encode_verse_key
+
+WORDS = ("Dios Jehová Señor pueblo tierra cielo hijo padre palabra camino vida luz "
+         "y de la el que en a los se no por con su para como pero sus le ha me si "
+         "dijo porque todo sobre será fue cuando ellos yo tu él nosotros gracia fe "
+         "amor paz justicia misericordia salvación reino gloria espíritu corazón").split()
+
+
+def synthetic_rows(seed: int = 7):
+    """Genera ~31.000 versículos con un vocabulario bíblico pequeño (tamaño realista)."""
+    rng = random.Random(seed)
+    rows = []
+    for book in BIBLE_BOOKS_ORDER:
+        for chapter in range(1, 19):
+            for verse in range(1, 30):
+                text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 30)))
+                rows.append((encode_verse_key(book, chapter, verse), text.capitalize() + '.'))
+    return rows
+
+
+def csv_rows(path: str, column: str = 'Texto Español'):
+    with open(path, encoding='utf-8') as f:
+        return [(encode_verse_key(row['Libro'], row['Capítulo'], row['Versículo']), row[column])
+                for row in csv.DictReader(f)]
+
+
+def database_rows(code: str):
+    from app import create_app
+    from bible_data_access import bible_data_access
+    app = create_app()
+    with app.app_context():
+        return list(bible_data_access.iter_translation(code))
+
+
+def load_rows(args):
+    if args.database:
+        return database_rows(args.translation), f"base de datos ({args.translation})"
+    if args.csv:
+        return csv_rows(args.csv), args.csv
+    return synthetic_rows(), "sintético"
+
+
+def _rss() -> int:
+    gc.collect()
+    return psutil.Process().memory_info().rss
+
+
+def run_mode(mode: str, args, queue):
+    """Carga los datos dentro del proceso hijo y mide memoria retenida y latencias."""
+    from bible_corpus import BibleCorpus
+
+    before = _rss()
+    tracemalloc.start()
+    rows, _ = load_rows(args)
+    chapters = sorted({key // 1000 * 1000 for key, _ in rows})
+
+    started = time.perf_counter()
+    if mode == 'plain':
+        store = {}
+        for key, text in rows:
+            store.setdefault(key // 1000 * 1000, []).append((key, text))
+
+        def read(low):
+            return store.get(low, [])
+        clear = None
+    else:
+        corpus = BibleCorpus(compress=(mode == 'zstd'))
+        corpus.add_translation('es', rows)
+        buffer = corpus._buffers['es']
+
+        def read(low):
+            return buffer.range(low, low + 999)
+        clear = corpus._chapter_cache.clear
+    build_time = time.perf_counter() - started
+
+    # Solo queda en memoria lo que retiene cada modo de almacenamiento
+    del rows
+    gc.collect()
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rss = _rss() - before
+
+    rng = random.Random(11)
+    cold, warm = [], []
+    for _ in range(args.samples):
+        low = rng.choice(chapters)
+        if clear:
+            clear()
+        t0 = time.perf_counter()
+        read(low)
+        cold.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        read(low)
+        warm.append(time.perf_counter() - t0)
+
+    def pct(values, q):
+        return sorted(values)[int(q * (len(values) - 1))] * 1e6
+
+    queue.put({
+        'mode': mode,
+        'heap_mb': heap / 2**20,
+        'rss_mb': rss / 2**20,
+        'build_s': build_time,
+        'cold_p50_us': pct(cold, 0.5),
+        'cold_p99_us': pct(cold, 0.99),
+        'warm_p50_us': pct(warm, 0.5),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', help='CSV con el formato de test_bible_data.csv')
+    parser.add_argument('--database', action='store_true', help='Leer la traducción de la base de datos')
+    parser.add_argument('--translation', default='es', help='Código de traducción para --database')
+    parser.add_argument('--samples', type=int, default=2000, help='Capítulos a leer por modo')
+    args = parser.parse_args()
+
+    rows, source = load_rows(args)
+    text_mb = sum(len(text.encode('utf-8')) for _, text in rows) / 2**20
+    print(f"Fuente: {source} - {len(rows)} versículos, {text_mb:.1f} MB de texto UTF-8\n")
+    del rows
+
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for mode in ('plain', 'buffer', 'zstd'):
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_mode, args=(mode, args, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    baseline = results[0]
+    print(f"{'modo':<8}{'heap MB':>9}{'RSS MB':>9}{'ahorro':>8}{'build s':>9}"
+          f"{'frío p50 µs':>13}{'frío p99 µs':>13}{'caliente p50 µs':>17}")
+    for r in results:
+        saving = 1 - r['heap_mb'] / baseline['heap_mb'] if baseline['heap_mb'] else 0.0
+        print(f"{r['mode']:<8}{r['heap_mb']:>9.1f}{r['rss_mb']:>9.1f}{saving:>8.0%}{r['build_s']:>9.2f}"
+              f"{r['cold_p50_us']:>13.1f}{r['cold_p99_us']:>13.1f}{r['warm_p50_us']:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark de proveedores de embeddings y de la búsqueda completa, sin red ni claves
+
+Para cada proveedor (--providers; 'local' necesita sentence-transformers):
+  - latencia de una consulta (p50/p99) y textos/s en lotes de --batch
+y, con el proveedor 'hashing' (dimensión 1536, la de los índices reales), la latencia de
+KnowledgeBaseManager.search_knowledge_base de extremo a extremo:
+  - frío:   embeddings calculados por el proveedor y guardados en el almacén
+  - caliente: embeddings leídos del almacén SQLite
+
+Uso:
+    python benchmarks/bench_embedding_providers.py
+    python benchmarks/bench_embedding_providers.py --providers hashing local --queries 500
+    python benchmarks/bench_embedding_providers.py --index-dir instance/knowledge_index
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from Nevin_AI.embedding_providers import PROVIDERS, HashingEmbeddingProvider
+from Nevin_AI.knowledge_base_manager import KnowledgeBaseManager
+from Nevin_AI.knowledge_index import DEFAULT_SOURCES, KnowledgeIndex
+
+WORDS = ('gracia fe ley sábado santuario profecía juicio amor Cristo Dios espíritu iglesia salvación '
+         'oración templo reino pecado perdón esperanza resurrección bautismo obediencia verdad').split()
+
+
+def sample_queries(count: int, seed: int = 31):
+    rng = np.random.default_rng(seed)
+    return [f"¿Qué enseña la Biblia sobre {' y '.join(rng.choice(WORDS, size=3, replace=False))}? ({i})"
+            for i in range(count)]
+
+
+def percentiles(timings):
+    return np.percentile(timings, 50) * 1e3, np.percentile(timings, 99) * 1e3
+
+
+def bench_provider(provider, queries, batch):
+    timings = []
+    for query in queries:
+        t0 = time.perf_counter()
+        provider.embed([query])
+        timings.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        provider.embed(queries[start:start + batch])
+    throughput = len(queries) / (time.perf_counter() - t0)
+    return (*percentiles(timings), throughput)
+
+
+def bench_search(manager, queries):
+    timings = []
+    for query in queries:
+        t0 = time.perf_counter()
+        manager.search_knowledge_base(query, top_k=5)
+        timings.append(time.perf_counter() - t0)
+    return percentiles(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--providers', nargs='+', choices=[name for name in PROVIDERS if name != 'openai'],
+                        default=['hashing'])
+    parser.add_argument('--egw-dir', default=DEFAULT_SOURCES['egw'])
+    parser.add_argument('--other-dir', default=DEFAULT_SOURCES['other'])
+    parser.add_argument('--index-dir', help='Índice unificado ya construido (por defecto se construye uno temporal)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=64)
+    args = parser.parse_args()
+
+    queries = sample_queries(args.queries)
+    print(f"{'proveedor':<12}{'dim':>6}{'p50 ms':>9}{'p99 ms':>9}{'textos/s':>11}")
+    for name in args.providers:
+        provider = PROVIDERS[name]()
+        p50, p99, throughput = bench_provider(provider, queries, args.batch)
+        print(f"{name:<12}{provider.dimension:>6}{p50:>9.3f}{p99:>9.3f}{throughput:>11.0f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = args.index_dir
+        if not index_dir:
+            index_dir = tmp
+            KnowledgeIndex.build({'egw': args.egw_dir, 'other': args.other_dir}).save(index_dir)
+        manager = KnowledgeBaseManager(args.egw_dir, args.other_dir, index_dir=index_dir,
+                                       embedding_store_path=str(Path(tmp) / 'embeddings.sqlite3'),
+                                       embedding_provider=HashingEmbeddingProvider())
+        manager.initialize()
+        print(f"\nBúsqueda completa (hashing, índice {manager.knowledge_index.index_type} de "
+              f"{manager.knowledge_index.ntotal} vectores)")
+        print(f"{'almacén':<12}{'p50 ms':>9}{'p99 ms':>9}")
+        for label in ('frío', 'caliente'):
+            p50, p99 = bench_search(manager, queries)
+            print(f"{label:<12}{p50:>9.3f}{p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
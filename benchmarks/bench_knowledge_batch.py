@@ -0,0 +1,88 @@
+"""
+Benchmark de búsqueda por lotes en la base de conocimientos: nq consultas en un bucle o en una llamada
+
+Compara, para lotes de nq consultas:
+  - secuencial: una búsqueda FAISS por consulta (lo que hace un bucle de search_knowledge_base)
+  - lote:       una sola búsqueda FAISS con nq > 1 (KnowledgeBaseManager.search_batch)
+
+sobre el índice unificado y, con --per-book, sobre los ~75 índices por obra. La columna
+"peticiones" es el número de peticiones de embeddings de cada forma: en producción cada
+una añade su latencia de red, que este benchmark (sin acceso a la API) no incluye.
+
+Uso:
+    python benchmarks/bench_knowledge_batch.py
+    python benchmarks/bench_knowledge_batch.py --type hnsw --per-book --threads 4
+    python benchmarks/bench_knowledge_batch.py --index-dir instance/knowledge_index
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import faiss
+import numpy as np
+
+from Nevin_AI.knowledge_index import DEFAULT_SOURCES, INDEX_TYPES, KnowledgeIndex, open_index
+
+BATCH_SIZES = (1, 8, 32, 128)
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def per_book_indexes(sources):
+    return [open_index(path, mmap=True)
+            for directory in sources.values() for path in sorted(Path(directory).glob('*.faiss'))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--egw-dir', default=DEFAULT_SOURCES['egw'])
+    parser.add_argument('--other-dir', default=DEFAULT_SOURCES['other'])
+    parser.add_argument('--index-dir', help='Índice unificado ya construido (si no, se construye en memoria)')
+    parser.add_argument('--type', dest='index_type', choices=INDEX_TYPES, default='flat')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--per-book', action='store_true', help='Medir también los índices por obra')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    parser.add_argument('--threads', type=int, help='Hilos OpenMP de FAISS')
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    sources = {'egw': args.egw_dir, 'other': args.other_dir}
+    index = (KnowledgeIndex.load(args.index_dir) if args.index_dir
+             else KnowledgeIndex.build(sources, index_type=args.index_type))
+    books = per_book_indexes(sources) if args.per_book else []
+    print(f"Índice {index.index_type}: {index.ntotal} vectores, {len(index.shards)} shard(s), "
+          f"{faiss.omp_get_max_threads()} hilos OpenMP\n")
+
+    rng = np.random.default_rng(29)
+    print(f"{'índice':<10}{'nq':>5}{'peticiones':>12}{'secuencial ms':>15}{'lote ms':>10}"
+          f"{'consultas/s':>13}{'aceleración':>13}")
+    for nq in BATCH_SIZES:
+        queries = rng.standard_normal((nq, index.dimension)).astype('float32')
+        requests = f"{nq}->1"  # search_batch agrupa hasta 2048 textos por petición
+
+        sequential = best_of(lambda: [index.search(q.reshape(1, -1), args.k) for q in queries], args.repeat)
+        batched = best_of(lambda: index.search(queries, args.k), args.repeat)
+        print(f"{'unificado':<10}{nq:>5}{requests:>12}{sequential * 1e3:>15.1f}{batched * 1e3:>10.1f}"
+              f"{nq / batched:>13.0f}{sequential / batched:>12.1f}x")
+
+        if books:
+            sequential = best_of(lambda: [book.search(q.reshape(1, -1), args.k)
+                                          for q in queries for book in books], args.repeat)
+            batched = best_of(lambda: [book.search(queries, args.k) for book in books], args.repeat)
+            print(f"{'por obra':<10}{nq:>5}{requests:>12}{sequential * 1e3:>15.1f}{batched * 1e3:>10.1f}"
+                  f"{nq / batched:>13.0f}{sequential / batched:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark de índices aproximados de la base de conocimientos: recall@k frente a latencia
+
+Construye el índice unificado exacto (flat) y sus variantes IVF-Flat, HNSW, SQ8 e IVF-PQ
+sobre los vectores reales de Nevin_AI/nevin_knowledge y other_authors, y para cada punto
+de operación (nprobe en IVF, efSearch en HNSW, reordenado rr con la copia float16) mide:
+  - MB:       memoria de los códigos del índice
+  - recall@k: fracción del top-k exacto que devuelve el índice aproximado
+  - p50/p99:  latencia de una consulta aislada (nq=1), como en una petición
+
+Sin acceso a la API de embeddings, las consultas son vectores de la base con ruido
+gaussiano (--noise); con --queries se usan embeddings reales guardados en un .npy (nq, d).
+Con --source, --book o --language se mide la búsqueda filtrada (el top-k exacto es el
+del índice flat con el mismo filtro).
+
+Uso:
+    python benchmarks/bench_knowledge_index.py
+    python benchmarks/bench_knowledge_index.py --k 5 --queries consultas.npy --threads 1
+    python benchmarks/bench_knowledge_index.py --types flat sq8 ivfpq --pq-m 96
+    python benchmarks/bench_knowledge_index.py --types flat ivf hnsw --book "El Conflicto de los Siglos"
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import faiss
+import numpy as np
+
+from Nevin_AI.knowledge_index import DEFAULT_SOURCES, INDEX_TYPES, KnowledgeIndex
+
+NPROBES = (1, 4, 16, 64)
+EF_SEARCHES = (16, 32, 64, 128, 256)
+
+
+def make_queries(index: KnowledgeIndex, args) -> np.ndarray:
+    if args.queries:
+        return np.load(args.queries).astype('float32')
+    rng = np.random.default_rng(17)
+    ids = rng.choice(index.ntotal, size=args.samples, replace=False)
+    base = np.vstack([index.shards[0].reconstruct(int(i)) for i in ids])
+    return (base + rng.normal(0, args.noise, base.shape)).astype('float32')
+
+
+def measure(index: KnowledgeIndex, queries: np.ndarray, truth: np.ndarray, k: int, **params):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        _, I = index.search(query.reshape(1, -1), k, **params)
+        latencies.append(time.perf_counter() - t0)
+        hits += len(set(I[0].tolist()) & set(expected.tolist()))
+    latencies.sort()
+    return {
+        'recall': hits / (k * len(queries)),
+        'p50_ms': latencies[len(latencies) // 2] * 1e3,
+        'p99_ms': latencies[int(0.99 * (len(latencies) - 1))] * 1e3,
+    }
+
+
+def index_mb(index: KnowledgeIndex) -> float:
+    """Memoria de los códigos del índice (tamaño serializado de los shards)."""
+    return sum(faiss.serialize_index(shard).nbytes for shard in index.shards) / 2**20
+
+
+def operating_points(index_type: str):
+    """Parámetros de búsqueda a barrer por tipo de índice, con su etiqueta."""
+    if index_type in ('ivf', 'ivfpq'):
+        reranks = (0, 4, 16) if index_type == 'ivfpq' else (0,)
+        return [(f"nprobe={nprobe}" + (f",rr={rerank}" if rerank else ''), {'nprobe': nprobe, 'rerank': rerank})
+                for nprobe in NPROBES for rerank in reranks]
+    if index_type == 'hnsw':
+        return [(f"ef={ef_search}", {'ef_search': ef_search}) for ef_search in EF_SEARCHES]
+    if index_type == 'sq8':
+        return [('-', {'rerank': 0}), ('rr=4', {'rerank': 4})]
+    return [('-', {})]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--egw-dir', default=DEFAULT_SOURCES['egw'])
+    parser.add_argument('--other-dir', default=DEFAULT_SOURCES['other'])
+    parser.add_argument('--types', nargs='+', choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument('--k', type=int, default=10, help='Resultados por consulta')
+    parser.add_argument('--samples', type=int, default=300, help='Consultas sintéticas')
+    parser.add_argument('--noise', type=float, default=0.01, help='Desviación del ruido de las consultas')
+    parser.add_argument('--queries', help='Embeddings de consulta reales (.npy)')
+    parser.add_argument('--nlist', type=int, help='Listas de IVF (por defecto 4 * sqrt(n))')
+    parser.add_argument('--hnsw-m', type=int, default=32)
+    parser.add_argument('--pq-m', type=int, default=64, help='Bytes por vector de IVF-PQ')
+    parser.add_argument('--threads', type=int, help='Hilos OpenMP de FAISS')
+    parser.add_argument('--source', nargs='+', help='Filtrar por fuente')
+    parser.add_argument('--book', nargs='+', help='Filtrar por obra')
+    parser.add_argument('--language', nargs='+', help='Filtrar por idioma')
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    sources = {'egw': args.egw_dir, 'other': args.other_dir}
+
+    flat = KnowledgeIndex.build(sources)
+    print(f"{flat.ntotal} vectores de {len(flat.books)} obras, d={flat.dimension}; "
+          f"copia float16 para reordenar: {flat.ntotal * flat.dimension * 2 / 2**20:.1f} MB (mmap)")
+    queries = make_queries(flat, args)
+    filters = {field: getattr(args, field) for field in ('source', 'book', 'language') if getattr(args, field)}
+    if filters:
+        selected = sum(end - start for start, end in flat.id_ranges(filters))
+        print(f"Filtro {filters}: {selected} vectores ({selected / flat.ntotal:.1%})")
+    _, truth = flat.search(queries, args.k, filters=filters or None)
+
+    print(f"\n{'índice':<8}{'MB':>8}{'build s':>9}{'parámetros':>20}{f'recall@{args.k}':>12}{'p50 ms':>9}{'p99 ms':>9}")
+    for index_type in args.types:
+        t0 = time.perf_counter()
+        index = flat if index_type == 'flat' else KnowledgeIndex.build(
+            sources, index_type=index_type, nlist=args.nlist, hnsw_m=args.hnsw_m, pq_m=args.pq_m,
+            rerank_copy=index_type in ('sq8', 'ivfpq'))
+        build = time.perf_counter() - t0
+        size = index_mb(index)
+        for label, params in operating_points(index_type):
+            r = measure(index, queries, truth, args.k, filters=filters or None, **params)
+            print(f"{index_type:<8}{size:>8.1f}{build:>9.1f}{label:>20}{r['recall']:>12.3f}"
+                  f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
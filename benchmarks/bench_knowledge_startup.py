@@ -0,0 +1,148 @@
+"""
+Benchmark del arranque de la base de conocimientos: tiempo de carga y memoria por worker
+
+Lanza --workers procesos a la vez (como los workers de gunicorn) para cada modo:
+  - eager:  comportamiento anterior; read_index de cada obra y pickle.load de cada .pkl
+  - lazy:   índices por obra abiertos con mmap; los .pkl se cargan al primer uso
+  - merged: índice unificado (python -m Nevin_AI.knowledge_index) abierto con mmap
+
+Cada worker mide el tiempo de carga, hace --queries búsquedas (que tocan todas las
+páginas de los vectores) y, con todos los workers vivos, informa:
+  - RSS: memoria residente, incluidas las páginas compartidas
+  - USS: memoria exclusiva del worker (lo que se multiplica por el número de workers)
+  - PSS: RSS con las páginas compartidas repartidas entre los procesos que las usan
+
+Los tiempos son con la caché de páginas caliente (el segundo arranque en adelante).
+
+Uso:
+    python benchmarks/bench_knowledge_startup.py
+    python benchmarks/bench_knowledge_startup.py --workers 4 --index-dir instance/knowledge_index
+"""
+import argparse
+import gc
+import multiprocessing
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import faiss
+import numpy as np
+import psutil
+
+from Nevin_AI.knowledge_index import DEFAULT_SOURCES, KnowledgeIndex, open_index
+
+
+class _Placeholder:
+    """Sustituye clases de LangChain no instaladas para poder medir el coste de los .pkl."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        self.__dict__.update(state if isinstance(state, dict) else {'state': state})
+
+
+class _TolerantUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        try:
+            return super().find_class(module, name)
+        except (ImportError, AttributeError):
+            return _Placeholder
+
+
+def load_eager(sources, index_dir):
+    indexes, data = [], []
+    for directory in sources.values():
+        for index_file in sorted(Path(directory).glob('*.faiss')):
+            indexes.append(faiss.read_index(str(index_file)))
+            pkl_file = index_file.with_suffix('.pkl')
+            if pkl_file.exists():
+                with open(pkl_file, 'rb') as f:
+                    data.append(_TolerantUnpickler(f).load())
+    return indexes, data
+
+
+def load_lazy(sources, index_dir):
+    indexes, data_files = [], []
+    for directory in sources.values():
+        for index_file in sorted(Path(directory).glob('*.faiss')):
+            indexes.append(open_index(index_file, mmap=True))
+            data_files.append(index_file.with_suffix('.pkl'))
+    return indexes, data_files
+
+
+def load_merged(sources, index_dir):
+    index = KnowledgeIndex.load(index_dir, mmap=True)
+    return index.shards, None
+
+
+MODES = {'eager': load_eager, 'lazy': load_lazy, 'merged': load_merged}
+
+
+def run_worker(mode, args, index_dir, barrier, queue):
+    process = psutil.Process()
+    before = process.memory_info().rss
+    started = time.perf_counter()
+    indexes, _ = MODES[mode]({'egw': args.egw_dir, 'other': args.other_dir}, index_dir)
+    startup = time.perf_counter() - started
+    loaded_rss = process.memory_info().rss - before
+
+    rng = np.random.default_rng(23)
+    queries = rng.standard_normal((args.queries, indexes[0].d)).astype('float32')
+    for query in queries:
+        for index in indexes:
+            index.search(query.reshape(1, -1), 5)
+    gc.collect()
+
+    barrier.wait()  # Medir con todos los workers vivos para que PSS reparta lo compartido
+    memory = process.memory_full_info()
+    queue.put({
+        'startup_s': startup,
+        'loaded_mb': loaded_rss / 2**20,
+        'rss_mb': memory.rss / 2**20,
+        'uss_mb': memory.uss / 2**20,
+        'pss_mb': memory.pss / 2**20,
+    })
+    barrier.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--egw-dir', default=DEFAULT_SOURCES['egw'])
+    parser.add_argument('--other-dir', default=DEFAULT_SOURCES['other'])
+    parser.add_argument('--index-dir', help='Índice unificado ya construido (por defecto se construye uno temporal)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queries', type=int, default=3, help='Búsquedas por worker tras arrancar')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = args.index_dir
+        if not index_dir:
+            index_dir = tmp
+            KnowledgeIndex.build({'egw': args.egw_dir, 'other': args.other_dir}).save(index_dir)
+
+        ctx = multiprocessing.get_context('spawn')
+        print(f"{args.workers} workers por modo (medias por worker)\n")
+        print(f"{'modo':<8}{'arranque s':>12}{'carga MB':>10}{'RSS MB':>9}{'USS MB':>9}{'PSS MB':>9}")
+        for mode in MODES:
+            barrier = ctx.Barrier(args.workers)
+            queue = ctx.Queue()
+            workers = [ctx.Process(target=run_worker, args=(mode, args, index_dir, barrier, queue))
+                       for _ in range(args.workers)]
+            for worker in workers:
+                worker.start()
+            results = [queue.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+
+            mean = {key: sum(r[key] for r in results) / len(results) for key in results[0]}
+            print(f"{mode:<8}{mean['startup_s']:>12.3f}{mean['loaded_mb']:>10.1f}{mean['rss_mb']:>9.1f}"
+                  f"{mean['uss_mb']:>9.1f}{mean['pss_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Orden canónico de los libros bíblicos y codificación compacta de referencias
+"""
+from typing import List, Optional, Tuple
+
+# Biblical order of books
+BIBLE_BOOKS_ORDER = [
+    # Old Testament
+    'Génesis',
+    'Éxodo',
+    'Levítico',
+    'Números',
+    'Deuteronomio',
+    'Josué',
+    'Jueces',
+    'Rut',
+    '1 Samuel',
+    '2 Samuel',
+    '1 Reyes',
+    '2 Reyes',
+    '1 Crónicas',
+    '2 Crónicas',
+    'Esdras',
+    'Nehemías',
+    'Ester',
+    'Job',
+    'Salmos',
+    'Proverbios',
+    'Eclesiastés',
+    'Cantares',
+    'Isaías',
+    'Jeremías',
+    'Lamentaciones',
+    'Ezequiel',
+    'Daniel',
+    'Oseas',
+    'Joel',
+    'Amós',
+    'Abdías',
+    'Jonás',
+    'Miqueas',
+    'Nahúm',
+    'Habacuc',
+    'Sofonías',
+    'Hageo',
+    'Zacarías',
+    'Malaquías',
+    # New Testament
+    'Mateo',
+    'Marcos',
+    'Lucas',
+    'Juan',
+    'Hechos',
+    'Romanos',
+    '1 Corintios',
+    '2 Corintios',
+    'Gálatas',
+    'Efesios',
+    'Filipenses',
+    'Colosenses',
+    '1 Tesalonicenses',
+    '2 Tesalonicenses',
+    '1 Timoteo',
+    '2 Timoteo',
+    'Tito',
+    'Filemón',
+    'Hebreos',
+    'Santiago',
+    '1 Pedro',
+    '2 Pedro',
+    '1 Juan',
+    '2 Juan',
+    '3 Juan',
+    'Judas',
+    'Apocalipsis'
+]
+
+_BOOK_INDEX = {book: i for i, book in enumerate(BIBLE_BOOKS_ORDER, start=1)}
+
+# Una referencia se codifica como libro * 1_000_000 + capítulo * 1_000 + versículo,
+# lo que cabe en un int32 y conserva el orden canónico al ordenar numéricamente.
+_BOOK_FACTOR = 1_000_000
+_CHAPTER_FACTOR = 1_000
+
+
+def book_index(book: str) -> Optional[int]:
+    """Devuelve la posición canónica (1-66) de un libro o None si no existe."""
+    return _BOOK_INDEX.get(book)
+
+
+def encode_verse_key(book: str, chapter: int, verse: int) -> int:
+    """
+    Codifica una referencia bíblica como entero.
+
+    Raises:
+        ValueError: Si el libro no existe o capítulo/versículo están fuera de rango
+    """
+    index = _BOOK_INDEX.get(book)
+    if index is None:
+        raise ValueError(f"Libro desconocido: {book}")
+    chapter, verse = int(chapter), int(verse)
+    if not 0 <= chapter < _BOOK_FACTOR // _CHAPTER_FACTOR or not 0 <= verse < _CHAPTER_FACTOR:
+        raise ValueError(f"Referencia fuera de rango: {book} {chapter}:{verse}")
+    return index * _BOOK_FACTOR + chapter * _CHAPTER_FACTOR + verse
+
+
+def decode_verse_key(key: int) -> Tuple[str, int, int]:
+    """Decodifica un entero generado por encode_verse_key en (libro, capítulo, versículo)."""
+    key = int(key)
+    index, rest = divmod(key, _BOOK_FACTOR)
+    chapter, verse = divmod(rest, _CHAPTER_FACTOR)
+    if not 1 <= index <= len(BIBLE_BOOKS_ORDER):
+        raise ValueError(f"Clave de versículo inválida: {key}")
+    return BIBLE_BOOKS_ORDER[index - 1], chapter, verse
+
+
+def format_verse_key(key: int) -> str:
+    """Formatea una clave de versículo como referencia legible ("Juan 3:16")."""
+    book, chapter, verse = decode_verse_key(key)
+    return f"{book} {chapter}:{verse}"
+
+
+# Etiqueta de caché de todo lo derivado del texto bíblico; se invalida al recargar los datos
+BIBLE_DATASET_TAG = 'dataset:bible'
+
+
+def bible_cache_tags(book: str) -> List[str]:
+    """Etiquetas de caché de las entradas que dependen de un libro."""
+    return [BIBLE_DATASET_TAG, f"book:{book}"]
+
+
+def translation_cache_tag(code: str) -> str:
+    """Etiqueta cuya generación versiona el texto de una traducción (se invalida al importarla)."""
+    return f"translation:{code}"
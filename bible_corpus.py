@@ -0,0 +1,369 @@
+"""
+BibleCorpus - Corpus bíblico en memoria con un buffer de texto por traducción
+"""
+import itertools
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from cachetools import LRUCache
+
+from bible_books import decode_verse_key, encode_verse_key, translation_cache_tag
+
+try:
+    import zstandard as zstd
+except ImportError:
+    logging.warning("zstandard no disponible, el corpus bíblico se guardará sin comprimir")
+    zstd = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TranslationLoader = Callable[[str], Iterable[Tuple[int, str]]]
+TranslationVersion = Callable[[str], int]
+
+# Todas las claves de un capítulo comparten el mismo valor de key // _CHAPTER_SPAN
+_CHAPTER_SPAN = 1000
+
+_buffer_serials = itertools.count()
+# Marca de "nunca comprobado" en BibleCorpus._empty (None es una versión válida)
+_UNCHECKED = object()
+
+
+def _sorted_rows(rows: Iterable[Tuple[int, str]]) -> List[Tuple[int, bytes]]:
+    """Ordena pares (clave, texto) por clave y codifica el texto en UTF-8."""
+    return [(key, text.encode('utf-8'))
+            for key, text in sorted((int(key), text) for key, text in rows if text)]
+
+
+class TranslationBuffer:
+    """
+    Texto completo de una traducción en un único buffer UTF-8.
+
+    Los versículos se ordenan por clave (bible_books.encode_verse_key), de modo que un
+    capítulo es un rango contiguo de claves y de bytes en el buffer.
+    """
+
+    __slots__ = ('code', 'keys', 'offsets', 'data')
+
+    def __init__(self, code: str, keys: np.ndarray, offsets: np.ndarray, data: bytes):
+        self.code = code
+        self.keys = keys
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_rows(cls, code: str, rows: Iterable[Tuple[int, str]]) -> 'TranslationBuffer':
+        """Construye el buffer a partir de pares (clave, texto) en cualquier orden."""
+        ordered = _sorted_rows(rows)
+        offsets = np.zeros(len(ordered) + 1, dtype=np.int64)
+        if ordered:
+            offsets[1:] = np.cumsum([len(chunk) for _, chunk in ordered])
+        keys = np.fromiter((key for key, _ in ordered), dtype=np.int32, count=len(ordered))
+        return cls(code, keys, offsets, b''.join(chunk for _, chunk in ordered))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def range(self, low: int, high: int) -> List[Tuple[int, str]]:
+        """Devuelve los versículos con clave en [low, high] como pares (clave, texto)."""
+        start = int(np.searchsorted(self.keys, low, side='left'))
+        end = int(np.searchsorted(self.keys, high, side='right'))
+        offsets = self.offsets
+        return [
+            (int(self.keys[i]), self.data[offsets[i]:offsets[i + 1]].decode('utf-8'))
+            for i in range(start, end)
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.keys.nbytes + self.offsets.nbytes
+
+
+class CompressedTranslationBuffer:
+    """
+    Texto de una traducción comprimido por capítulo con zstd.
+
+    Cada capítulo es un bloque independiente comprimido con un diccionario entrenado
+    sobre los propios capítulos de la traducción, lo que permite descomprimir solo el
+    capítulo pedido. Los capítulos descomprimidos se guardan en un LRU compartido.
+    """
+
+    __slots__ = ('code', 'keys', 'local_offsets', 'chapter_starts', 'block_offsets',
+                 'blob', 'dictionary', '_cache', '_cache_lock', '_local', '_serial')
+
+    def __init__(self, code: str, keys: np.ndarray, local_offsets: np.ndarray,
+                 chapter_starts: np.ndarray, block_offsets: np.ndarray, blob: bytes,
+                 dictionary: Optional['zstd.ZstdCompressionDict'], cache: LRUCache,
+                 cache_lock: threading.Lock):
+        self.code = code
+        self.keys = keys
+        self.local_offsets = local_offsets
+        self.chapter_starts = chapter_starts
+        self.block_offsets = block_offsets
+        self.blob = blob
+        self.dictionary = dictionary
+        self._cache = cache
+        self._cache_lock = cache_lock
+        # Los descompresores de zstandard no deben compartirse entre hilos
+        self._local = threading.local()
+        # Distingue en el LRU compartido los capítulos de este buffer de los de uno anterior
+        # de la misma traducción que aún se esté leyendo durante una recarga
+        self._serial = next(_buffer_serials)
+
+    @classmethod
+    def from_rows(cls, code: str, rows: Iterable[Tuple[int, str]], cache: LRUCache,
+                  cache_lock: threading.Lock, level: int = 19,
+                  dict_size: int = 16 * 1024) -> 'CompressedTranslationBuffer':
+        """
+        Construye los bloques comprimidos a partir de pares (clave, texto).
+
+        Args:
+            cache: LRU compartido para capítulos descomprimidos
+            cache_lock: Lock que protege el LRU
+            level: Nivel de compresión zstd
+            dict_size: Tamaño máximo del diccionario entrenado
+        """
+        ordered = _sorted_rows(rows)
+        keys = np.fromiter((key for key, _ in ordered), dtype=np.int32, count=len(ordered))
+        local_offsets = np.zeros(len(ordered), dtype=np.uint32)
+
+        blocks, chapter_starts = [], []
+        current_chapter, parts, position = None, [], 0
+        for i, (key, chunk) in enumerate(ordered):
+            chapter = key // _CHAPTER_SPAN
+            if chapter != current_chapter:
+                if parts:
+                    blocks.append(b''.join(parts))
+                current_chapter, parts, position = chapter, [], 0
+                chapter_starts.append(i)
+            local_offsets[i] = position
+            parts.append(chunk)
+            position += len(chunk)
+        if parts:
+            blocks.append(b''.join(parts))
+
+        dictionary = None
+        if len(blocks) >= 8:
+            try:
+                dictionary = zstd.train_dictionary(dict_size, blocks)
+            except zstd.ZstdError as e:
+                logger.warning(f"No se pudo entrenar diccionario zstd para {code}: {str(e)}")
+
+        compressor = zstd.ZstdCompressor(level=level, dict_data=dictionary)
+        compressed = [compressor.compress(block) for block in blocks]
+        block_offsets = np.zeros(len(compressed) + 1, dtype=np.int64)
+        if compressed:
+            block_offsets[1:] = np.cumsum([len(block) for block in compressed])
+
+        return cls(code, keys, local_offsets,
+                   np.array(chapter_starts + [len(ordered)], dtype=np.int32),
+                   block_offsets, b''.join(compressed), dictionary, cache, cache_lock)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _decompressor(self) -> 'zstd.ZstdDecompressor':
+        decompressor = getattr(self._local, 'decompressor', None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstd.ZstdDecompressor(dict_data=self.dictionary)
+        return decompressor
+
+    def chapter_block(self, chapter_index: int) -> bytes:
+        """Devuelve el texto descomprimido de un capítulo, pasando por el LRU."""
+        cache_key = (self.code, self._serial, chapter_index)
+        with self._cache_lock:
+            block = self._cache.get(cache_key)
+        if block is not None:
+            return block
+
+        start, end = self.block_offsets[chapter_index], self.block_offsets[chapter_index + 1]
+        block = self._decompressor().decompress(self.blob[start:end])
+        with self._cache_lock:
+            self._cache[cache_key] = block
+        return block
+
+    def range(self, low: int, high: int) -> List[Tuple[int, str]]:
+        """Devuelve los versículos con clave en [low, high] como pares (clave, texto)."""
+        start = int(np.searchsorted(self.keys, low, side='left'))
+        end = int(np.searchsorted(self.keys, high, side='right'))
+        verses = []
+        i = start
+        while i < end:
+            chapter_index = int(np.searchsorted(self.chapter_starts, i, side='right')) - 1
+            chapter_end = int(self.chapter_starts[chapter_index + 1])
+            block = self.chapter_block(chapter_index)
+            for j in range(i, min(end, chapter_end)):
+                verse_end = int(self.local_offsets[j + 1]) if j + 1 < chapter_end else len(block)
+                verses.append((int(self.keys[j]), block[int(self.local_offsets[j]):verse_end].decode('utf-8')))
+            i = chapter_end
+        return verses
+
+    @property
+    def nbytes(self) -> int:
+        dictionary_size = len(self.dictionary.as_bytes()) if self.dictionary is not None else 0
+        return (len(self.blob) + dictionary_size + self.keys.nbytes + self.local_offsets.nbytes
+                + self.chapter_starts.nbytes + self.block_offsets.nbytes)
+
+
+class BibleCorpus:
+    """
+    Corpus bíblico en memoria.
+
+    Cada traducción se carga de forma perezosa la primera vez que se solicita, así que la
+    memoria crece con las traducciones que realmente se leen y no con todas las disponibles.
+    Con compress=True el texto se guarda por capítulo comprimido con zstd (ver
+    CompressedTranslationBuffer).
+    """
+
+    def __init__(self, loader: Optional[TranslationLoader] = None, compress: bool = False,
+                 chapter_cache_size: int = 256, version: Optional[TranslationVersion] = None):
+        """
+        Args:
+            loader: Función que devuelve los pares (clave, texto) de una traducción
+            compress: Comprimir el texto por capítulo con un diccionario zstd
+            chapter_cache_size: Capítulos descomprimidos a conservar en el LRU
+            version: Función que devuelve la versión vigente de una traducción; si cambia
+                respecto a la del buffer cargado, la traducción se recarga con `loader`
+        """
+        self._loader = loader
+        self._version = version
+        self._buffers: Dict[str, Union[TranslationBuffer, CompressedTranslationBuffer]] = {}
+        # Versión de cada traducción en el momento de cargarla
+        self._loaded_versions: Dict[str, Optional[int]] = {}
+        # Códigos sin versículos (desconocidos o vacíos) con la versión en que se comprobaron,
+        # para no repetir la consulta en cada petición; acotado porque el código llega del cliente
+        self._empty: LRUCache = LRUCache(maxsize=256)
+        self._lock = threading.Lock()
+        if compress and zstd is None:
+            logger.warning("Compresión del corpus solicitada pero zstandard no está instalado")
+            compress = False
+        self.compress = compress
+        self._chapter_cache = LRUCache(maxsize=chapter_cache_size)
+        self._chapter_cache_lock = threading.Lock()
+
+    def _build_buffer(self, code: str, rows: Iterable[Tuple[int, str]]):
+        if self.compress:
+            return CompressedTranslationBuffer.from_rows(
+                code, rows, self._chapter_cache, self._chapter_cache_lock)
+        return TranslationBuffer.from_rows(code, rows)
+
+    @property
+    def translations(self) -> List[str]:
+        """Códigos de las traducciones cargadas."""
+        return list(self._buffers)
+
+    def add_translation(self, code: str, rows: Iterable[Tuple[int, str]]):
+        """Carga (o reemplaza) una traducción a partir de pares (clave, texto)."""
+        version = self._version(code) if self._version is not None else None
+        buffer = self._build_buffer(code, rows)
+        with self._lock:
+            self._buffers[code] = buffer
+            self._loaded_versions[code] = version
+            self._empty.pop(code, None)
+        self._evict_chapters(code)
+        logger.info(f"Traducción {code} cargada en memoria: {len(buffer)} versículos, {buffer.nbytes} bytes")
+        return buffer
+
+    def unload(self, code: str) -> bool:
+        """Libera una traducción de la memoria."""
+        with self._lock:
+            removed = self._buffers.pop(code, None) is not None
+            self._loaded_versions.pop(code, None)
+            self._empty.pop(code, None)
+        self._evict_chapters(code)
+        return removed
+
+    def _evict_chapters(self, code: str):
+        with self._chapter_cache_lock:
+            for cache_key in [k for k in self._chapter_cache if k[0] == code]:
+                del self._chapter_cache[cache_key]
+
+    def _buffer(self, code: str):
+        buffer = self._buffers.get(code)
+        if self._loader is None:
+            return buffer
+        # La versión se lee antes de cargar: una importación concurrente forzará otra recarga
+        version = self._version(code) if self._version is not None else None
+        if buffer is not None and self._loaded_versions.get(code) == version:
+            return buffer
+        with self._lock:
+            buffer = self._buffers.get(code)
+            if buffer is not None and self._loaded_versions.get(code) == version:
+                return buffer
+            if buffer is None and self._empty.get(code, _UNCHECKED) == version:
+                return None
+            stale = buffer is not None
+            buffer = self._build_buffer(code, self._loader(code))
+            if stale:
+                self._buffers.pop(code, None)
+                self._loaded_versions.pop(code, None)
+                self._evict_chapters(code)
+            if not len(buffer):
+                logger.warning(f"Traducción {code} sin versículos")
+                self._empty[code] = version
+                return None
+            self._empty.pop(code, None)
+            self._buffers[code] = buffer
+            self._loaded_versions[code] = version
+            logger.info(f"Traducción {code} cargada en memoria: {len(buffer)} versículos, {buffer.nbytes} bytes")
+        return buffer
+
+    def _collect(self, low: int, high: int, translations: Sequence[str]) -> List[Dict]:
+        verses: Dict[int, Dict] = {}
+        for code in translations:
+            buffer = self._buffer(code)
+            if buffer is None:
+                continue
+            for key, text in buffer.range(low, high):
+                entry = verses.get(key)
+                if entry is None:
+                    book, chapter, verse = decode_verse_key(key)
+                    entry = verses[key] = {'book': book, 'chapter': chapter, 'verse': verse, 'texts': {}}
+                entry['texts'][code] = text
+        return [verses[key] for key in sorted(verses)]
+
+    def get_chapter(self, book: str, chapter: int, translations: Sequence[str]) -> List[Dict]:
+        """
+        Obtiene los versículos de un capítulo en las traducciones pedidas.
+
+        Returns:
+            Lista ordenada de versículos con un diccionario 'texts' código -> texto
+        """
+        low = encode_verse_key(book, chapter, 0)
+        return self._collect(low, low + 999, translations)
+
+    def get_verse(self, book: str, chapter: int, verse: int, translations: Sequence[str]) -> Optional[Dict]:
+        """Obtiene un versículo en las traducciones pedidas o None si no existe."""
+        key = encode_verse_key(book, chapter, verse)
+        found = self._collect(key, key, translations)
+        return found[0] if found else None
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes ocupados por cada traducción cargada."""
+        return {code: buffer.nbytes for code, buffer in self._buffers.items()}
+
+
+def _load_from_database(code: str) -> Iterable[Tuple[int, str]]:
+    from bible_data_access import bible_data_access
+    return bible_data_access.iter_translation(code)
+
+
+def _translation_version(code: str) -> int:
+    from cache_manager import cache_manager
+    return cache_manager.generation(translation_cache_tag(code))
+
+
+# Instancia global del corpus bíblico en memoria; import_translation invalida la etiqueta
+# de la traducción y cada worker recarga su buffer al detectar la nueva generación
+bible_corpus = BibleCorpus(
+    loader=_load_from_database,
+    compress=os.environ.get('BIBLE_CORPUS_COMPRESS', '1') == '1',
+    chapter_cache_size=int(os.environ.get('BIBLE_CORPUS_CHAPTER_CACHE', 256)),
+    version=_translation_version
+)
@@ -2,14 +2,16 @@
 BibleDataAccess - Sistema robusto de acceso a datos bíblicos con caché multinivel
 """
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterable, Sequence, Tuple
 from datetime import datetime, timedelta
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 from sqlalchemy.exc import SQLAlchemyError
 from tenacity import retry, stop_after_attempt, wait_exponential
 from extensions import db
 from cache_manager import cache_manager
 from database import db_manager
+from models import LEGACY_TRANSLATION_COLUMNS
+from bible_books import encode_verse_key, decode_verse_key, bible_cache_tags, translation_cache_tag
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,6 +19,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# El texto bíblico casi nunca cambia (y al importar se invalida por etiqueta): pasada
+# la hora de vigencia se sirve un día más mientras se recarga en segundo plano
+BIBLE_CACHE_TTL = 3600
+BIBLE_STALE_TTL = 86400
+
 class BibleDataAccess:
     """Gestor robusto de acceso a datos bíblicos con caché multinivel."""
 
@@ -30,7 +37,8 @@ class BibleDataAccess:
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10)
     )
-    def get_verse(self, book: str, chapter: int, verse: int) -> Dict[str, Any]:
+    def get_verse(self, book: str, chapter: int, verse: int,
+                  translations: Optional[Sequence[str]] = None) -> Dict[str, Any]:
         """
         Obtiene un versículo específico con caché.
 
@@ -38,31 +46,35 @@ class BibleDataAccess:
             book: Nombre del libro
             chapter: Número de capítulo
             verse: Número de versículo
+            translations: Códigos de traducción a leer de las tablas normalizadas;
+                None mantiene las columnas heredadas spanish_text/tzotzil_text
 
         Returns:
             Diccionario con datos del versículo o error
         """
         cache_key = f"verse:{book}:{chapter}:{verse}"
-        try:
-            # Verificar caché
-            cached_result = self.cache.get(cache_key)
-            if cached_result:
-                logger.debug(f"Cache hit para versículo {book} {chapter}:{verse}")
-                return cached_result
+        if translations:
+            cache_key += f":{','.join(translations)}"
 
+        def load() -> Dict[str, Any]:
             start_time = datetime.now()
-            result = self._fetch_verse(book, chapter, verse)
+            if translations:
+                result = self._fetch_translated_verse(book, chapter, verse, translations)
+            else:
+                result = self._fetch_verse(book, chapter, verse)
             query_time = (datetime.now() - start_time).total_seconds()
 
             if query_time > 0.5:
                 logger.warning(f"Consulta lenta ({query_time:.2f}s) para {book} {chapter}:{verse}")
-
-            # Guardar en caché si la consulta fue exitosa
-            if result['success']:
-                self.cache.set(cache_key, result, ttl=3600)
-
             return result
 
+        try:
+            # Una sola consulta por clave aunque expire con muchas peticiones concurrentes;
+            # solo se guarda en caché si la consulta fue exitosa
+            return self.cache.get_or_compute(
+                cache_key, load, ttl=BIBLE_CACHE_TTL, cache_if=lambda result: result['success'],
+                tags=bible_cache_tags(book), stale_ttl=BIBLE_STALE_TTL
+            )
         except Exception as e:
             logger.error(f"Error obteniendo versículo: {str(e)}", exc_info=True)
             return {
@@ -76,7 +88,7 @@ class BibleDataAccess:
         try:
             session = self.db.get_session()
             query = """
-                SELECT book, chapter, verse, spanish_text, tzotzil_text, version 
+                SELECT book, chapter, verse, spanish_text, tzotzil_text 
                 FROM bibleverse 
                 WHERE book = :book 
                 AND chapter = :chapter 
@@ -99,8 +111,7 @@ class BibleDataAccess:
                 'chapter': result.chapter,
                 'verse': result.verse,
                 'spanish_text': result.spanish_text,
-                'tzotzil_text': result.tzotzil_text,
-                'version': result.version
+                'tzotzil_text': result.tzotzil_text
             }
 
             return {
@@ -117,38 +128,41 @@ class BibleDataAccess:
                 'data': None
             }
 
-    def get_chapter(self, book: str, chapter: int) -> Dict[str, Any]:
+    def get_chapter(self, book: str, chapter: int,
+                    translations: Optional[Sequence[str]] = None) -> Dict[str, Any]:
         """
         Obtiene un capítulo completo con caché.
 
         Args:
             book: Nombre del libro
             chapter: Número de capítulo
+            translations: Códigos de traducción a leer de las tablas normalizadas;
+                None mantiene las columnas heredadas spanish_text/tzotzil_text
 
         Returns:
             Diccionario con versículos del capítulo o error
         """
-        cache_key = f"chapter:{book}:{chapter}"
-        try:
-            # Verificar caché
-            cached_result = self.cache.get(cache_key)
-            if cached_result:
-                logger.debug(f"Cache hit para capítulo {book} {chapter}")
-                return cached_result
+        cache_key = self._chapter_cache_key(book, chapter, translations)
 
+        def load() -> Dict[str, Any]:
             start_time = datetime.now()
-            result = self._fetch_chapter(book, chapter)
+            if translations:
+                result = self._fetch_translated_chapter(book, chapter, translations)
+            else:
+                result = self._fetch_chapter(book, chapter)
             query_time = (datetime.now() - start_time).total_seconds()
 
             if query_time > 1.0:
                 logger.warning(f"Consulta lenta ({query_time:.2f}s) para capítulo {book} {chapter}")
-
-            # Guardar en caché si la consulta fue exitosa
-            if result['success']:
-                self.cache.set(cache_key, result, ttl=3600)
-
             return result
 
+        try:
+            # Una sola consulta por clave aunque expire con muchas peticiones concurrentes;
+            # solo se guarda en caché si la consulta fue exitosa
+            return self.cache.get_or_compute(
+                cache_key, load, ttl=BIBLE_CACHE_TTL, cache_if=lambda result: result['success'],
+                tags=bible_cache_tags(book), stale_ttl=BIBLE_STALE_TTL
+            )
         except Exception as e:
             logger.error(f"Error obteniendo capítulo: {str(e)}", exc_info=True)
             return {
@@ -157,12 +171,128 @@ class BibleDataAccess:
                 'data': None
             }
 
+    @staticmethod
+    def _chapter_cache_key(book: str, chapter: int, translations: Optional[Sequence[str]] = None) -> str:
+        cache_key = f"chapter:{book}:{chapter}"
+        if translations:
+            cache_key += f":{','.join(translations)}"
+        return cache_key
+
+    def get_passage(self, book: str, chapter: int, context: int = 1,
+                    translations: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Obtiene un capítulo junto con sus capítulos vecinos para la vista de lectura.
+
+        Args:
+            book: Nombre del libro
+            chapter: Capítulo central
+            context: Capítulos anteriores y posteriores a incluir
+            translations: Códigos de traducción (None usa las columnas heredadas)
+
+        Returns:
+            Diccionario con {'book', 'chapter', 'chapters': [{'chapter', 'verses'}]} o error
+        """
+        try:
+            numbers = [n for n in range(chapter - context, chapter + context + 1) if n >= 1]
+            chapters = self.prefetch_chapters(book, numbers, translations)
+            if chapter not in chapters:
+                return {
+                    'success': False,
+                    'error': "Capítulo no encontrado",
+                    'data': None
+                }
+            return {
+                'success': True,
+                'data': {
+                    'book': book,
+                    'chapter': chapter,
+                    'chapters': [{'chapter': n, 'verses': chapters[n]} for n in numbers if n in chapters]
+                },
+                'error': None
+            }
+        except Exception as e:
+            logger.error(f"Error obteniendo pasaje: {str(e)}", exc_info=True)
+            return {
+                'success': False,
+                'error': "Error interno del servidor",
+                'data': None
+            }
+
+    def prefetch_chapters(self, book: str, chapters: Sequence[int],
+                          translations: Optional[Sequence[str]] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Carga varios capítulos de un libro en el caché con un viaje a Redis y una consulta.
+
+        Los capítulos presentes se leen con get_many (L1 y un solo MGET); los que faltan
+        se leen en una sola consulta a la base de datos y se guardan con set_many.
+
+        Returns:
+            Diccionario {capítulo: versículos} con los capítulos existentes
+        """
+        keys = {self._chapter_cache_key(book, n, translations): n for n in chapters}
+        tags = bible_cache_tags(book)
+        result = {
+            keys[key]: cached['data']
+            for key, cached in self.cache.get_many(keys, tags=tags).items()
+            if cached.get('success')
+        }
+
+        missing = [n for n in chapters if n not in result]
+        if missing:
+            start_time = datetime.now()
+            fetched = self._fetch_chapters(book, missing, translations)
+            query_time = (datetime.now() - start_time).total_seconds()
+            if query_time > 1.0:
+                logger.warning(f"Consulta lenta ({query_time:.2f}s) para {len(missing)} capítulos de {book}")
+
+            self.cache.set_many({
+                self._chapter_cache_key(book, n, translations): {'success': True, 'data': verses, 'error': None}
+                for n, verses in fetched.items()
+            }, ttl=BIBLE_CACHE_TTL, tags=tags, stale_ttl=BIBLE_STALE_TTL)
+            result.update(fetched)
+        return result
+
+    def _fetch_chapters(self, book: str, chapters: Sequence[int],
+                        translations: Optional[Sequence[str]] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """Lee varios capítulos de un libro en una sola consulta."""
+        grouped: Dict[int, List[Dict[str, Any]]] = {}
+        if translations:
+            try:
+                low = encode_verse_key(book, min(chapters), 0)
+                high = encode_verse_key(book, max(chapters), 999)
+            except ValueError:
+                return {}
+            wanted = set(chapters)
+            for verse in self._fetch_texts(low, high, translations):
+                if verse['chapter'] in wanted:
+                    grouped.setdefault(verse['chapter'], []).append(verse)
+            return grouped
+
+        session = self.db.get_session()
+        query = text("""
+            SELECT book, chapter, verse, spanish_text, tzotzil_text
+            FROM bibleverse
+            WHERE book = :book
+            AND chapter IN :chapters
+            ORDER BY chapter, verse
+        """).bindparams(bindparam('chapters', expanding=True))
+        rows = session.execute(query, {'book': book, 'chapters': list(chapters)}).fetchall()
+        for row in rows:
+            grouped.setdefault(row.chapter, []).append({
+                'book': row.book,
+                'chapter': row.chapter,
+                'verse': row.verse,
+                'spanish_text': row.spanish_text,
+                'tzotzil_text': row.tzotzil_text
+            })
+        return grouped
+
     def _fetch_chapter(self, book: str, chapter: int) -> Dict[str, Any]:
         """Obtiene un capítulo de la base de datos."""
         try:
             session = self.db.get_session()
             query = """
-                SELECT book, chapter, verse, spanish_text, tzotzil_text, version 
+                SELECT book, chapter, verse, spanish_text, tzotzil_text 
                 FROM bibleverse 
                 WHERE book = :book 
                 AND chapter = :chapter 
@@ -185,8 +315,7 @@ class BibleDataAccess:
                 'chapter': row.chapter,
                 'verse': row.verse,
                 'spanish_text': row.spanish_text,
-                'tzotzil_text': row.tzotzil_text,
-                'version': row.version
+                'tzotzil_text': row.tzotzil_text
             } for row in results]
 
             return {
@@ -203,6 +332,198 @@ class BibleDataAccess:
                 'data': None
             }
 
+    def _fetch_texts(self, low: int, high: int, translations: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        Lee de verse_text los versículos con clave en [low, high] para las traducciones pedidas.
+
+        Solo se leen las filas de esas traducciones, así que el I/O crece con las
+        traducciones solicitadas y no con todas las disponibles.
+        """
+        session = self.db.get_session()
+        query = text("""
+            SELECT t.code, vt.verse_key_id, vt.text
+            FROM verse_text vt
+            JOIN translation t ON t.id = vt.translation_id
+            WHERE t.code IN :codes
+            AND vt.verse_key_id BETWEEN :low AND :high
+            ORDER BY vt.verse_key_id
+        """).bindparams(bindparam('codes', expanding=True))
+        rows = session.execute(
+            query,
+            {'codes': list(translations), 'low': low, 'high': high}
+        ).fetchall()
+
+        verses: Dict[int, Dict[str, Any]] = {}
+        for code, key, verse_text in rows:
+            entry = verses.get(key)
+            if entry is None:
+                book, chapter, verse = decode_verse_key(key)
+                entry = verses[key] = {'book': book, 'chapter': chapter, 'verse': verse, 'texts': {}}
+            entry['texts'][code] = verse_text
+        return [verses[key] for key in sorted(verses)]
+
+    def _fetch_translated_verse(self, book: str, chapter: int, verse: int,
+                                translations: Sequence[str]) -> Dict[str, Any]:
+        """Obtiene un versículo de las tablas normalizadas de traducciones."""
+        try:
+            key = encode_verse_key(book, chapter, verse)
+            verses = self._fetch_texts(key, key, translations)
+            if not verses:
+                return {
+                    'success': False,
+                    'error': "Versículo no encontrado",
+                    'data': None
+                }
+            return {
+                'success': True,
+                'data': verses[0],
+                'error': None
+            }
+        except ValueError:
+            return {
+                'success': False,
+                'error': "Versículo no encontrado",
+                'data': None
+            }
+        except SQLAlchemyError as e:
+            logger.error(f"Error de base de datos: {str(e)}", exc_info=True)
+            return {
+                'success': False,
+                'error': "Error de base de datos",
+                'data': None
+            }
+
+    def _fetch_translated_chapter(self, book: str, chapter: int,
+                                  translations: Sequence[str]) -> Dict[str, Any]:
+        """Obtiene un capítulo de las tablas normalizadas de traducciones."""
+        try:
+            low = encode_verse_key(book, chapter, 0)
+            verses = self._fetch_texts(low, low + 999, translations)
+            if not verses:
+                return {
+                    'success': False,
+                    'error': "Capítulo no encontrado",
+                    'data': None
+                }
+            return {
+                'success': True,
+                'data': verses,
+                'error': None
+            }
+        except ValueError:
+            return {
+                'success': False,
+                'error': "Capítulo no encontrado",
+                'data': None
+            }
+        except SQLAlchemyError as e:
+            logger.error(f"Error de base de datos: {str(e)}", exc_info=True)
+            return {
+                'success': False,
+                'error': "Error de base de datos",
+                'data': None
+            }
+
+    def iter_translation(self, code: str) -> Iterable[Tuple[int, str]]:
+        """
+        Devuelve todos los pares (clave, texto) de una traducción.
+
+        Si la traducción aún no se migró a verse_text, se lee de la columna heredada
+        correspondiente de bibleverse.
+        """
+        session = self.db.get_session()
+        rows = session.execute(text("""
+            SELECT vt.verse_key_id, vt.text
+            FROM verse_text vt
+            JOIN translation t ON t.id = vt.translation_id
+            WHERE t.code = :code
+        """), {'code': code}).fetchall()
+        if rows:
+            return [(row[0], row[1]) for row in rows]
+
+        column = LEGACY_TRANSLATION_COLUMNS.get(code)
+        if column is None:
+            return []
+        legacy_rows = session.execute(
+            text(f"SELECT book, chapter, verse, {column} FROM bibleverse")
+        ).fetchall()
+        pairs = []
+        for book, chapter, verse, verse_text in legacy_rows:
+            try:
+                pairs.append((encode_verse_key(book, chapter, verse), verse_text))
+            except ValueError:
+                continue
+        return pairs
+
+    def import_translation(self, code: str, name: str, language: str,
+                           verses: Iterable[Tuple[str, int, int, str]]) -> int:
+        """
+        Importa (o actualiza) una traducción en las tablas normalizadas.
+
+        Args:
+            code: Código corto de la traducción (p. ej. 'es', 'tzo')
+            name: Nombre legible
+            language: Código de idioma
+            verses: Tuplas (libro, capítulo, versículo, texto)
+
+        Returns:
+            Número de versículos importados
+        """
+        from models import Translation, VerseKey, VerseText
+
+        session = self.db.get_session()
+        try:
+            translation = session.query(Translation).filter_by(code=code).first()
+            if translation is None:
+                translation = Translation(code=code, name=name, language=language)
+                session.add(translation)
+                session.flush()
+
+            existing_keys = {key for (key,) in session.query(VerseKey.id)}
+            count = 0
+            books = set()
+            for book, chapter, verse, verse_text in verses:
+                key = encode_verse_key(book, chapter, verse)
+                books.add(book)
+                if key not in existing_keys:
+                    session.add(VerseKey(id=key, book=book, chapter=int(chapter), verse=int(verse)))
+                    existing_keys.add(key)
+                session.merge(VerseText(translation_id=translation.id, verse_key_id=key, text=verse_text))
+                count += 1
+
+            session.commit()
+            logger.info(f"Traducción {code} importada: {count} versículos")
+
+            # Nueva versión de los datos: invalidar las cachés de los libros importados y
+            # la versión de la traducción, con la que cada worker recarga su corpus en memoria
+            self.invalidate_books(books)
+            self.cache.invalidate(tag=translation_cache_tag(code))
+            from bible_corpus import bible_corpus
+            bible_corpus.unload(code)
+            return count
+
+        except Exception:
+            session.rollback()
+            raise
+
+    def invalidate_book(self, book: str) -> None:
+        """
+        Invalida las entradas de caché de un libro tras corregir sus datos.
+
+        Las búsquedas también se invalidan porque pueden incluir versículos del libro.
+        """
+        self.invalidate_books([book])
+
+    def invalidate_books(self, books: Iterable[str]) -> None:
+        """Invalida las entradas de caché de varios libros y, una sola vez, las búsquedas."""
+        books = sorted(set(books))
+        if not books:
+            return
+        for book in books:
+            self.cache.invalidate(tag=f"book:{book}")
+        self.cache.invalidate(namespace='search')
+        logger.info(f"Caché invalidado para {len(books)} libro(s): {', '.join(books)}")
+
     def get_chapters(self, book: str) -> Dict[str, Any]:
         """
         Obtiene la lista de capítulos disponibles para un libro.
@@ -216,7 +537,7 @@ class BibleDataAccess:
         cache_key = f"chapters:{book}"
         try:
             # Verificar caché
-            cached_result = self.cache.get(cache_key)
+            cached_result = self.cache.get(cache_key, tags=bible_cache_tags(book))
             if cached_result:
                 logger.debug(f"Cache hit para capítulos de {book}")
                 return cached_result
@@ -250,7 +571,7 @@ class BibleDataAccess:
             }
 
             # Guardar en caché
-            self.cache.set(cache_key, response, ttl=3600)
+            self.cache.set(cache_key, response, ttl=3600, tags=bible_cache_tags(book))
 
             if query_time > 0.5:
                 logger.warning(f"Consulta lenta ({query_time:.2f}s) al obtener capítulos de {book}")
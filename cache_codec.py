@@ -0,0 +1,192 @@
+"""
+CacheCodec - Codificación binaria compacta para el nivel L2 (Redis) del caché
+"""
+import json
+import logging
+import os
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:
+    logging.warning("msgpack no disponible, el caché usará orjson o JSON")
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    logging.warning("orjson no disponible, el caché usará JSON estándar")
+    orjson = None
+
+try:
+    import zstandard as zstd
+except ImportError:
+    logging.warning("zstandard no disponible, los valores del caché no se comprimirán")
+    zstd = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Formato de cada valor en Redis:
+#   byte 0: versión del formato
+#   byte 1: serializador (bits 0-6) | comprimido con zstd (bit 7)
+#   resto:  carga útil
+# Los valores JSON escritos antes de este formato empiezan con un carácter imprimible,
+# por lo que nunca se confunden con la cabecera.
+FORMAT_VERSION = 1
+COMPRESSED_FLAG = 0x80
+
+SERIALIZER_JSON = 0
+SERIALIZER_ORJSON = 1
+SERIALIZER_MSGPACK = 2
+
+SERIALIZER_NAMES = {
+    'json': SERIALIZER_JSON,
+    'orjson': SERIALIZER_ORJSON,
+    'msgpack': SERIALIZER_MSGPACK,
+}
+
+
+def _available(serializer: int) -> bool:
+    if serializer == SERIALIZER_MSGPACK:
+        return msgpack is not None
+    if serializer == SERIALIZER_ORJSON:
+        return orjson is not None
+    return True
+
+
+class CacheCodec:
+    """Serializa valores del caché con cabecera versionada y compresión opcional."""
+
+    def __init__(self, serializer: Optional[str] = None, compress_threshold: int = 1024,
+                 compression_level: int = 3):
+        """
+        Inicializa el codec.
+
+        Args:
+            serializer: 'msgpack', 'orjson' o 'json'; None elige el más rápido disponible
+            compress_threshold: Tamaño en bytes a partir del cual se comprime con zstd
+                (0 desactiva la compresión)
+            compression_level: Nivel de compresión de zstd
+        """
+        if serializer is None:
+            serializer = next(name for name in ('msgpack', 'orjson', 'json')
+                              if _available(SERIALIZER_NAMES[name]))
+        if serializer not in SERIALIZER_NAMES:
+            raise ValueError(f"Serializador de caché desconocido: {serializer}")
+        if not _available(SERIALIZER_NAMES[serializer]):
+            logger.warning(f"Serializador {serializer} no disponible, usando JSON")
+            serializer = 'json'
+
+        self.name = serializer
+        self.serializer = SERIALIZER_NAMES[serializer]
+        self.compress_threshold = compress_threshold if zstd is not None else 0
+        self._compressor = zstd.ZstdCompressor(level=compression_level) if zstd is not None else None
+        self._decompressor = zstd.ZstdDecompressor() if zstd is not None else None
+
+    def _dumps(self, value: Any) -> bytes:
+        if self.serializer == SERIALIZER_MSGPACK:
+            return msgpack.packb(value, use_bin_type=True)
+        if self.serializer == SERIALIZER_ORJSON:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value).encode('utf-8')
+
+    @staticmethod
+    def _loads(serializer: int, payload: bytes) -> Any:
+        if serializer == SERIALIZER_MSGPACK:
+            if msgpack is None:
+                raise ValueError("Valor codificado con msgpack pero msgpack no está instalado")
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        if serializer == SERIALIZER_ORJSON:
+            if orjson is None:
+                return json.loads(payload)
+            return orjson.loads(payload)
+        if serializer == SERIALIZER_JSON:
+            return json.loads(payload)
+        raise ValueError(f"Serializador desconocido en cabecera: {serializer}")
+
+    def encode(self, value: Any) -> bytes:
+        """
+        Codifica un valor para Redis.
+
+        Raises:
+            TypeError: Si el valor no es serializable
+        """
+        payload = self._dumps(value)
+        flags = self.serializer
+        if self.compress_threshold and len(payload) >= self.compress_threshold:
+            compressed = self._compressor.compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= COMPRESSED_FLAG
+        return bytes((FORMAT_VERSION, flags)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        """
+        Decodifica un valor leído de Redis, incluidos los JSON del formato anterior.
+
+        Raises:
+            ValueError: Si el valor está corrupto o tiene una versión desconocida
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if not data:
+            raise ValueError("Valor vacío en caché")
+        if data[0] != FORMAT_VERSION:
+            # Valor JSON plano escrito antes del codec versionado
+            return json.loads(data)
+        if len(data) < 2:
+            raise ValueError("Cabecera de caché incompleta")
+
+        flags = data[1]
+        payload = data[2:]
+        if flags & COMPRESSED_FLAG:
+            if self._decompressor is None:
+                raise ValueError("Valor comprimido con zstd pero zstandard no está instalado")
+            try:
+                payload = self._decompressor.decompress(payload)
+            except zstd.ZstdError as e:
+                raise ValueError(f"Valor comprimido corrupto: {str(e)}") from e
+        try:
+            return self._loads(flags & ~COMPRESSED_FLAG, payload)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Valor de caché corrupto: {str(e)}") from e
+
+
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def is_serializable(value: Any) -> bool:
+    """
+    Indica si un valor sobrevive igual a cualquier serializador del codec.
+
+    Solo admite str, int, float, bool, None, listas, tuplas y dicts con claves str;
+    objetos ORM, bytes o dicts con claves no str fallarían o cambiarían al pasar por L2.
+    """
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, _PLAIN_TYPES):
+            continue
+        if isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            if not all(isinstance(key, str) for key in item):
+                return False
+            stack.extend(item.values())
+        else:
+            return False
+    return True
+
+
+def codec_from_env() -> CacheCodec:
+    """Crea el codec según CACHE_CODEC y CACHE_COMPRESS_THRESHOLD."""
+    return CacheCodec(
+        serializer=os.environ.get('CACHE_CODEC') or None,
+        compress_threshold=int(os.environ.get('CACHE_COMPRESS_THRESHOLD', 1024)),
+    )
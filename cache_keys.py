@@ -0,0 +1,82 @@
+"""
+CacheKeys - Claves de caché estables entre procesos para funciones cacheadas
+"""
+import enum
+import hashlib
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Sequence
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Versión del esquema de claves: cambiarla descarta todos los resultados de funciones
+# cacheados con el esquema anterior
+CACHE_KEY_VERSION = 1
+
+
+def canonicalize(value: Any) -> Any:
+    """
+    Forma canónica de un argumento, independiente del proceso y del orden de inserción.
+
+    Admite tipos primitivos, secuencias, conjuntos, dicts, fechas, Decimal y Enum. Un
+    objeto puede definir `__cache_key__()` para indicar qué parte de su estado identifica
+    el resultado. Cualquier otro objeto eleva TypeError: su repr suele incluir la
+    dirección de memoria y produciría claves distintas en cada worker.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item) for item in value]
+    if isinstance(value, dict):
+        items = [[canonicalize(k), canonicalize(v)] for k, v in value.items()]
+        return {'__dict__': sorted(items, key=_dumps)}
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': sorted((canonicalize(item) for item in value), key=_dumps)}
+    if isinstance(value, bytes):
+        return {'__bytes__': value.hex()}
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, enum.Enum):
+        return canonicalize(value.value)
+    hook = getattr(value, '__cache_key__', None)
+    if callable(hook):
+        return canonicalize(hook())
+    raise TypeError(f"Argumento sin forma canónica para la clave de caché: {type(value).__name__}")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, sort_keys=True)
+
+
+def stable_digest(value: Any) -> str:
+    """Digest blake2b (128 bits) de la forma canónica de un valor."""
+    return hashlib.blake2b(_dumps(canonicalize(value)).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def function_cache_key(func: Callable, args: Sequence[Any], kwargs: Dict[str, Any],
+                       version: int = 0, key_builder: Optional[Callable[..., Any]] = None) -> str:
+    """
+    Clave de caché de una llamada: fn:<módulo>.<función>:v<esquema>.<versión>:<digest>.
+
+    Args:
+        func: Función cacheada
+        args: Argumentos posicionales (sin self/cls en métodos)
+        kwargs: Argumentos con nombre
+        version: Versión del resultado de la función; subirla al cambiar su formato
+        key_builder: Si se indica, recibe los argumentos y devuelve lo que identifica
+            la llamada en lugar de todos los argumentos
+
+    Returns:
+        Clave estable entre workers y reinicios
+    """
+    identity = key_builder(*args, **kwargs) if key_builder else [list(args), kwargs]
+    return (f"fn:{func.__module__}.{func.__qualname__}:"
+            f"v{CACHE_KEY_VERSION}.{version}:{stable_digest(identity)}")
@@ -1,13 +1,29 @@
 """
 CacheManager - Sistema de caché multinivel con Redis
 """
-import logging
+import asyncio
+import inspect
 import json
-from typing import Any, Optional, Union
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
 from datetime import datetime, timedelta
 from functools import wraps
 import redis
-from cachetools import TTLCache
+import redis.asyncio as aioredis
+from cachetools import LRUCache
+from cache_codec import codec_from_env, is_serializable
+from cache_keys import function_cache_key
+from cache_metrics import CacheMetrics, namespace_of
+from l1_cache import approx_size, l1_cache_from_env, parse_size
+from access_recorder import AccessRecorder
+from sqlite_cache_store import RELEASE_LOCK_SCRIPT, SQLiteCacheStore
 
 # Configuración de logging estructurado
 logging.basicConfig(
@@ -16,19 +32,193 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Campo reservado con el que las entradas con TTL blando se guardan en Redis
+_SWR_FIELD = '__swr__'
+
+
+class CacheEntry(NamedTuple):
+    """
+    Valor con TTL blando y duro (stale-while-revalidate).
+
+    Hasta `fresh_until` el valor está vigente; entre `fresh_until` y `expires_at` se
+    sirve obsoleto mientras se recalcula en segundo plano. Son segundos de época para
+    que todos los workers los interpreten igual.
+    """
+    value: Any
+    fresh_until: float
+    expires_at: float
+
+
+class _Refresher(NamedTuple):
+    """Cómo recalcular una entrada con TTL blando en segundo plano."""
+    fn: Callable[[], Any]
+    ttl: int
+    stale_ttl: int
+    cache_if: Optional[Callable[[Any], bool]]
+    lock_timeout: float
+
+
+def _unwrap(stored: Any) -> Tuple[Optional[Any], bool]:
+    """(valor, obsoleto) de lo guardado; None si la entrada superó su TTL duro."""
+    if not isinstance(stored, CacheEntry):
+        return stored, False
+    now = time.time()
+    if now >= stored.expires_at:
+        return None, False
+    return stored.value, now >= stored.fresh_until
+
+
+def _current_app():
+    """Aplicación Flask activa, para recalcular dentro de su contexto (None fuera de Flask)."""
+    try:
+        from flask import current_app, has_app_context
+    except ImportError:
+        return None
+    return current_app._get_current_object() if has_app_context() else None
+
+
+class RedisCircuitBreaker:
+    """
+    Circuit breaker para el cliente de Redis.
+
+    - closed: las operaciones pasan a Redis; tras `failure_threshold` fallos seguidos se abre.
+    - open: Redis se omite hasta que vence el tiempo de espera, que crece exponencialmente.
+    - half_open: una sola operación de prueba; si funciona se cierra, si falla se reabre.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 1.0,
+                 max_backoff: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = base_backoff
+        self.opened_at: Optional[float] = None
+        self.next_attempt = 0.0
+        self.last_error: Optional[str] = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Indica si la operación actual puede usar Redis."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.next_attempt:
+                self.state = self.HALF_OPEN
+                logger.info("Circuit breaker de Redis en half-open, probando reconexión")
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Registra una operación exitosa en Redis."""
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Conexión a Redis restablecida, caché L2 reactivado")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.backoff = self.base_backoff
+            self.opened_at = None
+
+    def record_failure(self, error: Exception) -> None:
+        """Registra un fallo de Redis y abre el circuito si corresponde."""
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state == self.HALF_OPEN:
+                    self.backoff = min(self.backoff * 2, self.max_backoff)
+                else:
+                    self.trips += 1
+                    self.opened_at = time.time()
+                self.state = self.OPEN
+                self.next_attempt = time.monotonic() + self.backoff
+                logger.warning(
+                    f"Circuit breaker de Redis abierto, reintento en {self.backoff:.1f}s; "
+                    "funcionando con solo caché local"
+                )
+
+    def trip(self, error: Exception) -> None:
+        """Abre el circuito de inmediato (p. ej. si Redis no responde al iniciar)."""
+        with self._lock:
+            self.failures = max(self.failures, self.failure_threshold - 1)
+        self.record_failure(error)
+
+    def status(self) -> Dict[str, Any]:
+        """Estado del circuito para los endpoints de salud."""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'trips': self.trips,
+                'retry_in': max(0.0, round(self.next_attempt - time.monotonic(), 1))
+                if self.state == self.OPEN else 0.0,
+                'last_error': self.last_error,
+            }
+
 class CacheManager:
     """Gestor de caché multinivel con Redis."""
 
-    def __init__(self, redis_url: Optional[str] = None):
+    LOCK_PREFIX = "lock:"
+    GENERATION_PREFIX = "gen:"
+    ALL_GENERATION = "*"
+    # Segundos que se reutiliza la generación leída de Redis antes de volver a consultarla;
+    # con el suscriptor de invalidaciones conectado los cambios llegan por pub/sub
+    GENERATION_TTL = 1.0
+    SUBSCRIBED_GENERATION_TTL = 30.0
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: Optional[str] = None):
         """
         Inicializa el gestor de caché.
 
         Args:
             redis_url: URL de conexión a Redis
+            prefix: Prefijo de todas las claves en Redis (CACHE_PREFIX por defecto)
         """
-        self.local_cache = TTLCache(maxsize=1000, ttl=300)  # Caché L1: 5 minutos
+        self.metrics = CacheMetrics()
+        # Caché L1: presupuesto en bytes con cuotas por namespace, 5 minutos de TTL
+        self.local_cache = l1_cache_from_env(self.metrics)
+        # Nivel L2: cliente de Redis o SQLiteCacheStore con la misma interfaz
         self.redis = None
+        self.backend: Optional[str] = None
+        self.redis_url: Optional[str] = None
+        # Clientes de redis.asyncio por event loop (sus conexiones no se comparten entre loops)
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = \
+            weakref.WeakKeyDictionary()
+        self.breaker = RedisCircuitBreaker()
+        self.codec = codec_from_env()
         self._initialized = False
+        # Single-flight: candados por clave y últimos valores conocidos para servir obsoletos
+        self._key_locks: Dict[str, List] = {}
+        self._key_locks_guard = threading.Lock()
+        # Los valores obsoletos comparten referencias con L1; se limitan a 1/4 de su presupuesto
+        # (LRUCache no es seguro entre hilos: todo acceso pasa por _stale_lock)
+        self._stale = LRUCache(maxsize=self.local_cache.maxsize // 4, getsizeof=approx_size)
+        self._stale_lock = threading.Lock()
+        # Invalidación por generaciones: nombre -> (generación, momento de lectura)
+        self.prefix = prefix or os.environ.get('CACHE_PREFIX', 'tzotzil')
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._generations_lock = threading.Lock()
+        # Invalidaciones entre workers por Redis pub/sub
+        self.instance_id = uuid.uuid4().hex
+        self.channel = f"{self.prefix}:invalidations"
+        self._listener: Optional[threading.Thread] = None
+        self._listener_stop = threading.Event()
+        self._listener_connected = threading.Event()
+        # Frecuencia de acceso por clave lógica para precalentar el caché al arrancar
+        self.access = AccessRecorder() if os.environ.get('CACHE_ACCESS_TRACKING', '1') == '1' else None
+        self._untracked_local = threading.local()
+        # Stale-while-revalidate: cómo recalcular cada clave y qué claves se están recalculando
+        self._refreshers: LRUCache = LRUCache(maxsize=4096)
+        self._refreshing: set = set()
+        self._refresh_guard = threading.Lock()
+        self._refresh_pool: Optional[ThreadPoolExecutor] = None
+        self.refresh_workers = int(os.environ.get('CACHE_REFRESH_WORKERS', 2))
         if redis_url:
             self.init_redis(redis_url)
 
@@ -50,16 +240,383 @@ class CacheManager:
                 socket_connect_timeout=2.0,
                 retry_on_timeout=True
             )
-            self.redis.ping()  # Verificar conexión
+            self.backend = 'redis'
+            self.redis_url = redis_url
             self._initialized = True
+            self.redis.ping()  # Verificar conexión
+            self.breaker.record_success()
             logger.info("Conexión a Redis establecida exitosamente")
+            self.start_invalidation_listener()
             return True
         except Exception as e:
             logger.error(f"Error conectando a Redis: {str(e)}")
-            self.redis = None
+            if self.redis is not None:
+                # Se conserva el cliente: el circuit breaker reintentará la conexión
+                self.breaker.trip(e)
+                self.start_invalidation_listener()
             logger.warning("Funcionando en modo degradado con solo caché local")
             return False
 
+    def init_sqlite(self, path: str, max_bytes: Optional[int] = None) -> bool:
+        """
+        Usa como L2 un archivo SQLite compartido por los workers del host, sin Redis.
+
+        Args:
+            path: Archivo SQLite (todos los workers deben usar el mismo)
+            max_bytes: Tamaño máximo de los valores antes de desalojar por LRU
+
+        Returns:
+            bool: True si el almacén quedó disponible
+        """
+        if self._initialized:
+            logger.warning("El nivel L2 del caché ya fue inicializado")
+            return True
+        try:
+            kwargs = {'max_bytes': max_bytes} if max_bytes else {}
+            self.redis = SQLiteCacheStore(path, **kwargs)
+            self.backend = 'sqlite'
+            self._initialized = True
+            self.breaker.record_success()
+            logger.info(f"Caché L2 local en SQLite: {path}")
+            self.start_invalidation_listener()
+            return True
+        except Exception as e:
+            logger.error(f"Error abriendo caché SQLite en {path}: {str(e)}")
+            logger.warning("Funcionando con solo caché local")
+            return False
+
+    def init_backend_from_env(self, instance_path: str = 'instance') -> bool:
+        """
+        Inicializa el nivel L2 según CACHE_BACKEND: 'redis' (REDIS_URL), 'sqlite'
+        (CACHE_SQLITE_PATH, CACHE_SQLITE_BYTES) o 'none'. Por defecto usa Redis si hay
+        REDIS_URL y si no SQLite.
+
+        Returns:
+            bool: True si hay un nivel L2 disponible
+        """
+        redis_url = os.environ.get('REDIS_URL')
+        backend = os.environ.get('CACHE_BACKEND', 'redis' if redis_url else 'sqlite').lower()
+        if backend == 'redis':
+            if not redis_url:
+                logger.warning("CACHE_BACKEND=redis sin REDIS_URL; funcionando con solo caché local")
+                return False
+            return self.init_redis(redis_url)
+        if backend == 'sqlite':
+            max_bytes = os.environ.get('CACHE_SQLITE_BYTES')
+            return self.init_sqlite(
+                os.environ.get('CACHE_SQLITE_PATH', os.path.join(instance_path, 'cache_l2.sqlite3')),
+                parse_size(max_bytes) if max_bytes else None
+            )
+        if backend != 'none':
+            logger.warning(f"CACHE_BACKEND desconocido: {backend}; funcionando con solo caché local")
+        return False
+
+    def _l2(self):
+        """Devuelve el cliente de Redis si el circuit breaker permite usarlo."""
+        if self.redis is None or not self.breaker.allow_request():
+            return None
+        return self.redis
+
+    def _redis_failed(self, e: Exception) -> None:
+        """Registra un fallo de Redis; un error de comando prueba que el servidor responde."""
+        if isinstance(e, redis.ResponseError):
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure(e)
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Estado del caché para los endpoints de salud.
+
+        Returns:
+            Diccionario con el estado de L1, del circuito de Redis y del codec
+        """
+        return {
+            'status': 'degraded' if self.redis is not None and self.breaker.state != RedisCircuitBreaker.CLOSED
+            else 'healthy',
+            'l1_entries': len(self.local_cache),
+            'redis_configured': self.redis is not None,
+            'l2_backend': self.backend,
+            'redis': self.breaker.status(),
+            'invalidation_listener': self._listener_connected.is_set(),
+            'codec': self.codec.name,
+        }
+
+    def _redis_key(self, storage_key: str) -> str:
+        """Clave física en Redis, aislada del resto de la base con el prefijo."""
+        return f"{self.prefix}:{storage_key}"
+
+    def _generation_names(self, key: str, tags: Iterable[str]) -> List[str]:
+        return [self.ALL_GENERATION, f"ns:{namespace_of(key)}"] + sorted(set(tags))
+
+    def _current_generations(self, names: Sequence[str]) -> List[int]:
+        """
+        Generación vigente de cada nombre (namespace o etiqueta).
+
+        Las generaciones se guardan en Redis para compartirlas entre workers y se
+        reutilizan localmente durante GENERATION_TTL segundos.
+        """
+        cached, missing = self._known_generations(names)
+        if missing:
+            client = self._l2()
+            remote: Dict[str, int] = {}
+            if client:
+                try:
+                    values = client.mget([self._redis_key(self.GENERATION_PREFIX + name) for name in missing])
+                    self.breaker.record_success()
+                    remote = {name: int(value or 0) for name, value in zip(missing, values)}
+                except redis.RedisError as e:
+                    logger.warning(f"Error leyendo generaciones de caché: {str(e)}")
+                    self._redis_failed(e)
+            self._merge_generations(cached, missing, remote)
+        return [cached[name][0] for name in names]
+
+    def generation(self, tag: str) -> int:
+        """
+        Generación vigente de una etiqueta; cambia cada vez que cualquier worker la invalida.
+
+        Sirve como sello de versión para datos que no viven en el caché (p. ej. el corpus
+        bíblico en memoria de cada worker).
+        """
+        return self._current_generations([tag])[0]
+
+    def _known_generations(self, names: Sequence[str]) -> Tuple[Dict[str, Optional[Tuple[int, float]]], List[str]]:
+        """Generaciones conocidas localmente y nombres que deben releerse de Redis."""
+        now = time.monotonic()
+        with self._generations_lock:
+            cached = {name: self._generations.get(name) for name in names}
+        generation_ttl = (self.SUBSCRIBED_GENERATION_TTL if self._listener_connected.is_set()
+                          else self.GENERATION_TTL)
+        missing = [name for name, entry in cached.items()
+                   if entry is None or (self.redis is not None and now - entry[1] > generation_ttl)]
+        return cached, missing
+
+    def _merge_generations(self, cached: Dict[str, Optional[Tuple[int, float]]],
+                           missing: Sequence[str], remote: Dict[str, int]) -> None:
+        now = time.monotonic()
+        with self._generations_lock:
+            for name in missing:
+                local = self._generations.get(name, (0, 0.0))[0]
+                # Nunca retroceder: una invalidación local sin Redis debe seguir vigente
+                self._generations[name] = (max(local, remote.get(name, 0)), now)
+                cached[name] = self._generations[name]
+
+    def _storage_key(self, key: str, tags: Iterable[str] = ()) -> str:
+        """
+        Clave de almacenamiento: la clave lógica más las generaciones de su namespace
+        y etiquetas. Al invalidar una etiqueta cambia su generación, así que las entradas
+        viejas dejan de encontrarse y expiran solas por TTL sin SCAN ni FLUSH.
+        """
+        generations = self._current_generations(self._generation_names(key, tags))
+        return f"{key}|g{'.'.join(str(g) for g in generations)}"
+
+    def _storage_keys(self, keys: Iterable[str],
+                      tags: Union[Iterable[str], Dict[str, Iterable[str]]] = ()) -> Dict[str, str]:
+        """Claves de almacenamiento de varias claves leyendo sus generaciones en una sola consulta."""
+        names, unique = self._generation_plan(keys, tags)
+        return self._format_storage_keys(names, dict(zip(unique, self._current_generations(unique))))
+
+    def _generation_plan(self, keys: Iterable[str],
+                         tags: Union[Iterable[str], Dict[str, Iterable[str]]]) -> Tuple[Dict[str, List[str]], List[str]]:
+        """Nombres de generación de cada clave y la lista sin repetir para leerlos juntos."""
+        if not isinstance(tags, dict):
+            tags = list(tags)  # Etiquetas comunes: pueden llegar como iterador de un solo uso
+        names = {
+            key: self._generation_names(key, tags.get(key, ()) if isinstance(tags, dict) else tags)
+            for key in keys
+        }
+        unique = sorted({name for key_names in names.values() for name in key_names})
+        return names, unique
+
+    @staticmethod
+    def _format_storage_keys(names: Dict[str, List[str]], generations: Dict[str, int]) -> Dict[str, str]:
+        return {
+            key: f"{key}|g{'.'.join(str(generations[name]) for name in key_names)}"
+            for key, key_names in names.items()
+        }
+
+    def _aclient(self):
+        """
+        Cliente de redis.asyncio del event loop actual si el circuit breaker permite usarlo.
+
+        Solo existe con el backend de Redis; con otros backends las operaciones asíncronas
+        se delegan al cliente síncrono en un hilo.
+        """
+        if self.backend != 'redis' or self._l2() is None:
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = aioredis.from_url(
+                self.redis_url,
+                socket_timeout=2.0,
+                socket_connect_timeout=2.0,
+                retry_on_timeout=True
+            )
+        return client
+
+    async def aclose(self) -> None:
+        """Cierra el cliente de redis.asyncio del event loop actual."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def _acurrent_generations(self, names: Sequence[str]) -> List[int]:
+        """Versión asíncrona de _current_generations."""
+        cached, missing = self._known_generations(names)
+        if missing:
+            client = self._aclient()
+            remote: Dict[str, int] = {}
+            if client:
+                try:
+                    values = await client.mget(
+                        [self._redis_key(self.GENERATION_PREFIX + name) for name in missing]
+                    )
+                    self.breaker.record_success()
+                    remote = {name: int(value or 0) for name, value in zip(missing, values)}
+                except redis.RedisError as e:
+                    logger.warning(f"Error leyendo generaciones de caché: {str(e)}")
+                    self._redis_failed(e)
+            self._merge_generations(cached, missing, remote)
+        return [cached[name][0] for name in names]
+
+    async def _astorage_keys(self, keys: Iterable[str],
+                             tags: Union[Iterable[str], Dict[str, Iterable[str]]] = ()) -> Dict[str, str]:
+        """Versión asíncrona de _storage_keys."""
+        names, unique = self._generation_plan(keys, tags)
+        return self._format_storage_keys(names, dict(zip(unique, await self._acurrent_generations(unique))))
+
+    def invalidate(self, tag: Optional[str] = None, namespace: Optional[str] = None) -> bool:
+        """
+        Invalida en O(1) todas las entradas de una etiqueta o de un namespace.
+
+        Args:
+            tag: Etiqueta usada al guardar (p. ej. 'dataset:bible', 'book:Juan', 'user:42')
+            namespace: Namespace de claves (p. ej. 'chapter', 'search')
+
+        Returns:
+            True si la invalidación se propagó a Redis o solo hay caché local
+        """
+        if (tag is None) == (namespace is None):
+            raise ValueError("Indique exactamente uno de tag o namespace")
+        name = tag if tag is not None else f"ns:{namespace}"
+
+        client = self._l2()
+        generation = None
+        if client:
+            try:
+                generation = int(client.incr(self._redis_key(self.GENERATION_PREFIX + name)))
+                self.breaker.record_success()
+            except redis.RedisError as e:
+                logger.warning(f"Error invalidando {name} en Redis: {str(e)}")
+                self._redis_failed(e)
+
+        with self._generations_lock:
+            local = self._generations.get(name, (0, 0.0))[0]
+            self._generations[name] = (max(local + 1, generation or 0), time.monotonic())
+        if generation is not None:
+            self._publish({'type': 'generation', 'name': name, 'generation': generation})
+
+        logger.info(f"Caché invalidado: {name}")
+        propagated = generation is not None or self.redis is None
+        if not propagated:
+            logger.warning(f"Invalidación de {name} solo aplicada localmente (Redis no disponible)")
+        return propagated
+
+    def _publish(self, message: Dict[str, Any]) -> None:
+        """Publica una invalidación para los demás workers."""
+        client = self._l2()
+        if not client:
+            return
+        try:
+            message['origin'] = self.instance_id
+            client.publish(self.channel, json.dumps(message))
+            self.breaker.record_success()
+        except redis.RedisError as e:
+            logger.warning(f"Error publicando invalidación: {str(e)}")
+            self._redis_failed(e)
+
+    def _apply_invalidation(self, message: Dict[str, Any]) -> None:
+        """Aplica en L1 una invalidación publicada por otro worker."""
+        if message.get('origin') == self.instance_id:
+            return
+        if message.get('type') == 'delete':
+            key = message['key']
+            self.local_cache.pop(key, None)
+            self._forget_stale(key)
+        elif message.get('type') == 'generation':
+            name = message['name']
+            with self._generations_lock:
+                local = self._generations.get(name, (0, 0.0))[0]
+                self._generations[name] = (max(local, int(message['generation'])), time.monotonic())
+            if name == self.ALL_GENERATION:
+                self.local_cache.clear()
+                self._forget_stale()
+        logger.debug(f"Invalidación recibida: {message}")
+
+    def _listen_invalidations(self) -> None:
+        """Hilo suscriptor: aplica invalidaciones y se reconecta con espera exponencial."""
+        backoff = 1.0
+        while not self._listener_stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Durante la desconexión pudieron perderse mensajes: releer generaciones y L1
+                with self._generations_lock:
+                    self._generations = {name: (generation, 0.0)
+                                         for name, (generation, _) in self._generations.items()}
+                self.local_cache.clear()
+                self._listener_connected.set()
+                backoff = 1.0
+                logger.info(f"Suscrito a invalidaciones de caché en {self.channel}")
+
+                while not self._listener_stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        try:
+                            self._apply_invalidation(json.loads(message['data']))
+                        except (ValueError, KeyError, TypeError) as e:
+                            logger.warning(f"Mensaje de invalidación inválido: {str(e)}")
+            except Exception as e:
+                self._listener_connected.clear()
+                logger.warning(f"Suscriptor de invalidaciones desconectado: {str(e)}; "
+                               f"reintento en {backoff:.0f}s")
+                self._listener_stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+        self._listener_connected.clear()
+
+    def start_invalidation_listener(self) -> bool:
+        """
+        Inicia el hilo suscriptor de invalidaciones de este worker.
+
+        Returns:
+            True si el hilo está en ejecución
+        """
+        if self.redis is None:
+            return False
+        if self._listener is not None and self._listener.is_alive():
+            return True
+        self._listener_stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen_invalidations, name="cache-invalidations", daemon=True
+        )
+        self._listener.start()
+        return True
+
+    def stop_invalidation_listener(self, timeout: float = 2.0) -> None:
+        """Detiene el hilo suscriptor de invalidaciones."""
+        self._listener_stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout)
+        self._listener = None
+
     def ping(self) -> bool:
         """
         Verifica el estado de la conexión.
@@ -67,57 +624,102 @@ class CacheManager:
         Returns:
             bool: True si el caché está funcionando (local o Redis), False en caso contrario
         """
+        client = self._l2()
         try:
-            if self.redis:
-                self.redis.ping()
-                return True
+            if client:
+                client.ping()
+                self.breaker.record_success()
             return True  # Caché local siempre disponible
-        except Exception:
+        except Exception as e:
             logger.warning("Redis no disponible, usando caché local")
-            self.redis = None
+            self._redis_failed(e)
             return True  # Retorna True porque el caché local sigue funcionando
 
-    def get(self, key: str) -> Optional[Any]:
+    def get(self, key: str, tags: Iterable[str] = ()) -> Optional[Any]:
         """
         Obtiene un valor del caché (L1 -> L2).
 
         Args:
             key: Clave a buscar
+            tags: Etiquetas con las que se guardó el valor
 
         Returns:
             Valor almacenado o None si no existe
         """
+        self._record_access(key)
+        try:
+            storage_key = self._storage_key(key, tags)
+        except Exception as e:
+            logger.error(f"Error obteniendo de caché: {str(e)}")
+            return None
+        value, stale = _unwrap(self._get(storage_key))
+        if stale and not self._schedule_refresh(storage_key):
+            # Sin forma de recalcularlo, un valor obsoleto se trata como fallo
+            return None
+        return value
+
+    def _record_access(self, key: str) -> None:
+        if self.access is not None and not getattr(self._untracked_local, 'active', False):
+            self.access.record(key)
+
+    @contextmanager
+    def untracked(self):
+        """No registra los accesos del hilo actual (p. ej. los del precalentamiento)."""
+        previous = getattr(self._untracked_local, 'active', False)
+        self._untracked_local.active = True
+        try:
+            yield
+        finally:
+            self._untracked_local.active = previous
+
+    def _get(self, key: str) -> Optional[Any]:
+        """Busca una clave de almacenamiento en L1 y después en Redis."""
+        namespace = namespace_of(key)
+        started = time.perf_counter()
         try:
             # Buscar en caché L1
-            if key in self.local_cache:
+            value = self.local_cache.get(key)
+            if isinstance(value, CacheEntry) and time.time() >= value.expires_at:
+                self.local_cache.pop(key, None)  # Superó su TTL duro
+                value = None
+            if value is not None:
                 logger.debug(f"Cache hit L1: {key}")
-                return self.local_cache[key]
+                self.metrics.record(namespace, 'l1_hit', 'get', time.perf_counter() - started)
+                return value
 
             # Buscar en Redis (L2) si está disponible
-            if self.redis:
+            client = self._l2()
+            if client:
                 try:
-                    value = self.redis.get(key)
+                    value = client.get(self._redis_key(key))
+                    self.breaker.record_success()
                     if value:
                         try:
-                            decoded_value = json.loads(value)
+                            decoded_value = self._decode(value)
                             self.local_cache[key] = decoded_value  # Actualizar L1
                             logger.debug(f"Cache hit L2: {key}")
+                            self.metrics.record(namespace, 'l2_hit', 'get', time.perf_counter() - started)
                             return decoded_value
-                        except json.JSONDecodeError:
+                        except ValueError:
                             logger.warning(f"Error decodificando valor de Redis para {key}")
-                            self.delete(key)  # Eliminar valor corrupto
+                            self.metrics.incr(namespace, 'error')
+                            self._delete(key)  # Eliminar valor corrupto
                 except redis.RedisError as e:
                     logger.warning(f"Error de Redis al obtener {key}: {str(e)}")
-                    self.redis = None  # Desactivar Redis temporalmente
+                    self.metrics.incr(namespace, 'error')
+                    self._redis_failed(e)
 
             logger.debug(f"Cache miss: {key}")
+            self.metrics.record(namespace, 'miss', 'get', time.perf_counter() - started)
             return None
 
         except Exception as e:
             logger.error(f"Error obteniendo de caché: {str(e)}")
+            self.metrics.incr(namespace, 'error')
             return None
 
-    def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
+    def set(self, key: str, value: Any, ttl: int = 3600, tags: Iterable[str] = (),
+            stale_ttl: Optional[int] = None) -> bool:
         """
         Almacena un valor en el caché (L1 y L2).
 
@@ -125,56 +727,356 @@ class CacheManager:
             key: Clave
             value: Valor a almacenar
             ttl: Tiempo de vida en segundos
+            tags: Etiquetas para invalidar el valor en bloque (p. ej. 'book:Juan')
+            stale_ttl: Segundos adicionales a ttl durante los que el valor puede servirse
+                obsoleto mientras se recalcula (solo si la clave se lee con get_or_compute)
 
         Returns:
             True si se almacenó correctamente en al menos un nivel
         """
+        try:
+            storage_key = self._storage_key(key, tags)
+        except Exception as e:
+            logger.error(f"Error almacenando en caché: {str(e)}")
+            return False
+        return self._store(storage_key, value, ttl, stale_ttl)
+
+    def _store(self, key: str, value: Any, ttl: int, stale_ttl: Optional[int] = None) -> bool:
+        """Guarda una clave de almacenamiento, con TTL blando y duro si se indica stale_ttl."""
+        if not stale_ttl:
+            return self._set(key, value, ttl)
+        now = time.time()
+        return self._set(key, CacheEntry(value, now + ttl, now + ttl + stale_ttl), ttl + stale_ttl)
+
+    def _encode(self, value: Any) -> Union[str, bytes]:
+        """Codifica un valor para Redis; las entradas con TTL blando llevan sus vencimientos."""
+        if isinstance(value, CacheEntry):
+            value = {_SWR_FIELD: [value.fresh_until, value.expires_at], 'value': value.value}
+        return self.codec.encode(value)
+
+    def _decode(self, raw: Union[str, bytes]) -> Any:
+        """Decodifica un valor de Redis, reconstruyendo las entradas con TTL blando."""
+        value = self.codec.decode(raw)
+        if isinstance(value, dict) and len(value) == 2 and _SWR_FIELD in value and 'value' in value:
+            fresh_until, expires_at = value[_SWR_FIELD]
+            return CacheEntry(value['value'], fresh_until, expires_at)
+        return value
+
+    def _set(self, key: str, value: Any, ttl: int) -> bool:
+        """Guarda una clave de almacenamiento en L1 y Redis."""
         success = False
+        namespace = namespace_of(key)
+        started = time.perf_counter()
         try:
             # Almacenar en caché L1
             self.local_cache[key] = value
+            self._remember_stale(key, value)
             success = True
 
-            # Almacenar en Redis (L2) si está disponible
-            if self.redis:
+            # Almacenar en Redis (L2) si está disponible; se codifica antes de pedir el
+            # cliente para que un valor no serializable no consuma la prueba del circuit breaker
+            try:
+                encoded_value = self._encode(value) if self.redis is not None else None
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Valor no serializable para Redis ({key}): {str(e)}")
+                self.metrics.incr(namespace, 'error')
+                encoded_value = None
+            client = self._l2() if encoded_value is not None else None
+            if client:
                 try:
-                    encoded_value = json.dumps(value)
-                    self.redis.setex(key, ttl, encoded_value)
+                    client.setex(self._redis_key(key), ttl, encoded_value)
+                    self.breaker.record_success()
                     logger.debug(f"Valor almacenado en L1 y L2: {key}")
-                except (TypeError, json.JSONDecodeError, redis.RedisError) as e:
+                except redis.RedisError as e:
                     logger.warning(f"Error almacenando en Redis: {str(e)}")
-                    self.redis = None  # Desactivar Redis temporalmente
+                    self.metrics.incr(namespace, 'error')
+                    self._redis_failed(e)
 
+            self.metrics.record(namespace, 'set', 'set', time.perf_counter() - started)
             return success
 
         except Exception as e:
             logger.error(f"Error almacenando en caché: {str(e)}")
+            self.metrics.incr(namespace, 'error')
             return success
 
-    def delete(self, key: str) -> bool:
+    async def aget(self, key: str, tags: Iterable[str] = ()) -> Optional[Any]:
+        """
+        Versión asíncrona de get: nunca bloquea el event loop en E/S del caché.
+
+        Con Redis usa redis.asyncio; con el backend SQLite delega get a un hilo.
+        Comparte L1, codec y esquema de claves con la API síncrona.
+        """
+        if self.backend != 'redis':
+            if self.redis is None:
+                return self.get(key, tags)  # Solo L1: no hay E/S
+            return await asyncio.to_thread(self.get, key, tags)
+        found = await self.aget_many([key], tags)
+        return found.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: int = 3600, tags: Iterable[str] = (),
+                   stale_ttl: Optional[int] = None) -> bool:
+        """Versión asíncrona de set (ver aget)."""
+        if self.backend != 'redis':
+            if self.redis is None:
+                return self.set(key, value, ttl, tags, stale_ttl)
+            return await asyncio.to_thread(self.set, key, value, ttl, tags, stale_ttl)
+        return await self.aset_many({key: value}, ttl, tags, stale_ttl)
+
+    async def aget_many(self, keys: Iterable[str],
+                        tags: Union[Iterable[str], Dict[str, Iterable[str]]] = ()) -> Dict[str, Any]:
+        """Versión asíncrona de get_many (ver aget)."""
+        keys = list(keys)
+        if self.backend != 'redis':
+            if self.redis is None:
+                return self.get_many(keys, tags)
+            return await asyncio.to_thread(self.get_many, keys, tags)
+
+        for key in keys:
+            self._record_access(key)
+        try:
+            storage_keys = await self._astorage_keys(keys, tags)
+        except Exception as e:
+            logger.error(f"Error obteniendo varias claves de caché: {str(e)}")
+            return {}
+
+        started = time.perf_counter()
+        found, missing = self._get_many_l1(storage_keys, started)
+        # Se pide el cliente solo si hace falta L2: cada admisión del circuit breaker
+        # (incluida la única prueba en half-open) termina registrando éxito o fallo
+        client = self._aclient() if missing else None
+        if client:
+            try:
+                raw_values = await client.mget([self._redis_key(storage_keys[key]) for key in missing])
+                self.breaker.record_success()
+                self._accept_l2_values(storage_keys, missing, raw_values, found, started)
+            except redis.RedisError as e:
+                logger.warning(f"Error de Redis en MGET de {len(missing)} claves: {str(e)}")
+                self.metrics.incr('batch', 'error')
+                self._redis_failed(e)
+        self._record_misses(missing, found, started)
+        return found
+
+    async def aset_many(self, mapping: Dict[str, Any], ttl: int = 3600,
+                        tags: Union[Iterable[str], Dict[str, Iterable[str]]] = (),
+                        stale_ttl: Optional[int] = None) -> bool:
+        """Versión asíncrona de set_many (ver aget)."""
+        if not mapping:
+            return True
+        if self.backend != 'redis':
+            if self.redis is None:
+                return self.set_many(mapping, ttl, tags, stale_ttl)
+            return await asyncio.to_thread(self.set_many, mapping, ttl, tags, stale_ttl)
+        try:
+            storage_keys = await self._astorage_keys(mapping.keys(), tags)
+        except Exception as e:
+            logger.error(f"Error almacenando varias claves en caché: {str(e)}")
+            return False
+
+        started = time.perf_counter()
+        stored, ttl = self._set_many_l1(storage_keys, mapping, ttl, stale_ttl)
+        client = self._aclient()
+        if client:
+            try:
+                pipeline = client.pipeline(transaction=False)
+                self._queue_setex(pipeline, storage_keys, stored, ttl)
+                await pipeline.execute()
+                self.breaker.record_success()
+            except redis.RedisError as e:
+                logger.warning(f"Error de Redis en pipeline de {len(mapping)} claves: {str(e)}")
+                self.metrics.incr('batch', 'error')
+                self._redis_failed(e)
+        self._record_sets(mapping, started)
+        return True
+
+    def get_many(self, keys: Iterable[str],
+                 tags: Union[Iterable[str], Dict[str, Iterable[str]]] = ()) -> Dict[str, Any]:
+        """
+        Obtiene varias claves: primero de L1 y las restantes de Redis con un solo MGET.
+
+        Args:
+            keys: Claves a buscar
+            tags: Etiquetas comunes a todas las claves o un dict {clave: etiquetas}
+
+        Returns:
+            Diccionario {clave: valor} solo con las claves encontradas
+        """
+        keys = list(keys)
+        for key in keys:
+            self._record_access(key)
+        try:
+            storage_keys = self._storage_keys(keys, tags)
+        except Exception as e:
+            logger.error(f"Error obteniendo varias claves de caché: {str(e)}")
+            return {}
+
+        started = time.perf_counter()
+        found, missing = self._get_many_l1(storage_keys, started)
+        client = self._l2() if missing else None
+        if client:
+            try:
+                raw_values = client.mget([self._redis_key(storage_keys[key]) for key in missing])
+                self.breaker.record_success()
+                self._accept_l2_values(storage_keys, missing, raw_values, found, started)
+            except redis.RedisError as e:
+                logger.warning(f"Error de Redis en MGET de {len(missing)} claves: {str(e)}")
+                self.metrics.incr('batch', 'error')
+                self._redis_failed(e)
+
+        self._record_misses(missing, found, started)
+        logger.debug(f"get_many: {len(found)}/{len(storage_keys)} claves encontradas")
+        return found
+
+    def _get_many_l1(self, storage_keys: Dict[str, str], started: float) -> Tuple[Dict[str, Any], List[str]]:
+        """Valores encontrados en L1 y claves que hay que buscar en L2."""
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        for key, storage_key in storage_keys.items():
+            value = self._fresh_or_refreshing(storage_key, self.local_cache.get(storage_key))
+            if value is not None:
+                found[key] = value
+                self.metrics.record(namespace_of(key), 'l1_hit', 'get', time.perf_counter() - started)
+            else:
+                missing.append(key)
+        return found, missing
+
+    def _accept_l2_values(self, storage_keys: Dict[str, str], missing: Sequence[str],
+                          raw_values: Sequence[Optional[bytes]], found: Dict[str, Any],
+                          started: float) -> None:
+        """Decodifica los valores leídos de L2, los copia a L1 y los agrega a found."""
+        for key, raw in zip(missing, raw_values):
+            if not raw:
+                continue
+            try:
+                stored = self._decode(raw)
+            except ValueError:
+                logger.warning(f"Error decodificando valor de Redis para {key}")
+                self.metrics.incr(namespace_of(key), 'error')
+                self._delete(storage_keys[key])
+                continue
+            value = self._fresh_or_refreshing(storage_keys[key], stored)
+            if value is None:
+                continue
+            self.local_cache[storage_keys[key]] = stored  # Actualizar L1
+            found[key] = value
+            self.metrics.record(namespace_of(key), 'l2_hit', 'get', time.perf_counter() - started)
+
+    def _record_misses(self, missing: Sequence[str], found: Dict[str, Any], started: float) -> None:
+        for key in missing:
+            if key not in found:
+                self.metrics.record(namespace_of(key), 'miss', 'get', time.perf_counter() - started)
+
+    def _fresh_or_refreshing(self, key: str, stored: Any) -> Optional[Any]:
+        """Valor servible de una entrada: vigente, u obsoleto si pudo programarse su recálculo."""
+        value, stale = _unwrap(stored)
+        if stale and not self._schedule_refresh(key):
+            return None
+        return value
+
+    def set_many(self, mapping: Dict[str, Any], ttl: int = 3600,
+                 tags: Union[Iterable[str], Dict[str, Iterable[str]]] = (),
+                 stale_ttl: Optional[int] = None) -> bool:
+        """
+        Almacena varias claves en L1 y en Redis con un solo pipeline.
+
+        Args:
+            mapping: Diccionario {clave: valor}
+            ttl: Tiempo de vida en segundos
+            tags: Etiquetas comunes a todas las claves o un dict {clave: etiquetas}
+            stale_ttl: Segundos adicionales de servicio obsoleto (ver set)
+
+        Returns:
+            True si se almacenaron correctamente en al menos un nivel
+        """
+        if not mapping:
+            return True
+        try:
+            storage_keys = self._storage_keys(mapping.keys(), tags)
+        except Exception as e:
+            logger.error(f"Error almacenando varias claves en caché: {str(e)}")
+            return False
+
+        started = time.perf_counter()
+        stored, ttl = self._set_many_l1(storage_keys, mapping, ttl, stale_ttl)
+        client = self._l2()
+        if client:
+            try:
+                pipeline = client.pipeline(transaction=False)
+                self._queue_setex(pipeline, storage_keys, stored, ttl)
+                pipeline.execute()
+                self.breaker.record_success()
+            except redis.RedisError as e:
+                logger.warning(f"Error de Redis en pipeline de {len(mapping)} claves: {str(e)}")
+                self.metrics.incr('batch', 'error')
+                self._redis_failed(e)
+
+        self._record_sets(mapping, started)
+        return True
+
+    def _set_many_l1(self, storage_keys: Dict[str, str], mapping: Dict[str, Any], ttl: int,
+                     stale_ttl: Optional[int]) -> Tuple[Dict[str, Any], int]:
+        """Guarda los valores en L1 y devuelve lo que debe ir a L2 con su TTL."""
+        if stale_ttl:
+            now = time.time()
+            mapping = {key: CacheEntry(value, now + ttl, now + ttl + stale_ttl)
+                       for key, value in mapping.items()}
+            ttl += stale_ttl
+        for key, value in mapping.items():
+            self.local_cache[storage_keys[key]] = value
+            self._remember_stale(storage_keys[key], value)
+        return mapping, ttl
+
+    def _queue_setex(self, pipeline, storage_keys: Dict[str, str], stored: Dict[str, Any], ttl: int) -> None:
+        for key, value in stored.items():
+            try:
+                pipeline.setex(self._redis_key(storage_keys[key]), ttl, self._encode(value))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Valor no serializable para Redis ({key}): {str(e)}")
+                self.metrics.incr(namespace_of(key), 'error')
+
+    def _record_sets(self, mapping: Dict[str, Any], started: float) -> None:
+        elapsed = time.perf_counter() - started
+        for key in mapping:
+            self.metrics.record(namespace_of(key), 'set', 'set', elapsed / len(mapping))
+
+    def delete(self, key: str, tags: Iterable[str] = ()) -> bool:
         """
         Elimina una clave del caché.
 
         Args:
             key: Clave a eliminar
+            tags: Etiquetas con las que se guardó el valor
 
         Returns:
             True si se eliminó correctamente de al menos un nivel
         """
+        try:
+            storage_key = self._storage_key(key, tags)
+        except Exception as e:
+            logger.error(f"Error eliminando de caché: {str(e)}")
+            return False
+        return self._delete(storage_key)
+
+    def _delete(self, key: str) -> bool:
+        """Elimina una clave de almacenamiento de L1 y Redis."""
         success = False
         try:
-            # Eliminar de L1
+            # Eliminar de L1 (un valor invalidado tampoco puede servirse obsoleto)
             self.local_cache.pop(key, None)
+            self._forget_stale(key)
             success = True
 
             # Eliminar de Redis (L2) si está disponible
-            if self.redis:
+            client = self._l2()
+            if client:
                 try:
-                    self.redis.delete(key)
+                    client.delete(self._redis_key(key))
+                    self.breaker.record_success()
                     logger.debug(f"Clave eliminada de L1 y L2: {key}")
+                    self._publish({'type': 'delete', 'key': key})
                 except redis.RedisError as e:
                     logger.warning(f"Error eliminando de Redis: {str(e)}")
-                    self.redis = None  # Desactivar Redis temporalmente
+                    self._redis_failed(e)
 
             return success
 
@@ -184,7 +1086,10 @@ class CacheManager:
 
     def clear(self) -> bool:
         """
-        Limpia todo el caché.
+        Limpia todo el caché de esta aplicación.
+
+        No ejecuta FLUSHDB: incrementa la generación global, de modo que las claves de
+        otros servicios en la misma base de Redis no se tocan y las propias expiran por TTL.
 
         Returns:
             True si se limpió correctamente de al menos un nivel
@@ -193,16 +1098,12 @@ class CacheManager:
         try:
             # Limpiar L1
             self.local_cache.clear()
+            self._forget_stale()
             success = True
 
-            # Limpiar Redis (L2) si está disponible
-            if self.redis:
-                try:
-                    self.redis.flushdb()
-                    logger.info("Caché limpiado completamente")
-                except redis.RedisError as e:
-                    logger.warning(f"Error limpiando Redis: {str(e)}")
-                    self.redis = None  # Desactivar Redis temporalmente
+            # Invalidar L2 por generación
+            self.invalidate(tag=self.ALL_GENERATION)
+            logger.info("Caché limpiado completamente")
 
             return success
 
@@ -210,42 +1111,317 @@ class CacheManager:
             logger.error(f"Error limpiando caché: {str(e)}")
             return success
 
-    def cached(self, ttl: int = 3600):
+    def _remember_stale(self, key: str, value: Any) -> None:
+        """Guarda el último valor conocido para servirlo mientras se recalcula."""
+        if isinstance(value, CacheEntry):
+            value = value.value
+        with self._stale_lock:
+            try:
+                self._stale[key] = value
+            except ValueError:
+                self._stale.pop(key, None)  # Mayor que el presupuesto de obsoletos
+
+    def _stale_value(self, key: str) -> Optional[Any]:
+        """Último valor conocido de una clave, o None."""
+        with self._stale_lock:
+            return self._stale.get(key)
+
+    def _forget_stale(self, key: Optional[str] = None) -> None:
+        """Olvida el último valor conocido de una clave, o de todas si no se indica."""
+        with self._stale_lock:
+            if key is None:
+                self._stale.clear()
+            else:
+                self._stale.pop(key, None)
+
+    @contextmanager
+    def _key_lock(self, key: str):
+        """Entrega el candado en proceso de una clave, creándolo y liberándolo según uso."""
+        with self._key_locks_guard:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            with self._key_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    def _acquire_redis_lock(self, key: str, lock_timeout: float) -> Optional[str]:
+        """
+        Toma un candado corto en Redis para que un solo worker recalcule la clave.
+
+        Returns:
+            Token del candado, "" si Redis no está disponible o None si otro worker lo tiene
+        """
+        client = self._l2()
+        if not client:
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            acquired = client.set(self._redis_key(self.LOCK_PREFIX + key), token, nx=True, px=int(lock_timeout * 1000))
+            self.breaker.record_success()
+            return token if acquired else None
+        except redis.RedisError as e:
+            logger.warning(f"Error tomando candado en Redis para {key}: {str(e)}")
+            self._redis_failed(e)
+            return ""
+
+    def _release_redis_lock(self, key: str, token: Optional[str]) -> None:
+        """Libera el candado de Redis si fue tomado por este proceso."""
+        client = self._l2() if token else None
+        if not client:
+            return
+        try:
+            client.eval(RELEASE_LOCK_SCRIPT, 1, self._redis_key(self.LOCK_PREFIX + key), token)
+            self.breaker.record_success()
+        except redis.RedisError as e:
+            logger.warning(f"Error liberando candado en Redis para {key}: {str(e)}")
+            self._redis_failed(e)
+
+    def _wait_for_value(self, key: str, lock_timeout: float) -> Optional[Any]:
+        """Espera a que otro worker publique el valor o suelte el candado."""
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value, _ = _unwrap(self._get(key))
+            if value is not None:
+                return value
+            client = self._l2()
+            if not client:
+                return None
+            try:
+                locked = client.exists(self._redis_key(self.LOCK_PREFIX + key))
+                self.breaker.record_success()
+            except redis.RedisError as e:
+                self._redis_failed(e)
+                return None
+            if not locked:
+                return None
+        return None
+
+    def get_or_compute(self, key: str, fn: Callable[[], Any], ttl: int = 3600,
+                       cache_if: Optional[Callable[[Any], bool]] = None,
+                       lock_timeout: float = 10.0, tags: Iterable[str] = (),
+                       stale_ttl: Optional[int] = None) -> Any:
+        """
+        Obtiene un valor del caché o lo calcula una sola vez aunque haya llamadas concurrentes.
+
+        Dentro del proceso un candado por clave deja pasar a un solo hilo; entre workers
+        lo hace un candado corto en Redis (SET NX PX). Mientras tanto, los demás reciben
+        el último valor conocido si existe o esperan el resultado de quien recalcula.
+
+        Con stale_ttl, pasado ttl el valor se sigue sirviendo de inmediato durante
+        stale_ttl segundos más y fn se ejecuta en segundo plano, una sola vez por clave.
+
+        Args:
+            key: Clave del caché
+            fn: Función sin argumentos que calcula el valor
+            ttl: Tiempo de vida en segundos
+            cache_if: Predicado opcional; el valor solo se guarda si devuelve True
+            lock_timeout: Segundos máximos de espera y duración del candado de Redis
+            tags: Etiquetas para invalidar el valor en bloque
+            stale_ttl: Segundos después de ttl durante los que se sirve el valor obsoleto
+                mientras se recalcula en segundo plano
+
+        Returns:
+            Valor del caché o el calculado por fn
+        """
+        self._record_access(key)
+        # La clave de almacenamiento se fija al inicio: si se invalida mientras fn corre,
+        # el resultado queda bajo la generación anterior y no se sirve después
+        key = self._storage_key(key, tags)
+        if stale_ttl:
+            with self._refresh_guard:
+                self._refreshers[key] = _Refresher(fn, ttl, stale_ttl, cache_if, lock_timeout)
+        value, stale = _unwrap(self._get(key))
+        if value is not None:
+            if stale:
+                self._schedule_refresh(key)
+            return value
+
+        with self._key_lock(key) as lock:
+            acquired = lock.acquire(blocking=False)
+            if not acquired:
+                stale = self._stale_value(key)
+                if stale is not None:
+                    logger.debug(f"Sirviendo valor obsoleto mientras se recalcula: {key}")
+                    self.metrics.incr(namespace_of(key), 'stale_hit')
+                    return stale
+                acquired = lock.acquire(timeout=lock_timeout)
+            try:
+                # Otro hilo pudo haberlo calculado mientras esperábamos
+                value, _ = _unwrap(self._get(key))
+                if value is not None:
+                    return value
+
+                token = self._acquire_redis_lock(key, lock_timeout)
+                if token is None:
+                    value = self._wait_for_value(key, lock_timeout)
+                    if value is None:
+                        value = self._stale_value(key)
+                    if value is not None:
+                        return value
+                    token = self._acquire_redis_lock(key, lock_timeout)
+
+                try:
+                    started = time.perf_counter()
+                    value = fn()
+                    self.metrics.observe(namespace_of(key), 'compute', time.perf_counter() - started)
+                    if value is not None and (cache_if is None or cache_if(value)):
+                        self._store(key, value, ttl, stale_ttl)
+                    return value
+                finally:
+                    self._release_redis_lock(key, token)
+            finally:
+                if acquired:
+                    lock.release()
+
+    def _schedule_refresh(self, key: str) -> bool:
+        """
+        Programa el recálculo en segundo plano de una clave obsoleta.
+
+        Returns:
+            True si la clave se está recalculando (ahora o ya antes), False si no hay
+            forma de recalcularla
+        """
+        with self._refresh_guard:
+            refresher = self._refreshers.get(key)
+            if refresher is None:
+                return False
+            if key in self._refreshing:
+                return True
+            self._refreshing.add(key)
+            if self._refresh_pool is None:
+                self._refresh_pool = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers, thread_name_prefix="cache-refresh"
+                )
+        self.metrics.incr(namespace_of(key), 'refresh')
+        try:
+            self._refresh_pool.submit(self._refresh, key, refresher, _current_app())
+        except RuntimeError as e:
+            # El pool ya se cerró (apagado del intérprete)
+            logger.debug(f"No se pudo programar el recálculo de {key}: {str(e)}")
+            with self._refresh_guard:
+                self._refreshing.discard(key)
+        return True
+
+    def _refresh(self, key: str, refresher: _Refresher, app) -> None:
+        """Recalcula una clave obsoleta; entre workers solo lo hace quien toma el candado."""
+        token = None
+        try:
+            token = self._acquire_redis_lock(key, refresher.lock_timeout)
+            if token is None:
+                return  # Otro worker ya la está recalculando
+            with app.app_context() if app is not None else nullcontext():
+                started = time.perf_counter()
+                value = refresher.fn()
+                self.metrics.observe(namespace_of(key), 'compute', time.perf_counter() - started)
+            if value is not None and (refresher.cache_if is None or refresher.cache_if(value)):
+                self._store(key, value, refresher.ttl, refresher.stale_ttl)
+                logger.debug(f"Clave recalculada en segundo plano: {key}")
+        except Exception as e:
+            logger.warning(f"Error recalculando {key} en segundo plano: {str(e)}")
+            self.metrics.incr(namespace_of(key), 'error')
+        finally:
+            self._release_redis_lock(key, token)
+            with self._refresh_guard:
+                self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Métricas del caché para dimensionarlo con datos.
+
+        Returns:
+            Diccionario con el estado de L1, de Redis y las métricas por namespace
+        """
+        return {
+            'l1': {
+                'entries': len(self.local_cache),
+                'bytes': self.local_cache.currsize,
+                'budget': self.local_cache.maxsize,
+                'ttl': self.local_cache.ttl,
+                'partitions': self.local_cache.usage(),
+            },
+            'redis': self.breaker.status() if self.redis is not None else None,
+            'refreshing': len(self._refreshing),
+            'namespaces': self.metrics.stats(),
+        }
+
+    def prometheus_metrics(self) -> str:
+        """Métricas en formato de texto de Prometheus para el endpoint /metrics."""
+        lines = self.metrics.prometheus()
+        lines += [
+            "# TYPE cache_l1_entries gauge",
+            f"cache_l1_entries {len(self.local_cache)}",
+            "# TYPE cache_l1_budget_bytes gauge",
+            f"cache_l1_budget_bytes {int(self.local_cache.maxsize)}",
+            "# TYPE cache_l1_bytes gauge",
+            *(f'cache_l1_bytes{{partition="{partition}"}} {usage["bytes"]}'
+              for partition, usage in self.local_cache.usage().items()),
+            "# TYPE cache_redis_circuit_open gauge",
+            f"cache_redis_circuit_open {int(self.redis is not None and self.breaker.state != RedisCircuitBreaker.CLOSED)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def cached(self, ttl: int = 3600, tags: Iterable[str] = (), stale_ttl: Optional[int] = None,
+               version: int = 0, key_builder: Optional[Callable[..., Any]] = None):
         """
         Decorador para cachear resultados de funciones.
 
+        La clave es un digest blake2 de los argumentos canonizados (ver cache_keys), igual
+        en todos los workers y reinicios. En métodos, self/cls no forma parte de la clave
+        salvo que el objeto defina __cache_key__(). Solo se guardan resultados
+        serializables sin pérdida (ver cache_codec.is_serializable).
+
         Args:
             ttl: Tiempo de vida en segundos del valor en caché
+            tags: Etiquetas para invalidar en bloque los resultados de la función
+            stale_ttl: Segundos de servicio obsoleto con recálculo en segundo plano
+            version: Versión del resultado; subirla al cambiar su formato
+            key_builder: Función opcional que recibe los argumentos (sin self) y devuelve
+                lo que identifica la llamada
 
         Returns:
             Decorador que maneja el cacheo de la función
         """
         def decorator(func):
+            parameters = list(inspect.signature(func).parameters)
+            is_method = parameters[:1] in (['self'], ['cls'])
+            name = f"{func.__module__}.{func.__qualname__}"
+            warned = set()
+
+            def warn_once(reason: str, message: str) -> None:
+                if reason not in warned:
+                    warned.add(reason)
+                    logger.warning(message)
+
+            def cacheable(value: Any) -> bool:
+                if is_serializable(value):
+                    return True
+                warn_once('value', f"Resultado de {name} no serializable ({type(value).__name__}), "
+                                   "no se cachea")
+                return False
+
             @wraps(func)
             def wrapper(*args, **kwargs):
+                key_args = args
+                if is_method and args:
+                    key_args = args[1:]
+                    if key_builder is None and callable(getattr(args[0], '__cache_key__', None)):
+                        key_args = args  # El estado del objeto identifica el resultado
                 try:
-                    # Generar clave única para la función y sus argumentos
-                    cache_key = f"{func.__module__}:{func.__name__}:{hash(str(args))}"
-                    if kwargs:
-                        cache_key += f":{hash(str(sorted(kwargs.items())))}"
-
-                    # Intentar obtener del caché
-                    cached_value = self.get(cache_key)
-                    if cached_value is not None:
-                        logger.debug(f"Cache hit para función {func.__name__}")
-                        return cached_value
-
-                    # Ejecutar función y almacenar resultado
-                    result = func(*args, **kwargs)
-                    if result is not None:  # Solo cachear resultados no nulos
-                        self.set(cache_key, result, ttl)
-                        logger.debug(f"Resultado cacheado para función {func.__name__}")
-                    return result
-
-                except Exception as e:
-                    logger.error(f"Error en decorador cache para {func.__name__}: {str(e)}")
-                    # En caso de error, ejecutar la función sin cacheo
+                    cache_key = function_cache_key(func, key_args, kwargs, version, key_builder)
+                except TypeError as e:
+                    warn_once('key', f"Argumentos de {name} sin clave de caché estable: {str(e)}")
                     return func(*args, **kwargs)
+
+                # Obtener del caché o ejecutar la función una sola vez por clave
+                return self.get_or_compute(cache_key, lambda: func(*args, **kwargs), ttl,
+                                           cache_if=cacheable, tags=tags, stale_ttl=stale_ttl)
             return wrapper
         return decorator
 
@@ -0,0 +1,185 @@
+"""
+CacheMetrics - Contadores e histogramas de latencia del caché por nivel y namespace
+"""
+import bisect
+import logging
+import threading
+import weakref
+from typing import Any, Dict, List, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+EVENTS = ('l1_hit', 'l2_hit', 'stale_hit', 'miss', 'set', 'refresh', 'eviction', 'expiration', 'rejected', 'error')
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+                   0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+def namespace_of(key: str) -> str:
+    """
+    Namespace de una clave: el primer segmento antes de ':'.
+
+    Las claves del decorador `cached` (fn:<módulo>.<función>:...) conservan también
+    el nombre de la función para distinguir cada caché de funciones.
+    """
+    head, _, rest = key.partition(':')
+    if head == 'fn' and rest:
+        return f"fn:{rest.partition(':')[0]}"
+    return head if rest else 'default'
+
+
+def _merge_shard(totals: Tuple[Dict, Dict], counters: Dict, histograms: Dict) -> None:
+    """Suma los contadores e histogramas de un shard en `totals`."""
+    total_counters, total_histograms = totals
+    for key, value in list(counters.items()):
+        total_counters[key] = total_counters.get(key, 0) + value
+    for key, values in list(histograms.items()):
+        total = total_histograms.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+        for i, value in enumerate(list(values)):
+            total[i] += value
+
+
+class CacheMetrics:
+    """
+    Métricas del caché con contadores repartidos por hilo.
+
+    Cada hilo escribe solo en su propio shard, así que registrar un evento no toma
+    ningún candado; `snapshot()` suma los shards cuando alguien consulta las métricas.
+    Los shards de hilos terminados se pliegan en un acumulado y se descartan, de modo
+    que los hilos de vida corta no hacen crecer la lista.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        # (hilo, contadores, histogramas) de cada hilo que ha registrado métricas
+        self._shards: List[Tuple[weakref.ref, Dict, Dict]] = []
+        # Métricas de los hilos ya terminados
+        self._retired: Tuple[Dict, Dict] = ({}, {})
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Tuple[Dict, Dict]:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            with self._shards_lock:
+                self._prune_locked()
+                self._shards.append((weakref.ref(threading.current_thread()), *shard))
+        return shard
+
+    def _prune_locked(self) -> None:
+        """Pliega en el acumulado los shards de hilos terminados (requiere _shards_lock)."""
+        alive = []
+        for thread_ref, counters, histograms in self._shards:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                alive.append((thread_ref, counters, histograms))
+            else:
+                # El hilo ya no puede escribir en su shard
+                _merge_shard(self._retired, counters, histograms)
+        self._shards = alive
+
+    def incr(self, namespace: str, event: str, amount: int = 1) -> None:
+        """Suma `amount` al contador de un evento."""
+        counters = self._shard()[0]
+        key = (namespace, event)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, namespace: str, operation: str, seconds: float) -> None:
+        """Registra la latencia de una operación (get, set, compute)."""
+        histograms = self._shard()[1]
+        key = (namespace, operation)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # Un contador por bucket, +Inf y la suma de latencias
+            histogram = histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+    def record(self, namespace: str, event: str, operation: str, seconds: float) -> None:
+        """Registra un evento junto con la latencia de la operación que lo produjo."""
+        self.incr(namespace, event)
+        self.observe(namespace, operation, seconds)
+
+    def snapshot(self) -> Tuple[Dict[Tuple[str, str], int], Dict[Tuple[str, str], List[float]]]:
+        """Suma todos los shards en contadores e histogramas agregados."""
+        with self._shards_lock:
+            self._prune_locked()
+            shards = [(counters, histograms) for _, counters, histograms in self._shards]
+            retired_counters, retired_histograms = self._retired
+            totals = (dict(retired_counters), {key: list(values) for key, values in retired_histograms.items()})
+        for shard_counters, shard_histograms in shards:
+            _merge_shard(totals, shard_counters, shard_histograms)
+        return totals
+
+    def reset(self) -> None:
+        """Descarta todas las métricas acumuladas."""
+        with self._shards_lock:
+            for _, counters, histograms in self._shards:
+                counters.clear()
+                histograms.clear()
+            for retired in self._retired:
+                retired.clear()
+
+    @staticmethod
+    def _quantile(histogram: List[float], q: float) -> float:
+        """Aproxima un cuantil con el límite superior del bucket que lo contiene."""
+        count = sum(histogram[:-1])
+        if not count:
+            return 0.0
+        target = q * count
+        seen = 0
+        for i, bucket_count in enumerate(histogram[:-1]):
+            seen += bucket_count
+            if seen >= target:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float('inf')
+        return float('inf')
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Resumen por namespace con contadores, tasa de aciertos y latencias.
+
+        Returns:
+            {namespace: {evento: n, 'hit_ratio': x, 'latency': {operación: {...}}}}
+        """
+        counters, histograms = self.snapshot()
+        result: Dict[str, Dict[str, Any]] = {}
+        for (namespace, event), value in counters.items():
+            entry = result.setdefault(namespace, {name: 0 for name in EVENTS})
+            entry[event] = value
+        for (namespace, operation), histogram in histograms.items():
+            entry = result.setdefault(namespace, {name: 0 for name in EVENTS})
+            count = int(sum(histogram[:-1]))
+            entry.setdefault('latency', {})[operation] = {
+                'count': count,
+                'mean_ms': round(histogram[-1] / count * 1000, 4) if count else 0.0,
+                'p50_ms': self._quantile(histogram, 0.5) * 1000,
+                'p99_ms': self._quantile(histogram, 0.99) * 1000,
+            }
+        for entry in result.values():
+            hits = entry['l1_hit'] + entry['l2_hit'] + entry['stale_hit']
+            lookups = hits + entry['miss']
+            entry['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+        return result
+
+    def prometheus(self, prefix: str = 'cache') -> List[str]:
+        """Líneas en formato de texto de Prometheus con contadores e histogramas."""
+        counters, histograms = self.snapshot()
+        lines = [f"# TYPE {prefix}_events_total counter"]
+        for (namespace, event), value in sorted(counters.items()):
+            lines.append(f'{prefix}_events_total{{namespace="{namespace}",event="{event}"}} {value}')
+
+        lines.append(f"# TYPE {prefix}_latency_seconds histogram")
+        for (namespace, operation), histogram in sorted(histograms.items()):
+            labels = f'namespace="{namespace}",operation="{operation}"'
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ('+Inf',), histogram[:-1]):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_latency_seconds_bucket{{{labels},le="{bound}"}} {int(cumulative)}')
+            lines.append(f'{prefix}_latency_seconds_sum{{{labels}}} {histogram[-1]:.6f}')
+            lines.append(f'{prefix}_latency_seconds_count{{{labels}}} {int(cumulative)}')
+        return lines
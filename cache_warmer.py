@@ -0,0 +1,167 @@
+"""
+CacheWarmer - Precalentamiento del caché al arrancar a partir de las claves más accedidas
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from access_recorder import load_hot_keys
+from cache_manager import cache_manager
+from cache_metrics import namespace_of
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Claves populares que se precalientan aunque todavía no haya historial de accesos
+DEFAULT_HOT_KEYS = [
+    'books:sorted',
+    'promises:all',
+    'chapter:Juan:3',
+    'chapter:Salmos:23',
+    'chapter:Mateo:5',
+    'chapter:Génesis:1',
+    'chapter:Romanos:8',
+    'chapter:1 Corintios:13',
+    'verse:Juan:3:16',
+]
+
+
+def _warm_chapter(key: str) -> Any:
+    from bible_data_access import bible_data_access
+    parts = key.split(':')
+    translations = parts[3].split(',') if len(parts) > 3 else None
+    return bible_data_access.get_chapter(parts[1], int(parts[2]), translations)
+
+
+def _warm_verse(key: str) -> Any:
+    from bible_data_access import bible_data_access
+    parts = key.split(':')
+    translations = parts[4].split(',') if len(parts) > 4 else None
+    return bible_data_access.get_verse(parts[1], int(parts[2]), int(parts[3]), translations)
+
+
+def _warm_chapters(key: str) -> Any:
+    from bible_data_access import bible_data_access
+    return bible_data_access.get_chapters(key.partition(':')[2])
+
+
+def _warm_books(key: str) -> Any:
+    from database import get_sorted_books
+    return get_sorted_books()
+
+
+def _warm_promises(key: str) -> Any:
+    from database import db_manager
+    return db_manager.get_promises()
+
+
+class CacheWarmer:
+    """
+    Precarga en el caché las claves más frecuentes registradas por AccessRecorder.
+
+    Cada namespace tiene un manejador que reconstruye la clave a través de la capa de
+    acceso a datos (BibleDataAccess, BibleData), de modo que el valor queda guardado
+    con la misma clave, etiquetas y TTL que en una petición normal. Las claves de
+    namespaces sin manejador se ignoran.
+    """
+
+    def __init__(self, path: Optional[str] = None, concurrency: Optional[int] = None,
+                 max_keys: int = 200, timeout: float = 60.0):
+        """
+        Inicializa el precalentador.
+
+        Args:
+            path: Archivo de claves frecuentes (CACHE_HOT_KEYS_PATH)
+            concurrency: Cargas simultáneas como máximo (CACHE_WARM_CONCURRENCY)
+            max_keys: Número máximo de claves a precalentar
+            timeout: Segundos máximos de precalentamiento antes de declarar listo
+        """
+        self.path = path or os.environ.get('CACHE_HOT_KEYS_PATH', os.path.join('instance', 'cache_hot_keys.json'))
+        self.concurrency = concurrency or int(os.environ.get('CACHE_WARM_CONCURRENCY', 4))
+        self.max_keys = max_keys
+        self.timeout = timeout
+        self.ready = threading.Event()
+        self.last_run: Dict[str, Any] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.handlers: Dict[str, Callable[[str], Any]] = {
+            'chapter': _warm_chapter,
+            'verse': _warm_verse,
+            'chapters': _warm_chapters,
+            'books': _warm_books,
+            'promises': _warm_promises,
+        }
+
+    def hot_keys(self) -> List[str]:
+        """Claves a precalentar: las guardadas por frecuencia y después las predeterminadas."""
+        keys = [key for key, _ in load_hot_keys(self.path)]
+        keys.extend(key for key in DEFAULT_HOT_KEYS if key not in keys)
+        return [key for key in keys if namespace_of(key) in self.handlers][:self.max_keys]
+
+    def _warm_key(self, app, key: str) -> bool:
+        try:
+            with app.app_context(), cache_manager.untracked():
+                self.handlers[namespace_of(key)](key)
+            return True
+        except Exception as e:
+            logger.warning(f"Error precalentando {key}: {str(e)}")
+            return False
+
+    def warm(self, app, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Precarga las claves con concurrencia acotada.
+
+        Returns:
+            {'keys': n, 'warmed': n, 'failed': n, 'pending': n, 'seconds': s}
+        """
+        keys = self.hot_keys() if keys is None else keys
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="cache-warm")
+        futures = [executor.submit(self._warm_key, app, key) for key in keys]
+        done, pending = wait(futures, timeout=self.timeout)
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+        warmed = sum(1 for future in done if future.result())
+        self.last_run = {
+            'keys': len(keys),
+            'warmed': warmed,
+            'failed': len(done) - warmed,
+            'pending': len(pending),
+            'seconds': round(time.monotonic() - started, 3),
+        }
+        logger.info(f"Caché precalentado: {self.last_run}")
+        return self.last_run
+
+    def _run(self, app) -> None:
+        try:
+            self.warm(app)
+        except Exception as e:
+            logger.error(f"Error en el precalentamiento del caché: {str(e)}")
+        finally:
+            self.ready.set()
+
+    def start(self, app) -> None:
+        """Precalienta en un hilo de fondo y empieza a guardar las claves frecuentes."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.ready.clear()
+        self._thread = threading.Thread(target=self._run, args=(app,), name="cache-warmer", daemon=True)
+        self._thread.start()
+        if cache_manager.access is not None:
+            cache_manager.access.start_persisting(
+                self.path, float(os.environ.get('CACHE_HOT_KEYS_INTERVAL', 300))
+            )
+
+    def status(self) -> Dict[str, Any]:
+        """Estado del precalentamiento para /ready."""
+        return {'ready': self.ready.is_set(), **self.last_run}
+
+
+cache_warmer = CacheWarmer()
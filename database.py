@@ -2,15 +2,20 @@
 DatabaseManager - Sistema simplificado de gestión de base de datos
 """
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import logging
 from flask import g
 from sqlalchemy import text, Column, DateTime
 from extensions import db
+from cache_manager import cache_manager
+from bible_books import BIBLE_BOOKS_ORDER, BIBLE_DATASET_TAG
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Etiqueta de caché de la lista de promesas; se invalida al importarlas
+PROMISES_DATASET_TAG = 'dataset:promises'
+
 # Assumed User model -  needs to be adapted to your actual model
 class User(db.Model):
     id = Column(db.Integer, primary_key=True)
@@ -142,6 +147,33 @@ class DatabaseManager:
                 'data': None
             }
 
+    def get_promises(self) -> List[Dict[str, Any]]:
+        """
+        Lista completa de promesas ordenada por id, cacheada en Redis.
+
+        Las rutas de promesa diaria y aleatoria eligen sobre esta lista en lugar de
+        hacer COUNT + OFFSET u ORDER BY random() en cada petición.
+        """
+        def load():
+            from models import Promise
+            return [
+                {
+                    'verse_text': promise.verse_text,
+                    'background_image': promise.background_image,
+                    'book_reference': promise.book_reference,
+                }
+                for promise in db.session.query(Promise).order_by(Promise.id).all()
+            ]
+
+        try:
+            return cache_manager.get_or_compute(
+                "promises:all", load, ttl=3600, cache_if=bool, tags=[PROMISES_DATASET_TAG],
+                stale_ttl=86400
+            )
+        except Exception as e:
+            logger.error(f"Error obteniendo promesas: {str(e)}")
+            return []
+
     def check_health(self) -> Dict[str, Any]:
         """Verifica el estado de la conexión a la base de datos"""
         try:
@@ -163,18 +195,21 @@ class DatabaseManager:
 
 def get_sorted_books():
     """Obtiene los libros ordenados según el orden bíblico"""
-    try:
+    def load():
         books_result = db_manager.get_books()
         if not books_result['success']:
             return []
-            
+
         books = books_result['data']
-        
-        # Ordenar según el orden bíblico definido en routes.py
-        from routes import BIBLE_BOOKS_ORDER
-        sorted_books = sorted(books, key=lambda x: BIBLE_BOOKS_ORDER.index(x) if x in BIBLE_BOOKS_ORDER else len(BIBLE_BOOKS_ORDER))
-        return sorted_books
-        
+
+        # Ordenar según el orden bíblico definido en bible_books.py
+        return sorted(books, key=lambda x: BIBLE_BOOKS_ORDER.index(x) if x in BIBLE_BOOKS_ORDER else len(BIBLE_BOOKS_ORDER))
+
+    try:
+        return cache_manager.get_or_compute(
+            "books:sorted", load, ttl=3600, cache_if=bool, tags=[BIBLE_DATASET_TAG],
+            stale_ttl=86400
+        )
     except Exception as e:
         logger.error(f"Error ordenando libros: {str(e)}")
         return []
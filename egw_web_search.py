@@ -13,6 +13,8 @@ from urllib.parse import urljoin, quote_plus
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
+from topical_index import expand_topic
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -270,18 +272,8 @@ class EGWWebSearchEngine:
         """
         Búsqueda por tema específico con términos optimizados
         """
-        # Expandir consulta por tema
-        topic_expansions = {
-            'fe': 'fe creencia confianza Dios',
-            'oración': 'oración comunicación Dios petición',
-            'segundo advenimiento': 'segunda venida Cristo regreso',
-            'sábado': 'sábado día reposo cuarto mandamiento',
-            'salvación': 'salvación redención justificación',
-            'muerte': 'muerte estado muertos resurrección',
-            'profecía': 'profecía tiempo fin Daniel Apocalipsis'
-        }
-        
-        expanded_query = topic_expansions.get(topic.lower(), topic)
+        # Expandir consulta con el vocabulario curado del índice temático
+        expanded_query = expand_topic(topic)
         return self.search_egw_content(expanded_query, max_results)
     
     def get_book_content(self, book_name: str, chapter: Optional[str] = None) -> List[EGWSearchResult]:
@@ -38,6 +38,12 @@ def init_database():
             try:
                 upgrade()
                 logger.info("Migraciones aplicadas correctamente")
+                # Las migraciones pueden cambiar datos bíblicos y promesas ya cacheados
+                from cache_manager import cache_manager
+                from bible_books import BIBLE_DATASET_TAG
+                from database import PROMISES_DATASET_TAG
+                cache_manager.invalidate(tag=BIBLE_DATASET_TAG)
+                cache_manager.invalidate(tag=PROMISES_DATASET_TAG)
             except Exception as e:
                 logger.error(f"Error aplicando migraciones: {str(e)}")
                 return False
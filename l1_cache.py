@@ -0,0 +1,212 @@
+"""
+L1Cache - Caché local acotado en bytes con cuotas por namespace
+"""
+import logging
+import os
+import re
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+from cache_metrics import CacheMetrics, namespace_of
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Presupuesto por defecto de un worker y cuotas de los namespaces con más volumen;
+# el resto de namespaces comparte lo que queda del presupuesto
+DEFAULT_BUDGET = 64 * MB
+DEFAULT_QUOTAS = {
+    'chapter': 16 * MB,
+    'verse': 4 * MB,
+    'search': 8 * MB,
+    'embedding': 16 * MB,
+}
+DEFAULT_PARTITION = 'default'
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': MB, 'GB': 1024 * MB}
+
+
+def parse_size(value: str) -> int:
+    """Convierte '16MB', '512KB' o '1048576' a bytes."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*', value.upper())
+    if not match:
+        raise ValueError(f"Tamaño inválido: {value}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def parse_quotas(value: str) -> Dict[str, int]:
+    """Convierte 'chapter=16MB,search=8MB' a {namespace: bytes}."""
+    quotas = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        namespace, _, size = item.partition('=')
+        quotas[namespace.strip()] = parse_size(size)
+    return quotas
+
+
+def approx_size(value: Any) -> int:
+    """
+    Tamaño aproximado en bytes de un valor cacheado, incluidos sus elementos.
+
+    Recorre dicts, listas, tuplas y conjuntos; para arrays de numpy usa nbytes.
+    """
+    size = 0
+    stack = [value]
+    seen = set()
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, 'nbytes') and not isinstance(item, (bytes, bytearray)):
+            size += int(item.nbytes)
+    return size
+
+
+class MeteredTTLCache(TTLCache):
+    """TTLCache que informa desalojos por tamaño y expiraciones a CacheMetrics."""
+
+    def __init__(self, maxsize, ttl, metrics: CacheMetrics, **kwargs):
+        super().__init__(maxsize, ttl, **kwargs)
+        self.metrics = metrics
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.metrics.incr(namespace_of(key), 'eviction')
+        return key, value
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, _ in expired or ():
+            self.metrics.incr(namespace_of(key), 'expiration')
+        return expired
+
+
+class L1Cache:
+    """
+    Caché L1 con presupuesto de memoria en bytes repartido en particiones por namespace.
+
+    Cada namespace con cuota tiene su propia partición TTL + LRU medida en bytes, así que
+    una ráfaga de búsquedas grandes no desaloja capítulos ni versículos. Los namespaces sin
+    cuota comparten la partición 'default'. Un namespace 'fn:modulo.funcion' usa la cuota
+    de 'fn' si no tiene una propia.
+    """
+
+    def __init__(self, budget: int = DEFAULT_BUDGET, ttl: float = 300,
+                 quotas: Optional[Dict[str, int]] = None,
+                 metrics: Optional[CacheMetrics] = None):
+        """
+        Inicializa el caché L1.
+
+        Args:
+            budget: Presupuesto total en bytes
+            ttl: Tiempo de vida de las entradas en segundos
+            quotas: Bytes reservados por namespace (DEFAULT_QUOTAS si es None)
+            metrics: Métricas donde registrar desalojos, expiraciones y rechazos
+        """
+        quotas = dict(DEFAULT_QUOTAS if quotas is None else quotas)
+        assigned = sum(quotas.values())
+        if assigned >= budget:
+            # Escalar las cuotas para dejar al menos 1/8 del presupuesto a 'default'
+            scale = budget * 7 / 8 / assigned
+            logger.warning("Las cuotas de L1 superan el presupuesto, se escalan proporcionalmente")
+            quotas = {namespace: int(size * scale) for namespace, size in quotas.items()}
+            assigned = sum(quotas.values())
+
+        self.maxsize = budget
+        self.ttl = ttl
+        self.metrics = metrics or CacheMetrics()
+        self._lock = threading.RLock()
+        self._partitions: Dict[str, MeteredTTLCache] = {
+            namespace: MeteredTTLCache(size, ttl, self.metrics, getsizeof=approx_size)
+            for namespace, size in quotas.items()
+        }
+        self._partitions[DEFAULT_PARTITION] = MeteredTTLCache(
+            budget - assigned, ttl, self.metrics, getsizeof=approx_size
+        )
+
+    def _partition(self, key: str) -> MeteredTTLCache:
+        namespace = namespace_of(key)
+        partition = self._partitions.get(namespace)
+        if partition is None:
+            partition = self._partitions.get(namespace.partition(':')[0], self._partitions[DEFAULT_PARTITION])
+        return partition
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._partition(key).get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._partition(key)
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            return self._partition(key)[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        with self._lock:
+            partition = self._partition(key)
+            try:
+                partition[key] = value
+            except ValueError:
+                # Valor mayor que toda la cuota de su namespace: solo se guarda en L2
+                partition.pop(key, None)
+                self.metrics.incr(namespace_of(key), 'rejected')
+                logger.debug(f"Valor demasiado grande para L1: {key}")
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._partition(key).pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            for partition in self._partitions.values():
+                partition.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(partition) for partition in self._partitions.values())
+
+    @property
+    def currsize(self) -> int:
+        """Bytes ocupados (aproximados) en todas las particiones."""
+        with self._lock:
+            return sum(partition.currsize for partition in self._partitions.values())
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """Cuota, bytes usados y entradas de cada partición."""
+        with self._lock:
+            return {
+                namespace: {
+                    'quota': int(partition.maxsize),
+                    'bytes': int(partition.currsize),
+                    'entries': len(partition),
+                }
+                for namespace, partition in self._partitions.items()
+            }
+
+
+def l1_cache_from_env(metrics: Optional[CacheMetrics] = None) -> L1Cache:
+    """Crea el L1 según CACHE_L1_BYTES, CACHE_L1_TTL y CACHE_L1_QUOTAS."""
+    budget = os.environ.get('CACHE_L1_BYTES')
+    quotas = os.environ.get('CACHE_L1_QUOTAS')
+    return L1Cache(
+        budget=parse_size(budget) if budget else DEFAULT_BUDGET,
+        ttl=float(os.environ.get('CACHE_L1_TTL', 300)),
+        quotas=parse_quotas(quotas) if quotas is not None else None,
+        metrics=metrics,
+    )
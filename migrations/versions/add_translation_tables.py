@@ -0,0 +1,87 @@
+"""Add normalized translation tables
+
+Revision ID: add_translation_tables
+Revises: jwt_auth_update
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_translation_tables'
+down_revision = 'jwt_auth_update'
+branch_labels = None
+depends_on = None
+
+TRANSLATIONS = [
+    # (code, name, language, columna en bibleverse)
+    ('es', 'Reina-Valera', 'es', 'spanish_text'),
+    ('tzo', "Tzotzil", 'tzo', 'tzotzil_text'),
+]
+
+def upgrade():
+    translation = op.create_table(
+        'translation',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('code', sa.String(20), nullable=False, unique=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('language', sa.String(20), nullable=False),
+    )
+
+    verse_key = op.create_table(
+        'verse_key',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('book', sa.String(50), nullable=False),
+        sa.Column('chapter', sa.Integer(), nullable=False),
+        sa.Column('verse', sa.Integer(), nullable=False),
+    )
+    op.create_index('ix_verse_key_book_chapter', 'verse_key', ['book', 'chapter'])
+
+    verse_text = op.create_table(
+        'verse_text',
+        sa.Column('translation_id', sa.Integer(), sa.ForeignKey('translation.id'), primary_key=True),
+        sa.Column('verse_key_id', sa.Integer(), sa.ForeignKey('verse_key.id'), primary_key=True),
+        sa.Column('text', sa.Text(), nullable=False),
+    )
+
+    # Copiar los textos de la tabla heredada bibleverse
+    from bible_books import encode_verse_key
+
+    bind = op.get_bind()
+    # Sin ids explícitos: la secuencia de translation.id (PostgreSQL) debe avanzar
+    op.bulk_insert(translation, [
+        {'code': code, 'name': name, 'language': language}
+        for code, name, language, _ in TRANSLATIONS
+    ])
+    translation_ids = dict(bind.execute(sa.text("SELECT code, id FROM translation")).fetchall())
+
+    rows = bind.execute(sa.text(
+        "SELECT book, chapter, verse, spanish_text, tzotzil_text FROM bibleverse"
+    )).fetchall()
+
+    keys, texts = {}, {}
+    for row in rows:
+        try:
+            key = encode_verse_key(row.book, row.chapter, row.verse)
+        except ValueError:
+            continue
+        keys[key] = {'id': key, 'book': row.book, 'chapter': row.chapter, 'verse': row.verse}
+        for code, _, _, column in TRANSLATIONS:
+            translation_id = translation_ids[code]
+            value = getattr(row, column)
+            if value:
+                texts[(translation_id, key)] = {
+                    'translation_id': translation_id, 'verse_key_id': key, 'text': value
+                }
+
+    if keys:
+        op.bulk_insert(verse_key, list(keys.values()))
+    if texts:
+        op.bulk_insert(verse_text, list(texts.values()))
+
+def downgrade():
+    op.drop_table('verse_text')
+    op.drop_index('ix_verse_key_book_chapter', table_name='verse_key')
+    op.drop_table('verse_key')
+    op.drop_table('translation')
@@ -58,6 +58,36 @@ class BibleVerse(db.Model):
     tzotzil_text = db.Column(db.Text, nullable=False)
     spanish_text = db.Column(db.Text, nullable=False)
 
+# Columnas de la tabla heredada bibleverse que corresponden a cada traducción
+LEGACY_TRANSLATION_COLUMNS = {
+    'es': 'spanish_text',
+    'tzo': 'tzotzil_text',
+}
+
+class Translation(db.Model):
+    """Traducción bíblica disponible (una fila por versión)"""
+    __tablename__ = 'translation'
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(20), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    language = db.Column(db.String(20), nullable=False)
+
+class VerseKey(db.Model):
+    """Referencia bíblica normalizada; el id es la clave compacta de bible_books.encode_verse_key"""
+    __tablename__ = 'verse_key'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    book = db.Column(db.String(50), nullable=False)
+    chapter = db.Column(db.Integer, nullable=False)
+    verse = db.Column(db.Integer, nullable=False)
+    __table_args__ = (db.Index('ix_verse_key_book_chapter', 'book', 'chapter'),)
+
+class VerseText(db.Model):
+    """Texto de un versículo en una traducción"""
+    __tablename__ = 'verse_text'
+    translation_id = db.Column(db.Integer, db.ForeignKey('translation.id'), primary_key=True)
+    verse_key_id = db.Column(db.Integer, db.ForeignKey('verse_key.id'), primary_key=True)
+    text = db.Column(db.Text, nullable=False)
+
 class Promise(db.Model):
     __tablename__ = 'promise'
     id = db.Column(db.Integer, primary_key=True)
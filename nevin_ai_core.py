@@ -12,6 +12,9 @@ from datetime import datetime
 from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from itertools import zip_longest
+
+from topical_index import get_topical_index
 
 # Import Anthropic Claude 4
 from anthropic import Anthropic
@@ -115,9 +118,18 @@ class NevinAICore:
         """
         Búsqueda dinámica en los escritos de Ellen G. White usando múltiples fuentes web
         """
+        if max_results < 1:
+            raise ValueError(f"max_results debe ser al menos 1: {max_results}")
+        
         # Import the EGW search engine
         from egw_web_search import get_egw_search_engine
         
+        # Common thematic questions are answered from the precomputed topical index;
+        # the live search only runs to complete a partial topical answer
+        topical_results = self._search_topical_index(query, max_results)
+        if len(topical_results) >= max_results:
+            return topical_results[:max_results]
+        
         search_results = []
         
         try:
@@ -140,6 +152,10 @@ class NevinAICore:
         except Exception as e:
             logger.error(f"Error searching EGW writings: {e}")
             
+            # Topical hits already cover the query
+            if topical_results:
+                return topical_results
+            
             # Fallback to mock results if search fails
             mock_results = [
                 SearchResult(
@@ -153,7 +169,60 @@ class NevinAICore:
             ]
             search_results.extend(mock_results)
         
-        return search_results
+        return self._merge_search_results(topical_results, search_results, max_results)
+    
+    @staticmethod
+    def _merge_search_results(topical_results: List[SearchResult], live_results: List[SearchResult],
+                              max_results: int) -> List[SearchResult]:
+        """
+        Intercalar resultados temáticos y en vivo por posición, sin contenido duplicado
+        (sus puntuaciones no son comparables entre sí)
+        """
+        merged, seen = [], set()
+        for pair in zip_longest(topical_results, live_results):
+            for result in pair:
+                if result is None:
+                    continue
+                key = ' '.join(result.content.split()).lower()
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(result)
+        return merged[:max_results]
+    
+    def _search_topical_index(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        """
+        Obtener escritos del índice temático precalculado si la pregunta menciona un tema conocido
+        """
+        try:
+            topical_index = get_topical_index()
+            topic = topical_index.match(query) if topical_index else None
+            if not topic:
+                return []
+            
+            entry = topical_index.lookup(topic, max_chunks=max_results)
+            return [
+                SearchResult(
+                    content=writing['content'],
+                    source=writing['book'],
+                    url='',
+                    relevance_score=writing['score'],
+                    egw_book=writing['book'] if writing['source'] == 'egw' else None
+                )
+                for writing in entry['writings']
+            ]
+        except Exception as e:
+            logger.warning(f"Error consulting topical index: {e}")
+            return []
+    
+    def _topical_verse_references(self, question: str, max_verses: int = 5) -> str:
+        """Referencias bíblicas precalculadas para el tema de la pregunta"""
+        topical_index = get_topical_index()
+        topic = topical_index.match(question) if topical_index else None
+        if not topic:
+            return ""
+        entry = topical_index.lookup(topic, max_verses=max_verses)
+        return ", ".join(verse['reference'] for verse in entry['verses'])
     
     def identify_text_type(self, biblical_text: str, reference: str = "") -> TextType:
         """
@@ -304,6 +373,9 @@ Principios hermenéuticos a aplicar:
 Referencias de Ellen G. White encontradas:
 {self._format_egw_results(egw_results)}
 
+Versículos relacionados con el tema:
+{self._topical_verse_references(question) or "Ninguno precalculado"}
+
 Instrucciones especiales:
 - Usa razonamiento extendido para análisis profundo
 - Proporciona citas específicas cuando sea posible
@@ -16,6 +16,10 @@ import os
 import sqlite3
 import time
 from validation import DataValidator
+from bible_books import BIBLE_BOOKS_ORDER
+from topical_index import get_topical_index
+from bible_corpus import bible_corpus
+from bible_data_access import bible_data_access
 from flask_cors import CORS, cross_origin
 
 logger = logging.getLogger(__name__)
@@ -45,78 +49,6 @@ def init_routes(app):
         return False
 validator = DataValidator()
 
-# Biblical order of books
-BIBLE_BOOKS_ORDER = [
-    # Old Testament
-    'Génesis',
-    'Éxodo',
-    'Levítico',
-    'Números',
-    'Deuteronomio',
-    'Josué',
-    'Jueces',
-    'Rut',
-    '1 Samuel',
-    '2 Samuel',
-    '1 Reyes',
-    '2 Reyes',
-    '1 Crónicas',
-    '2 Crónicas',
-    'Esdras',
-    'Nehemías',
-    'Ester',
-    'Job',
-    'Salmos',
-    'Proverbios',
-    'Eclesiastés',
-    'Cantares',
-    'Isaías',
-    'Jeremías',
-    'Lamentaciones',
-    'Ezequiel',
-    'Daniel',
-    'Oseas',
-    'Joel',
-    'Amós',
-    'Abdías',
-    'Jonás',
-    'Miqueas',
-    'Nahúm',
-    'Habacuc',
-    'Sofonías',
-    'Hageo',
-    'Zacarías',
-    'Malaquías',
-    # New Testament
-    'Mateo',
-    'Marcos',
-    'Lucas',
-    'Juan',
-    'Hechos',
-    'Romanos',
-    '1 Corintios',
-    '2 Corintios',
-    'Gálatas',
-    'Efesios',
-    'Filipenses',
-    'Colosenses',
-    '1 Tesalonicenses',
-    '2 Tesalonicenses',
-    '1 Timoteo',
-    '2 Timoteo',
-    'Tito',
-    'Filemón',
-    'Hebreos',
-    'Santiago',
-    '1 Pedro',
-    '2 Pedro',
-    '1 Juan',
-    '2 Juan',
-    '3 Juan',
-    'Judas',
-    'Apocalipsis'
-]
-
 
 @routes.before_request
 def validate_database():
@@ -212,9 +144,9 @@ def daily_promise():
         # Usar el día del año como semilla para obtener una promesa consistente
         day_of_year = today.timetuple().tm_yday
 
-        # Contar total de promesas
-        total_promises = db.session.query(Promise).count()
-        if total_promises == 0:
+        # Lista de promesas cacheada (ordenada por id)
+        promises = db_manager.get_promises()
+        if not promises:
             logger.warning("No hay promesas disponibles en la base de datos")
             return jsonify({
                 'status': 'error',
@@ -222,23 +154,13 @@ def daily_promise():
             }), 404
 
         # Usar el módulo para obtener un índice consistente para el día
-        promise_index = day_of_year % total_promises
-
-        # Obtener la promesa del día
-        daily_promise = db.session.query(Promise).offset(promise_index).limit(1).first()
-
-        if not daily_promise:
-            logger.error("Error al obtener la promesa diaria")
-            return jsonify({
-                'status': 'error',
-                'message': 'Error al obtener la promesa diaria'
-            }), 500
+        daily_promise = promises[day_of_year % len(promises)]
 
         return jsonify({
             'status': 'success',
-            'verse_text': daily_promise.verse_text,
-            'background_image': daily_promise.background_image,
-            'book_reference': daily_promise.book_reference,
+            'verse_text': daily_promise['verse_text'],
+            'background_image': daily_promise['background_image'],
+            'book_reference': daily_promise['book_reference'],
             'date': today.isoformat()
         })
 
@@ -252,20 +174,21 @@ def daily_promise():
 @routes.route('/random_promise')
 def random_promise():
     try:
-        random_promise = db.session.query(Promise).order_by(func.random()).first()
+        promises = db_manager.get_promises()
 
-        if not random_promise:
+        if not promises:
             logger.warning("No hay promesas disponibles en la base de datos")
             return jsonify({
                 'status': 'error',
                 'message': 'No hay promesas disponibles'
             }), 404
 
+        random_promise = random.choice(promises)
         return jsonify({
             'status': 'success',
-            'verse_text': random_promise.verse_text,
-            'background_image': random_promise.background_image,
-            'book_reference': random_promise.book_reference
+            'verse_text': random_promise['verse_text'],
+            'background_image': random_promise['background_image'],
+            'book_reference': random_promise['book_reference']
         })
     except Exception as e:
         logger.error(f"Error al obtener la promesa: {str(e)}")
@@ -280,16 +203,15 @@ def index():
     logger.info("Accessing index route")
     try:
         logger.info("Rendering index.html template")
-        # Obtener una promesa aleatoria de la base de datos
-        total_promises = Promise.query.count()
+        # Obtener una promesa aleatoria de la lista cacheada
+        promises = db_manager.get_promises()
 
         # Si no hay promesas disponibles, mostrar un mensaje adecuado
-        if total_promises == 0:
+        if not promises:
             return render_template('index.html', promise=None)
 
         # Seleccionar una promesa aleatoria
-        random_index = random.randint(0, total_promises - 1)
-        random_promise = Promise.query.offset(random_index).first()
+        random_promise = random.choice(promises)
 
         # Pasar la promesa al template
         return render_template('index.html', promise=random_promise)
@@ -861,6 +783,9 @@ Available endpoints:
 - GET /api/books: Returns list of available books
 - GET /api/chapters/{book}: Returns chapters for a specific book
 - GET /api/verses/{book}/{chapter}: Returns verses for a specific chapter
+  (?translations=es,tzo returns only the requested translations)
+- GET /api/bible/passage/{book}/{chapter}: Returns a chapter with its neighbours (?context=1)
+- GET /api/topics/{topic}: Returns precomputed verses and writings for a topic
 - POST /api/settings: Updates user settings
 """
 
@@ -890,6 +815,14 @@ def get_chapters_api(book):
 @cross_origin()
 def get_verses_api(book, chapter):
     try:
+        # ?translations=es,tzo lee solo esas traducciones del corpus en memoria
+        translations = [code for code in request.args.get('translations', '').split(',') if code]
+        if translations:
+            if book not in BIBLE_BOOKS_ORDER:
+                return jsonify({'error': 'Libro no encontrado'}), 404
+            verses = bible_corpus.get_chapter(book, chapter, translations)
+            return jsonify({'verses': verses, 'translations': translations}), 200
+
         verses_result = db_manager.get_verses(book, str(chapter))
         if not verses_result['success']:
             return jsonify({'error': verses_result['error']}), 500
@@ -898,6 +831,64 @@ def get_verses_api(book, chapter):
         logger.error(f"Error getting verses: {str(e)}")
         return jsonify({'error': 'Error retrieving verses'}), 500
 
+@routes.route('/api/bible/passage/<book>/<int:chapter>', methods=['GET'])
+@cross_origin()
+def get_passage_api(book, chapter):
+    """Capítulo con sus vecinos (?context=1) para precargar la navegación de lectura"""
+    try:
+        if book not in BIBLE_BOOKS_ORDER:
+            return jsonify({'error': 'Libro no encontrado'}), 404
+        context = min(max(request.args.get('context', 1, type=int), 0), 3)
+        translations = [code for code in request.args.get('translations', '').split(',') if code] or None
+        result = bible_data_access.get_passage(book, chapter, context, translations)
+        if not result['success']:
+            status = 404 if result['error'] == "Capítulo no encontrado" else 500
+            return jsonify({'error': result['error']}), status
+        return jsonify(result['data']), 200
+    except Exception as e:
+        logger.error(f"Error getting passage: {str(e)}")
+        return jsonify({'error': 'Error retrieving passage'}), 500
+
+@routes.route('/api/topics', methods=['GET'])
+@cross_origin()
+def get_topics_api():
+    try:
+        topical_index = get_topical_index()
+        if topical_index is None:
+            return jsonify({'error': 'Índice temático no disponible'}), 503
+        return jsonify(topical_index.topics), 200
+    except Exception as e:
+        logger.error(f"Error getting topics: {str(e)}")
+        return jsonify({'error': 'Error retrieving topics'}), 500
+
+@routes.route('/api/topics/<topic>', methods=['GET'])
+@cross_origin()
+def get_topic_api(topic):
+    """
+    Devuelve los versículos y escritos precalculados para un tema
+
+    Query params:
+        limit: Número máximo de versículos y escritos a devolver
+    """
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            return jsonify({'error': 'limit debe ser un entero mayor o igual a 1'}), 400
+        limit = int(limit)
+
+    try:
+        topical_index = get_topical_index()
+        if topical_index is None:
+            return jsonify({'error': 'Índice temático no disponible'}), 503
+
+        result = topical_index.lookup(topic, max_verses=limit, max_chunks=limit)
+        if result is None:
+            return jsonify({'error': f'Tema no encontrado: {topic}'}), 404
+        return jsonify(result), 200
+    except Exception as e:
+        logger.error(f"Error getting topic {topic}: {str(e)}")
+        return jsonify({'error': 'Error retrieving topic'}), 500
+
 @routes.route('/api/validate', methods=['POST'])
 @login_required
 def validate():
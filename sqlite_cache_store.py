@@ -0,0 +1,356 @@
+"""
+SQLiteCacheStore - Nivel L2 compartido por los workers de un mismo host sin Redis
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import redis
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Libera un candado solo si sigue perteneciendo a quien lo tomó (KEYS[1], ARGV[1])
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at) WHERE expires_at IS NOT NULL;
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+def _to_bytes(value: Union[str, bytes, int, float]) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+class SQLiteCacheStore:
+    """
+    Almacén clave-valor en un archivo SQLite (modo WAL) con TTL y desalojo LRU.
+
+    Implementa el subconjunto del cliente de redis-py que usa CacheManager (get, mget,
+    set con nx/px, setex, delete, exists, incr, pipeline, eval del script de liberación
+    de candados y publish/pubsub), así que todos los workers de un host comparten
+    valores, generaciones, candados e invalidaciones sin un servidor Redis. Los errores
+    de SQLite se elevan como redis.ConnectionError para que el circuit breaker los trate
+    igual que una caída de Redis.
+
+    El LRU es aproximado: la fecha de último acceso se actualiza como mucho una vez
+    cada `touch_interval` segundos por clave, para que las lecturas no compitan por el
+    candado de escritura de SQLite.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024,
+                 touch_interval: float = 60.0, prune_every: int = 200,
+                 message_retention: float = 60.0):
+        """
+        Inicializa el almacén.
+
+        Args:
+            path: Archivo SQLite compartido por los workers
+            max_bytes: Tamaño máximo de los valores antes de desalojar por LRU
+            touch_interval: Segundos mínimos entre actualizaciones del último acceso
+            prune_every: Escrituras entre limpiezas de expirados y desalojos
+            message_retention: Segundos que se conservan los mensajes de pub/sub
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.prune_every = prune_every
+        self.message_retention = message_retention
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._errors():
+            self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión del hilo actual; se reabre tras un fork (p. ej. workers de gunicorn)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _errors(self):
+        try:
+            yield
+        except sqlite3.Error as e:
+            raise redis.ConnectionError(f"SQLite: {str(e)}") from e
+
+    @contextmanager
+    def _transaction(self):
+        """Transacción de escritura (BEGIN IMMEDIATE) para operaciones de lectura-modificación."""
+        conn = self._connection()
+        with self._errors():
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    # -- Lectura ---------------------------------------------------------------
+
+    def ping(self) -> bool:
+        with self._errors():
+            self._connection().execute("SELECT 1")
+        return True
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.mget([key])[0]
+
+    def mget(self, keys: Iterable[str], *args: str) -> List[Optional[bytes]]:
+        keys = list(keys) if not isinstance(keys, str) else [keys]
+        keys.extend(args)
+        if not keys:
+            return []
+        now = time.time()
+        found: Dict[str, bytes] = {}
+        stale_touch: List[str] = []
+        with self._errors():
+            conn = self._connection()
+            # SQLite limita el número de parámetros por consulta
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, value, accessed_at FROM entries WHERE key IN ({','.join('?' * len(chunk))}) "
+                    "AND (expires_at IS NULL OR expires_at > ?)",
+                    (*chunk, now)
+                ).fetchall()
+                for key, value, accessed_at in rows:
+                    found[key] = bytes(value)
+                    if now - accessed_at > self.touch_interval:
+                        stale_touch.append(key)
+            if stale_touch:
+                try:
+                    conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?",
+                                     [(now, key) for key in stale_touch])
+                except sqlite3.OperationalError:
+                    pass  # Base ocupada: el último acceso se actualizará en otra lectura
+        return [found.get(key) for key in keys]
+
+    def exists(self, *keys: str) -> int:
+        with self._errors():
+            return self._connection().execute(
+                f"SELECT COUNT(*) FROM entries WHERE key IN ({','.join('?' * len(keys))}) "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (*keys, time.time())
+            ).fetchone()[0]
+
+    # -- Escritura -------------------------------------------------------------
+
+    def _put(self, conn: sqlite3.Connection, key: str, value: Any, ttl: Optional[float]) -> None:
+        data = _to_bytes(value)
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at, size) VALUES (?, ?, ?, ?, ?)",
+            (key, data, now + ttl if ttl is not None else None, now, len(key) + len(data))
+        )
+
+    def set(self, key: str, value: Any, ex: Optional[float] = None, px: Optional[int] = None,
+            nx: bool = False) -> Optional[bool]:
+        ttl = ex if ex is not None else (px / 1000.0 if px is not None else None)
+        with self._transaction() as conn:
+            if nx and conn.execute(
+                "SELECT 1 FROM entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone():
+                return None
+            self._put(conn, key, value, ttl)
+        self._after_write()
+        return True
+
+    def setex(self, key: str, ttl: Union[int, float], value: Any) -> bool:
+        with self._transaction() as conn:
+            self._put(conn, key, value, float(ttl))
+        self._after_write()
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._transaction() as conn:
+            return conn.execute(
+                f"DELETE FROM entries WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).rowcount
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+            try:
+                value = int(bytes(row[0])) + amount if row else amount
+            except ValueError:
+                raise redis.ResponseError("value is not an integer or out of range")
+            ttl = row[1] - time.time() if row and row[1] is not None else None
+            self._put(conn, key, value, ttl)
+        return value
+
+    def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        """Ejecuta el script de liberación de candados; otros scripts Lua no se admiten."""
+        if script.strip() != RELEASE_LOCK_SCRIPT.strip() or numkeys != 1:
+            raise redis.ResponseError("SQLiteCacheStore solo admite el script de liberación de candados")
+        key, token = keys_and_args
+        with self._transaction() as conn:
+            return conn.execute(
+                "DELETE FROM entries WHERE key = ? AND value = ?", (key, _to_bytes(token))
+            ).rowcount
+
+    def pipeline(self, transaction: bool = True) -> 'SQLitePipeline':
+        return SQLitePipeline(self)
+
+    def _after_write(self, count: int = 1) -> None:
+        with self._writes_lock:
+            self._writes += count
+            if self._writes < self.prune_every:
+                return
+            self._writes = 0
+        try:
+            self.prune()
+        except redis.RedisError as e:
+            logger.warning(f"Error depurando caché SQLite: {str(e)}")
+
+    def prune(self) -> int:
+        """
+        Elimina entradas expiradas y mensajes viejos, y desaloja por LRU hasta
+        quedar por debajo del 90% de max_bytes.
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            removed = conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+            conn.execute("DELETE FROM messages WHERE created < ?", (now - self.message_retention,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                target = total - int(self.max_bytes * 0.9)
+                freed = 0
+                victims = []
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                    victims.append((key,))
+                    freed += size
+                    if freed >= target:
+                        break
+                conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+                removed += len(victims)
+                logger.debug(f"Caché SQLite: {len(victims)} entradas desalojadas por tamaño")
+        return removed
+
+    def info(self) -> Dict[str, Any]:
+        """Entradas y bytes ocupados, para diagnóstico."""
+        with self._errors():
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {'path': self.path, 'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
+
+    # -- Pub/sub ---------------------------------------------------------------
+
+    def publish(self, channel: str, message: Any) -> int:
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO messages (channel, data, created) VALUES (?, ?, ?)",
+                         (channel, _to_bytes(message), time.time()))
+        return 0
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> 'SQLitePubSub':
+        return SQLitePubSub(self)
+
+
+class SQLitePipeline:
+    """Agrupa escrituras y las aplica en una sola transacción."""
+
+    def __init__(self, store: SQLiteCacheStore):
+        self.store = store
+        self._commands: List[tuple] = []
+
+    def setex(self, key: str, ttl: Union[int, float], value: Any) -> 'SQLitePipeline':
+        self._commands.append((key, value, float(ttl)))
+        return self
+
+    def set(self, key: str, value: Any, ex: Optional[float] = None) -> 'SQLitePipeline':
+        self._commands.append((key, value, ex))
+        return self
+
+    def execute(self) -> List[bool]:
+        commands, self._commands = self._commands, []
+        if not commands:
+            return []
+        with self.store._transaction() as conn:
+            for key, value, ttl in commands:
+                self.store._put(conn, key, value, ttl)
+        self.store._after_write(len(commands))
+        return [True] * len(commands)
+
+
+class SQLitePubSub:
+    """Suscripción por sondeo de la tabla de mensajes del almacén."""
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, store: SQLiteCacheStore):
+        self.store = store
+        self.channels: List[str] = []
+        self._last_id = 0
+
+    def subscribe(self, *channels: str) -> None:
+        self.channels.extend(channels)
+        with self.store._errors():
+            self._last_id = self.store._connection().execute(
+                "SELECT COALESCE(MAX(id), 0) FROM messages"
+            ).fetchone()[0]
+
+    def get_message(self, timeout: float = 0.0) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        placeholders = ','.join('?' * len(self.channels))
+        while True:
+            with self.store._errors():
+                row = self.store._connection().execute(
+                    f"SELECT id, channel, data FROM messages WHERE id > ? AND channel IN ({placeholders}) "
+                    "ORDER BY id LIMIT 1",
+                    (self._last_id, *self.channels)
+                ).fetchone()
+            if row:
+                self._last_id = row[0]
+                return {'type': 'message', 'channel': row[1].encode('utf-8'), 'data': bytes(row[2])}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.POLL_INTERVAL, remaining))
+
+    def close(self) -> None:
+        self.channels = []
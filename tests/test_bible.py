@@ -60,3 +60,9 @@ def test_invalid_input(app, bible_data):
     with app.app_context():
         result = bible_data.get_verse("", -1, 0)
         assert result['success'] is False
+
+def test_invalidate_books_invalidates_search_once(bible_data, monkeypatch):
+    calls = []
+    monkeypatch.setattr(bible_data.cache, 'invalidate', lambda **kwargs: calls.append(kwargs) or True)
+    bible_data.invalidate_books(["Juan", "Génesis", "Juan"])
+    assert calls == [{'tag': 'book:Génesis'}, {'tag': 'book:Juan'}, {'namespace': 'search'}]
@@ -0,0 +1,123 @@
+
+import time
+import pytest
+from bible_books import encode_verse_key
+from bible_corpus import BibleCorpus
+
+ROWS = {
+    'es': [
+        (encode_verse_key("Juan", 3, 17), "Porque no envió Dios a su Hijo al mundo"),
+        (encode_verse_key("Juan", 3, 16), "Porque de tal manera amó Dios al mundo"),
+        (encode_verse_key("Juan", 4, 1), "Cuando, pues, el Señor entendió"),
+    ],
+    'tzo': [
+        (encode_verse_key("Juan", 3, 16), "Yu'un toj k'ux ta yo'on Dios li balumile"),
+    ],
+}
+
+@pytest.fixture
+def corpus():
+    loaded = []
+
+    def loader(code):
+        loaded.append(code)
+        return ROWS.get(code, [])
+
+    corpus = BibleCorpus(loader=loader)
+    corpus.loaded = loaded
+    return corpus
+
+def test_get_chapter_single_translation(corpus):
+    verses = corpus.get_chapter("Juan", 3, ['es'])
+    assert [v['verse'] for v in verses] == [16, 17]
+    assert verses[0]['texts'] == {'es': "Porque de tal manera amó Dios al mundo"}
+
+def test_translations_are_loaded_lazily(corpus):
+    corpus.get_chapter("Juan", 3, ['es'])
+    assert corpus.translations == ['es']
+    assert corpus.loaded == ['es']
+
+    verses = corpus.get_chapter("Juan", 3, ['es', 'tzo'])
+    assert set(verses[0]['texts']) == {'es', 'tzo'}
+    assert 'tzo' not in verses[1]['texts']
+    assert corpus.loaded == ['es', 'tzo']
+
+def test_get_verse(corpus):
+    verse = corpus.get_verse("Juan", 4, 1, ['es'])
+    assert verse['book'] == "Juan"
+    assert verse['texts']['es'].startswith("Cuando")
+    assert corpus.get_verse("Juan", 4, 2, ['es']) is None
+
+def test_unknown_translation_is_skipped(corpus):
+    assert corpus.get_chapter("Juan", 3, ['xx']) == []
+    assert 'xx' not in corpus.translations
+
+def test_unknown_translation_is_checked_once_per_version():
+    loaded, versions = [], {'xx': 1}
+    corpus = BibleCorpus(loader=lambda code: loaded.append(code) or ROWS.get(code, []),
+                         version=versions.get)
+    for _ in range(3):
+        assert corpus.get_chapter("Juan", 3, ['xx']) == []
+    assert loaded == ['xx']
+
+    corpus.unload('xx')
+    corpus.get_chapter("Juan", 3, ['xx'])
+    versions['xx'] = 2  # Importación de la traducción
+    corpus.get_chapter("Juan", 3, ['xx'])
+    assert loaded == ['xx', 'xx', 'xx']
+
+def _many_chapters():
+    rows = []
+    for chapter in range(1, 31):
+        for verse in range(1, 21):
+            rows.append((encode_verse_key("Salmos", chapter, verse),
+                         f"Salmo {chapter} verso {verse}: Jehová es mi pastor; nada me faltará"))
+    return rows
+
+def test_compressed_corpus_matches_plain():
+    pytest.importorskip("zstandard")
+    rows = _many_chapters()
+    plain = BibleCorpus(loader=lambda code: rows)
+    compressed = BibleCorpus(loader=lambda code: rows, compress=True, chapter_cache_size=4)
+
+    for chapter in (1, 15, 30):
+        assert compressed.get_chapter("Salmos", chapter, ['es']) == plain.get_chapter("Salmos", chapter, ['es'])
+    assert compressed.get_verse("Salmos", 23, 1, ['es']) == plain.get_verse("Salmos", 23, 1, ['es'])
+    assert compressed.memory_usage()['es'] < plain.memory_usage()['es']
+
+def test_compressed_chapter_cache_is_bounded():
+    pytest.importorskip("zstandard")
+    rows = _many_chapters()
+    corpus = BibleCorpus(loader=lambda code: rows, compress=True, chapter_cache_size=2)
+    for chapter in range(1, 11):
+        corpus.get_chapter("Salmos", chapter, ['es'])
+    assert len(corpus._chapter_cache) == 2
+    corpus.unload('es')
+    assert len(corpus._chapter_cache) == 0
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_other_worker_reloads_translation_after_import(tmp_path, compress):
+    if compress:
+        pytest.importorskip("zstandard")
+    from bible_books import translation_cache_tag
+    from cache_manager import CacheManager
+    path = str(tmp_path / "l2.sqlite3")
+    importer, worker = CacheManager(prefix="t"), CacheManager(prefix="t")
+    importer.init_sqlite(path)
+    worker.init_sqlite(path)
+    database = {'es': _many_chapters()}
+    corpus = BibleCorpus(loader=lambda code: database[code], compress=compress,
+                         version=lambda code: worker.generation(translation_cache_tag(code)))
+    try:
+        assert corpus.get_verse("Salmos", 23, 1, ['es'])['texts']['es'].startswith("Salmo 23")
+
+        database['es'] = [(key, f"Corregido {i}") for i, (key, _) in enumerate(_many_chapters())]
+        importer.invalidate(tag=translation_cache_tag('es'))
+        deadline = time.monotonic() + 3
+        while (corpus.get_verse("Salmos", 23, 1, ['es'])['texts']['es'].startswith("Salmo")
+               and time.monotonic() < deadline):
+            time.sleep(0.05)
+        assert corpus.get_verse("Salmos", 23, 1, ['es'])['texts']['es'] == "Corregido 440"
+    finally:
+        importer.stop_invalidation_listener()
+        worker.stop_invalidation_listener()
@@ -0,0 +1,387 @@
+
+import json
+import threading
+import time
+import pytest
+from cache_manager import CacheManager
+from cache_metrics import CacheMetrics
+
+def test_get_or_compute_runs_once_for_concurrent_misses():
+    cache = CacheManager()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'success': True}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("chapter:Juan:3", compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'success': True}] * 8
+
+def test_get_or_compute_serves_stale_while_recomputing():
+    cache = CacheManager()
+    cache.set("chapter:Juan:3", "viejo")
+    cache.local_cache.clear()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.2)
+        return "nuevo"
+
+    worker = threading.Thread(target=lambda: cache.get_or_compute("chapter:Juan:3", slow))
+    worker.start()
+    started.wait()
+    assert cache.get_or_compute("chapter:Juan:3", lambda: "otro") == "viejo"
+    worker.join()
+    assert cache.get("chapter:Juan:3") == "nuevo"
+
+def test_get_or_compute_respects_cache_if():
+    cache = CacheManager()
+    result = cache.get_or_compute("verse:x", lambda: {'success': False},
+                                  cache_if=lambda r: r['success'])
+    assert result == {'success': False}
+    assert cache.get("verse:x") is None
+
+def test_circuit_breaker_recovers_after_backoff():
+    import redis
+    from cache_manager import RedisCircuitBreaker
+
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = CacheManager()
+    cache.breaker = RedisCircuitBreaker(failure_threshold=2, base_backoff=0.05)
+    server = fakeredis.FakeServer()
+    cache.redis = fakeredis.FakeRedis(server=server)
+    server.connected = False  # Simula la caída del servidor
+
+    for _ in range(2):
+        cache.set("k", {"v": 1})
+    assert cache.breaker.state == RedisCircuitBreaker.OPEN
+    assert cache.health()['status'] == 'degraded'
+
+    server.connected = True
+    time.sleep(0.06)
+    assert cache.set("k", {"v": 2})
+    assert cache.breaker.state == RedisCircuitBreaker.CLOSED
+    cache.local_cache.clear()
+    assert cache.get("k") == {"v": 2}
+
+def test_async_probe_closes_breaker_after_backoff():
+    import asyncio
+    from cache_manager import RedisCircuitBreaker
+
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    cache = CacheManager()
+    cache.breaker = RedisCircuitBreaker(failure_threshold=1, base_backoff=0.05)
+    cache.redis = fakeredis.FakeRedis(server=server)
+    cache.backend, cache.redis_url = 'redis', 'redis://localhost:6379/0'
+    server.connected = False
+    cache.set("k", 1)
+    assert cache.breaker.state == RedisCircuitBreaker.OPEN
+    server.connected = True
+    time.sleep(0.06)
+
+    async def run():
+        cache._async_clients[asyncio.get_running_loop()] = fakeredis.FakeAsyncRedis(server=server)
+        assert await cache.aget("otra") is None
+        assert cache.breaker.state == RedisCircuitBreaker.CLOSED
+        await cache.aset("k", 2)
+        await cache.aclose()
+
+    asyncio.run(run())
+    cache.set("k2", 3)
+    assert len(fakeredis.FakeRedis(server=server).keys(f"{cache.prefix}:k*")) == 2
+
+def test_lock_release_and_wait_record_breaker_outcome():
+    from cache_manager import RedisCircuitBreaker
+
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = CacheManager()
+    cache.redis = fakeredis.FakeRedis()
+    for probe in (lambda: cache._release_redis_lock("k", "token"), lambda: cache._wait_for_value("k", 0.1)):
+        cache.breaker = RedisCircuitBreaker(failure_threshold=1, base_backoff=0.01)
+        cache.breaker.trip(ConnectionError("caído"))
+        time.sleep(0.02)
+        probe()
+        assert cache.breaker.state == RedisCircuitBreaker.CLOSED
+
+def test_stale_values_are_safe_across_threads():
+    from cachetools import LRUCache
+
+    cache = CacheManager()
+    cache._stale = LRUCache(maxsize=2000, getsizeof=len)  # Pequeño para forzar desalojos
+    errors = []
+
+    def worker(seed):
+        try:
+            for i in range(3000):
+                key = f"k{(seed * 7 + i) % 300}"
+                cache._remember_stale(key, "x" * (i % 50))
+                cache._stale_value(key)
+                if i % 97 == 0:
+                    cache._forget_stale(key)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache._stale.currsize <= cache._stale.maxsize
+
+def test_codec_roundtrip_and_legacy_json():
+    from cache_codec import CacheCodec
+
+    value = {'success': True, 'data': [{'verse': i, 'text': "Jehová es mi pastor " * 20} for i in range(30)]}
+    for serializer in ('json', 'orjson', 'msgpack'):
+        codec = CacheCodec(serializer=serializer)
+        encoded = codec.encode(value)
+        assert codec.decode(encoded) == value
+    assert len(codec.encode(value)) < len(json.dumps(value))
+    assert codec.decode(b'{"success": true}') == {'success': True}
+    with pytest.raises(ValueError):
+        codec.decode(b'\x01\x7fbasura')
+
+def test_stats_by_namespace():
+    cache = CacheManager()
+    cache.set("chapter:Juan:3", {'success': True})
+    cache.get("chapter:Juan:3")
+    cache.get("chapter:Juan:4")
+    cache.get("verse:Juan:3:16")
+
+    namespaces = cache.stats()['namespaces']
+    assert namespaces['chapter']['l1_hit'] == 1
+    assert namespaces['chapter']['miss'] == 1
+    assert namespaces['chapter']['set'] == 1
+    assert namespaces['chapter']['hit_ratio'] == 0.5
+    assert namespaces['verse']['latency']['get']['count'] == 1
+
+    text = cache.prometheus_metrics()
+    assert 'cache_events_total{namespace="chapter",event="l1_hit"} 1' in text
+    assert 'cache_latency_seconds_count{namespace="chapter",operation="get"} 2' in text
+
+def test_metrics_of_finished_threads_are_kept_after_pruning():
+    metrics = CacheMetrics()
+    for _ in range(20):
+        thread = threading.Thread(target=lambda: metrics.record('chapter', 'miss', 'get', 0.001))
+        thread.start()
+        thread.join()
+    metrics.incr('chapter', 'l1_hit')
+
+    counters, histograms = metrics.snapshot()
+    assert counters[('chapter', 'miss')] == 20
+    assert counters[('chapter', 'l1_hit')] == 1
+    assert sum(histograms[('chapter', 'get')][:-1]) == 20
+    assert len(metrics._shards) == 1
+
+    metrics.reset()
+    assert metrics.snapshot() == ({}, {})
+
+def test_invalidate_by_tag_and_namespace():
+    cache = CacheManager()
+    cache.set("chapter:Juan:3", "juan", tags=['book:Juan'])
+    cache.set("chapter:Salmos:23", "salmos", tags=['book:Salmos'])
+    cache.set("search:amor:5", ["r"])
+
+    cache.invalidate(tag='book:Juan')
+    assert cache.get("chapter:Juan:3", tags=['book:Juan']) is None
+    assert cache.get("chapter:Salmos:23", tags=['book:Salmos']) == "salmos"
+
+    cache.invalidate(namespace='search')
+    assert cache.get("search:amor:5") is None
+
+    cache.clear()
+    assert cache.get("chapter:Salmos:23", tags=['book:Salmos']) is None
+
+def test_invalidation_is_shared_through_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    worker_a, worker_b = CacheManager(), CacheManager()
+    worker_a.redis = fakeredis.FakeRedis(server=server)
+    worker_b.redis = fakeredis.FakeRedis(server=server)
+
+    worker_a.set("verse:Juan:3:16", {"v": 1}, tags=['dataset:bible'])
+    assert worker_b.get("verse:Juan:3:16", tags=['dataset:bible']) == {"v": 1}
+
+    worker_a.invalidate(tag='dataset:bible')
+    worker_b._generations.clear()  # Equivale a que venza GENERATION_TTL
+    assert worker_b.get("verse:Juan:3:16", tags=['dataset:bible']) is None
+    assert all(key.startswith(b"tzotzil:") for key in worker_a.redis.keys())
+
+def test_l1_quota_isolates_namespaces():
+    from l1_cache import L1Cache
+
+    l1 = L1Cache(budget=200_000, ttl=60, quotas={'search': 20_000, 'chapter': 100_000})
+    l1["chapter:Juan:3|g0"] = ["Porque de tal manera amó Dios al mundo"] * 20
+    for i in range(50):
+        l1[f"search:consulta{i}:5|g0"] = ["resultado " * 50] * 5
+
+    assert "chapter:Juan:3|g0" in l1
+    usage = l1.usage()
+    assert usage['search']['bytes'] <= 20_000
+    assert usage['search']['entries'] < 50
+    assert "search:consulta49:5|g0" in l1
+
+    l1["search:enorme|g0"] = "x" * 50_000  # Mayor que la cuota: no se guarda en L1
+    assert "search:enorme|g0" not in l1
+
+def test_get_many_and_set_many():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    writer, reader = CacheManager(), CacheManager()
+    writer.redis = fakeredis.FakeRedis(server=server)
+    reader.redis = fakeredis.FakeRedis(server=server)
+
+    writer.set_many({"chapter:Juan:2": "dos", "chapter:Juan:3": "tres"}, ttl=60, tags=['book:Juan'])
+    reader.set("chapter:Juan:4", "cuatro", tags=['book:Juan'])
+
+    found = reader.get_many(["chapter:Juan:2", "chapter:Juan:3", "chapter:Juan:4", "chapter:Juan:5"],
+                            tags=['book:Juan'])
+    assert found == {"chapter:Juan:2": "dos", "chapter:Juan:3": "tres", "chapter:Juan:4": "cuatro"}
+    namespace = reader.stats()['namespaces']['chapter']
+    assert (namespace['l1_hit'], namespace['l2_hit'], namespace['miss']) == (1, 2, 1)
+
+def _wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_invalidations_reach_other_workers_l1():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    workers = [CacheManager(), CacheManager()]
+    for worker in workers:
+        worker.redis = fakeredis.FakeRedis(server=server)
+        worker.start_invalidation_listener()
+    writer, reader = workers
+    try:
+        assert _wait_until(lambda: all(w._listener_connected.is_set() for w in workers))
+        writer.set("chapter:Juan:3", "viejo")
+        assert reader.get("chapter:Juan:3") == "viejo"  # Queda en el L1 del lector
+
+        writer.delete("chapter:Juan:3")
+        assert _wait_until(lambda: len(reader.local_cache) == 0)
+
+        writer.set("verse:Juan:3:16", "v1", tags=['book:Juan'])
+        assert reader.get("verse:Juan:3:16", tags=['book:Juan']) == "v1"
+        writer.invalidate(tag='book:Juan')
+        assert _wait_until(lambda: reader._generations.get('book:Juan', (0,))[0] == 1)
+        assert reader.get("verse:Juan:3:16", tags=['book:Juan']) is None
+    finally:
+        for worker in workers:
+            worker.stop_invalidation_listener()
+
+def test_stale_while_revalidate_refreshes_once_in_background():
+    import fakeredis
+    cache = CacheManager()
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(2.0)
+        return f"v{len(calls)}"
+
+    assert cache.get_or_compute("promises:all", load, ttl=1, stale_ttl=60) == "v1"
+    time.sleep(1.05)
+    # Pasado el TTL blando se sirve el valor obsoleto sin esperar el recálculo
+    for _ in range(5):
+        assert cache.get_or_compute("promises:all", load, ttl=1, stale_ttl=60) == "v1"
+    assert cache.get("promises:all") == "v1"
+    release.set()
+    assert _wait_until(lambda: cache.get("promises:all") == "v2")
+    assert len(calls) == 2
+
+    # Sin forma de recalcularla, una entrada obsoleta es un fallo
+    cache.set("verse:Juan:3:16", "texto", ttl=0, stale_ttl=60)
+    assert cache.get("verse:Juan:3:16") is None
+
+    # La entrada viaja por Redis con sus vencimientos
+    cache.redis = fakeredis.FakeRedis()
+    cache.set("chapter:Juan:3", {'success': True}, ttl=60, stale_ttl=60)
+    cache.local_cache.clear()
+    assert cache.get("chapter:Juan:3") == {'success': True}
+
+def test_cached_keys_are_stable_across_processes():
+    import os
+    import subprocess
+    import sys
+    from cache_keys import function_cache_key
+
+    def search(query, limit=5, filters=None):
+        return query
+
+    key = function_cache_key(search, ("amor",), {'limit': 3, 'filters': {'b': 1, 'a': {2, 1}}})
+    script = ("import sys; sys.path.insert(0, '.');"
+              "from cache_keys import function_cache_key\n"
+              "def search(query, limit=5, filters=None): pass\n"
+              f"search.__module__ = {search.__module__!r}\n"
+              f"search.__qualname__ = {search.__qualname__!r}\n"
+              "print(function_cache_key(search, ('amor',), {'filters': {'a': {1, 2}, 'b': 1}, 'limit': 3}))")
+    for seed in ("1", "2"):
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                env={**os.environ, 'PYTHONHASHSEED': seed}, check=True).stdout
+        assert output.strip() == key
+
+def test_cached_skips_self_and_unserializable_results():
+    cache = CacheManager()
+    calls = []
+
+    class Searcher:
+        @cache.cached(ttl=60)
+        def search(self, query):
+            calls.append(query)
+            return [{'reference': 'Juan 3:16'}]
+
+        @cache.cached(ttl=60)
+        def raw(self, query):
+            calls.append(query)
+            return object()
+
+    Searcher().search("amor")
+    Searcher().search("amor")  # Otra instancia, misma clave
+    Searcher().raw("fe")
+    Searcher().raw("fe")  # No serializable: no se cachea
+    assert calls == ["amor", "fe", "fe"]
+
+def test_async_api_shares_l1_codec_and_keys_with_sync_api():
+    import asyncio
+    import fakeredis
+
+    server = fakeredis.FakeServer()
+    cache = CacheManager()
+    cache.redis = fakeredis.FakeRedis(server=server)
+    cache.backend, cache.redis_url = 'redis', 'redis://localhost:6379/0'
+
+    async def run():
+        cache._async_clients[asyncio.get_running_loop()] = fakeredis.FakeAsyncRedis(server=server)
+        cache.set("search:amor:5", [{'reference': 'Juan 3:16'}], tags=["dataset:bible"])
+        cache.local_cache.clear()
+        assert await cache.aget("search:amor:5", tags=["dataset:bible"]) == [{'reference': 'Juan 3:16'}]
+
+        await cache.aset("search:fe:5", ["Hebreos 11:1"], tags=["dataset:bible"])
+        cache.local_cache.clear()
+        assert cache.get("search:fe:5", tags=["dataset:bible"]) == ["Hebreos 11:1"]
+        cache.invalidate(tag="dataset:bible")
+        assert await cache.aget_many(["search:amor:5", "search:fe:5"], tags=["dataset:bible"]) == {}
+        await cache.aclose()
+
+    asyncio.run(run())
+    assert cache.get("search:fe:5") is None
@@ -0,0 +1,55 @@
+
+import json
+from flask import Flask
+from access_recorder import AccessRecorder, load_hot_keys
+from cache_manager import cache_manager
+from cache_warmer import CacheWarmer
+
+def test_access_recorder_keeps_most_frequent_keys(tmp_path):
+    recorder = AccessRecorder(top_k=3)
+    for i in range(200):
+        recorder.record(f"verse:Juan:1:{i}")
+        recorder.record("chapter:Juan:3")
+        if i % 2:
+            recorder.record("chapter:Salmos:23")
+
+    top = [key for key, _ in recorder.top(2)]
+    assert top == ["chapter:Juan:3", "chapter:Salmos:23"]
+
+    path = tmp_path / "hot.json"
+    path.write_text(json.dumps({'keys': [["books:sorted", 1000]]}))
+    recorder.save(str(path))
+    saved = dict(load_hot_keys(str(path)))
+    assert saved["books:sorted"] == 1000
+    assert saved["chapter:Juan:3"] >= 200
+
+def test_access_recorder_never_persists_search_queries(tmp_path):
+    recorder = AccessRecorder(top_k=5)
+    for _ in range(10):
+        recorder.record("search:mi consulta privada:5")
+        recorder.record("chapter:Juan:3")
+    assert [key for key, _ in recorder.top()] == ["chapter:Juan:3"]
+
+    path = tmp_path / "hot.json"
+    path.write_text(json.dumps({'keys': [["search:consulta antigua:10", 99], ["verse:Juan:3:16", 5]]}))
+    recorder.save(str(path))
+    assert [key for key, _ in load_hot_keys(str(path))] == ["chapter:Juan:3", "verse:Juan:3:16"]
+    assert "search" not in CacheWarmer(path=str(path)).handlers
+
+def test_cache_warmer_preloads_hot_keys_without_recording_them(tmp_path):
+    path = tmp_path / "hot.json"
+    path.write_text(json.dumps({'keys': [["chapter:Juan:3", 50], ["desconocido:x", 10]]}))
+    warmer = CacheWarmer(path=str(path), concurrency=2)
+    warmed = []
+    warmer.handlers = {'chapter': warmed.append, 'promises': warmed.append}
+
+    before = dict(cache_manager.access.top()) if cache_manager.access else {}
+    stats = warmer.warm(Flask(__name__))
+
+    # Primero las claves guardadas; después las predeterminadas con manejador
+    assert warmer.hot_keys()[:2] == ["chapter:Juan:3", "promises:all"]
+    assert "desconocido:x" not in warmed and "books:sorted" not in warmed
+    assert set(warmer.hot_keys()) == set(warmed)
+    assert stats['warmed'] == len(warmed) and stats['pending'] == 0
+    if cache_manager.access:
+        assert dict(cache_manager.access.top()) == before
@@ -0,0 +1,49 @@
+
+import os
+import pickle
+import pytest
+from Nevin_AI.chunk_store import ChunkStore, convert_pickles, load_pickled_chunks
+
+class Document:
+    def __init__(self, page_content):
+        self.page_content = page_content
+        self.metadata = {'page': 0}
+
+    def __getstate__(self):
+        return {'__dict__': dict(self.__dict__), '__pydantic_fields_set__': {'page_content'}}
+
+class InMemoryDocstore:
+    def __init__(self, documents):
+        self._dict = documents
+
+@pytest.fixture
+def langchain_pickle(tmp_path):
+    docstore = InMemoryDocstore({'a': Document('Primer chunk'), 'b': Document('Segundo chunk, señor')})
+    data = pickle.dumps((docstore, {0: 'a', 2: 'b'}), protocol=2)
+    # Mismas referencias de clase que los .pkl generados con LangChain
+    data = data.replace(f"{__name__}\nInMemoryDocstore".encode(),
+                        b"langchain_community.docstore.in_memory\nInMemoryDocstore")
+    data = data.replace(f"{__name__}\nDocument".encode(), b"langchain_core.documents.base\nDocument")
+    path = tmp_path / 'El Camino a Cristo.pkl'
+    path.write_bytes(data)
+    return path
+
+def test_chunk_store_roundtrip(tmp_path):
+    ChunkStore.write(tmp_path / 'chunks.bin', ['uno', None, 'añadió más', ''])
+    store = ChunkStore(tmp_path / 'chunks.bin')
+    assert len(store) == 4
+    assert [store.get(i) for i in range(5)] == ['uno', None, 'añadió más', None, None]
+    assert bytes(store.get_bytes(2)) == 'añadió más'.encode('utf-8')
+
+def test_convert_langchain_pickles_without_langchain(langchain_pickle, tmp_path):
+    books = [{'source': 'egw', 'book': 'El Camino a Cristo', 'start': 0, 'count': 3}]
+    stats = convert_pickles(books, {'egw': str(tmp_path)}, tmp_path / 'chunks.bin')
+    assert stats == {'chunks': 3, 'missing': 1, 'books_without_data': 0}
+    store = ChunkStore(tmp_path / 'chunks.bin')
+    assert [store.get(i) for i in range(3)] == ['Primer chunk', None, 'Segundo chunk, señor']
+
+def test_restricted_unpickler_rejects_other_globals(tmp_path):
+    path = tmp_path / 'malicioso.pkl'
+    path.write_bytes(pickle.dumps(os.getcwd))
+    with pytest.raises(pickle.UnpicklingError):
+        load_pickled_chunks(str(path))
@@ -0,0 +1,53 @@
+
+import faiss
+import numpy as np
+import pytest
+from Nevin_AI.chunk_store import ChunkStore
+from Nevin_AI.embedding_providers import HashingEmbeddingProvider, provider_from_env
+from Nevin_AI.knowledge_base_manager import KnowledgeBaseManager
+from Nevin_AI.knowledge_index import KnowledgeIndex
+
+TEXTS = ['La gracia de Dios salva al pecador', 'El sábado es el día de reposo', 'Cristo vendrá otra vez']
+
+def test_hashing_provider_is_deterministic_and_normalized():
+    vectors = HashingEmbeddingProvider().embed(TEXTS)
+    assert vectors.shape == (3, 1536) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert (vectors == HashingEmbeddingProvider().embed(TEXTS)).all()
+    assert not (vectors == HashingEmbeddingProvider(seed=1).embed(TEXTS)).all()
+    assert provider_from_env('hashing').model == 'hashing-1536-0'
+    with pytest.raises(ValueError):
+        provider_from_env('desconocido')
+
+@pytest.fixture
+def offline_manager(tmp_path):
+    provider = HashingEmbeddingProvider(dimension=64)
+    for path in ('egw', 'other'):
+        (tmp_path / path).mkdir()
+    index_dir = tmp_path / 'index'
+    book = faiss.IndexFlatL2(64)
+    book.add(provider.embed(TEXTS))
+    faiss.write_index(book, str(tmp_path / 'egw' / 'Mensajes Selectos.faiss'))
+    KnowledgeIndex.build({'egw': str(tmp_path / 'egw'), 'other': str(tmp_path / 'other')}).save(index_dir)
+    ChunkStore.write(index_dir / 'chunks.bin', TEXTS)
+
+    manager = KnowledgeBaseManager(index_dir=str(index_dir), embedding_store_path=str(tmp_path / 'e.sqlite3'),
+                                   embedding_provider=provider)
+    assert manager.initialize()
+    return manager
+
+def test_knowledge_base_search_offline(offline_manager):
+    manager = offline_manager
+    results = manager.search_batch(['¿Cuál es el día de reposo?', 'la gracia de Dios'], top_k=1)
+    assert [hits[0]['content'] for hits in results] == [TEXTS[1], TEXTS[0]]
+    assert manager.embedding_store.info()['models'][manager.embedder.model]['entries'] == 2
+    assert manager.search_knowledge_base('la gracia de Dios', filters={'book': 'Mensajes Selectos'})
+    assert manager.search_knowledge_base('la gracia de Dios', filters={'source': 'other'}) == []
+
+def test_search_batch_matches_per_query_search(offline_manager):
+    queries = ['la gracia de Dios', '', '¿Cuál es el día de reposo?', 'la gracia de Dios', 'Cristo vendrá']
+    batch = offline_manager.search_batch(queries, top_k=2)
+    assert len(batch) == len(queries)
+    assert batch == [offline_manager.search_knowledge_base(query, top_k=2) for query in queries]
+    assert batch[0] == batch[3]
+    assert offline_manager.search_batch([]) == []
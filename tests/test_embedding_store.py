@@ -0,0 +1,20 @@
+
+import numpy as np
+from Nevin_AI.embedding_store import EmbeddingStore
+
+def test_store_roundtrip_in_float16(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    vectors = np.random.default_rng(1).standard_normal((2, 8)).astype('float32') / 8
+    assert store.put_many("modelo", ["¿Quién es Jesús?", "Juan 3:16"], vectors) == 2
+
+    found = store.get_many("modelo", ["Juan 3:16", "otro", "¿Quién es Jesús?"])
+    assert found[1] is None
+    assert found[0].dtype == np.float32
+    assert np.allclose(found[0], vectors[1], atol=1e-3) and np.allclose(found[2], vectors[0], atol=1e-3)
+    assert store.get_many("otro-modelo", ["Juan 3:16"]) == [None]
+    assert store.info()['models']['modelo'] == {'entries': 2, 'bytes': 2 * 8 * 2}
+
+def test_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingStore(path).put_many("modelo", ["gracia"], np.ones((1, 4)))
+    assert EmbeddingStore(path).get_many("modelo", ["gracia"])[0].tolist() == [1.0] * 4
@@ -83,3 +83,9 @@ def test_user_settings(client, auth_headers):
                           json={'theme': 'dark'},
                           headers=auth_headers)
     assert response.status_code == 200
+
+def test_topic_api_rejects_invalid_limit(client):
+    for limit in ('0', '-1', 'abc'):
+        response = client.get(f'/api/topics/fe?limit={limit}')
+        assert response.status_code == 400
+        assert 'limit' in response.get_json()['error']
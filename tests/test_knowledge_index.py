@@ -0,0 +1,196 @@
+
+import threading
+import time
+import faiss
+import numpy as np
+import pytest
+from Nevin_AI.knowledge_index import KnowledgeIndex
+
+DIM = 16
+BOOKS = {'egw': {'El Camino a Cristo': 30, 'El Deseado de Todas las Gentes': 50},
+         'other': {'BTAMS-Tomo1': 20}}
+
+@pytest.fixture
+def sources(tmp_path):
+    rng = np.random.default_rng(3)
+    dirs = {}
+    for source, books in BOOKS.items():
+        directory = tmp_path / source
+        directory.mkdir()
+        for book, count in books.items():
+            index = faiss.IndexFlatL2(DIM)
+            index.add(rng.standard_normal((count, DIM)).astype('float32'))
+            faiss.write_index(index, str(directory / f"{book}.faiss"))
+        dirs[source] = str(directory)
+    return dirs
+
+def _per_book_top_k(sources, query, k):
+    hits = []
+    for source, directory in sources.items():
+        for book in BOOKS[source]:
+            index = faiss.read_index(f"{directory}/{book}.faiss")
+            D, I = index.search(query, k)
+            hits.extend((float(d), (source, book, int(i))) for d, i in zip(D[0], I[0]))
+    return [ref for _, ref in sorted(hits, key=lambda hit: hit[0])[:k]]
+
+@pytest.mark.parametrize('shard_by', ['none', 'source'])
+def test_merged_index_matches_per_book_search(sources, tmp_path, shard_by):
+    KnowledgeIndex.build(sources, shard_by=shard_by).save(tmp_path / 'merged')
+    index = KnowledgeIndex.load(tmp_path / 'merged')
+    assert index.ntotal == 100
+    assert len(index.shards) == (2 if shard_by == 'source' else 1)
+
+    query = np.random.default_rng(5).standard_normal((1, DIM)).astype('float32')
+    D, I = index.search(query, 8)
+    assert index.locate(I[0]) == _per_book_top_k(sources, query, 8)
+    assert list(D[0]) == sorted(D[0])
+
+def test_locate_uses_contiguous_book_ranges(sources):
+    index = KnowledgeIndex.build(sources)
+    assert index.locate([0, 29, 30, 80, 99, -1, 100]) == [
+        ('egw', 'El Camino a Cristo', 0),
+        ('egw', 'El Camino a Cristo', 29),
+        ('egw', 'El Deseado de Todas las Gentes', 0),
+        ('other', 'BTAMS-Tomo1', 0),
+        ('other', 'BTAMS-Tomo1', 19),
+        None,
+        None,
+    ]
+
+@pytest.mark.parametrize('index_type, params', [('ivf', {'nprobe': 4}), ('hnsw', {'ef_search': 100})])
+def test_approximate_index_with_exhaustive_parameters_matches_flat(sources, tmp_path, index_type, params):
+    KnowledgeIndex.build(sources, index_type=index_type, nlist=4).save(tmp_path / index_type)
+    index = KnowledgeIndex.load(tmp_path / index_type)
+    assert index.index_type == index_type
+
+    queries = np.random.default_rng(9).standard_normal((5, DIM)).astype('float32')
+    _, expected = KnowledgeIndex.build(sources).search(queries, 5)
+    _, found = index.search(queries, 5, **params)
+    assert (found == expected).all()
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf', 'hnsw', 'sq8', 'ivfpq'])
+def test_mmap_load_matches_in_memory_load(sources, tmp_path, index_type):
+    KnowledgeIndex.build(sources, index_type=index_type, nlist=4, pq_m=4).save(tmp_path)
+    queries = np.random.default_rng(2).standard_normal((3, DIM)).astype('float32')
+    in_memory = KnowledgeIndex.load(tmp_path, mmap=False).search(queries, 5)
+    mapped = KnowledgeIndex.load(tmp_path, mmap=True).search(queries, 5)
+    assert (mapped[1] == in_memory[1]).all()
+
+def test_quantized_index_reranks_with_float16_copy(sources, tmp_path):
+    KnowledgeIndex.build(sources, index_type='ivfpq', nlist=4, pq_m=4, rerank_copy=True).save(tmp_path)
+    index = KnowledgeIndex.load(tmp_path)
+    assert index.rerank_vectors.dtype == np.float16
+
+    queries = np.random.default_rng(4).standard_normal((5, DIM)).astype('float32')
+    expected_D, expected = KnowledgeIndex.build(sources).search(queries, 5)
+    # Con todas las listas y todos los vectores como candidatos el reordenado es exacto
+    D, I = index.search(queries, 5, nprobe=4, rerank=20)
+    assert (I == expected).all()
+    assert np.allclose(D, expected_D, rtol=1e-2)
+
+def test_shard_search_deadline_skips_slow_shard(sources):
+    index = KnowledgeIndex.build(sources, shard_by='source')
+    egw_count = index.shard_info[1]['start']
+    slow = index.shards[1]
+
+    class SlowShard:
+        ntotal = slow.ntotal
+        def search(self, *args, **kwargs):
+            time.sleep(0.5)
+            return slow.search(*args, **kwargs)
+
+    index.shards[1] = SlowShard()
+    queries = np.random.default_rng(6).standard_normal((3, DIM)).astype('float32')
+    _, I = index.search(queries, 5, timeout=0.05)
+    assert ((I >= 0) & (I < egw_count)).all()
+    assert index.skipped_shard_searches == 1
+
+def test_skipped_shards_are_reported_per_search(sources):
+    index = KnowledgeIndex.build(sources, shard_by='source')
+    slow = index.shards[1]
+
+    class SlowShard:
+        ntotal = slow.ntotal
+        def search(self, *args, **kwargs):
+            time.sleep(0.3)
+            return slow.search(*args, **kwargs)
+
+    index.shards[1] = SlowShard()
+    queries = np.random.default_rng(6).standard_normal((2, DIM)).astype('float32')
+    results = {}
+    threads = [threading.Thread(target=lambda name=name, timeout=timeout:
+                                results.__setitem__(name, index.search_with_skipped(queries, 5, timeout=timeout)))
+               for name, timeout in (('partial', 0.05), ('complete', None))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results['partial'][2] == 1
+    assert results['complete'][2] == 0
+    assert index.skipped_shard_searches == 1
+
+@pytest.mark.parametrize('shard_by', ['none', 'source'])
+@pytest.mark.parametrize('filters, allowed', [
+    ({'book': 'El Deseado de Todas las Gentes'}, range(30, 80)),
+    ({'book': ['El Camino a Cristo', 'BTAMS-Tomo1']}, [*range(0, 30), *range(80, 100)]),
+    ({'source': 'other', 'language': 'es'}, range(80, 100)),
+    ({'language': 'en'}, []),
+])
+def test_filtered_search_matches_exact_search_over_allowed_ids(sources, shard_by, filters, allowed):
+    index = KnowledgeIndex.build(sources, shard_by=shard_by)
+    vectors = KnowledgeIndex.build(sources).shards[0].reconstruct_n(0, 100)
+    queries = np.random.default_rng(8).standard_normal((4, DIM)).astype('float32')
+    _, I = index.search(queries, 5, filters=filters)
+
+    allowed = np.array(allowed, dtype='int64')
+    expected = np.full((4, 5), -1)
+    if len(allowed):
+        distances = ((vectors[allowed][None, :, :] - queries[:, None, :]) ** 2).sum(axis=2)
+        expected = allowed[np.argsort(distances, axis=1, kind='stable')[:, :5]]
+    assert (I == expected).all()
+
+@pytest.mark.parametrize('index_type, params', [('ivf', {'nprobe': 4}), ('hnsw', {'ef_search': 100}),
+                                                ('ivfpq', {'nprobe': 4, 'rerank': 20})])
+@pytest.mark.parametrize('filters', [{'source': 'egw'}, {'book': 'BTAMS-Tomo1'}])
+def test_filtered_approximate_search_after_mmap_load(sources, tmp_path, index_type, params, filters):
+    rerank_copy = index_type == 'ivfpq'
+    KnowledgeIndex.build(sources, index_type=index_type, nlist=4, pq_m=4, rerank_copy=rerank_copy).save(tmp_path)
+    index = KnowledgeIndex.load(tmp_path, mmap=True)
+    queries = np.random.default_rng(5).standard_normal((3, DIM)).astype('float32')
+    _, expected = KnowledgeIndex.build(sources).search(queries, 5, filters=filters)
+    _, found = index.search(queries, 5, filters=filters, **params)
+    assert (found == expected).all()
+
+def test_index_build_invalidates_cached_searches_in_other_workers(sources, tmp_path, monkeypatch):
+    from cache_manager import CacheManager
+    from Nevin_AI import knowledge_index
+    path = str(tmp_path / 'l2.sqlite3')
+    worker, cli = CacheManager(prefix='t'), CacheManager(prefix='t')
+    worker.init_sqlite(path)
+    tags = [knowledge_index.KNOWLEDGE_BASE_TAG]
+    worker.set('retrieval:abc', [{'content': 'anterior'}], tags=tags)
+
+    monkeypatch.setattr('cache_manager.cache_manager', cli)
+    monkeypatch.setenv('CACHE_BACKEND', 'sqlite')
+    monkeypatch.setenv('CACHE_SQLITE_PATH', path)
+    monkeypatch.setattr('sys.argv', ['knowledge_index', '--output', str(tmp_path / 'out'), '--no-chunks',
+                                     '--egw-dir', sources['egw'], '--other-dir', sources['other']])
+    try:
+        knowledge_index.main()
+        assert KnowledgeIndex.load(tmp_path / 'out').ntotal == 100
+        assert cli.backend == 'sqlite'
+        deadline = time.monotonic() + 3
+        while worker.get('retrieval:abc', tags=tags) is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert worker.get('retrieval:abc', tags=tags) is None
+    finally:
+        worker.stop_invalidation_listener()
+        cli.stop_invalidation_listener()
+
+def test_index_build_warns_without_shared_cache(monkeypatch, caplog):
+    from cache_manager import CacheManager
+    from Nevin_AI import knowledge_index
+    monkeypatch.setattr('cache_manager.cache_manager', CacheManager(prefix='t'))
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+    assert knowledge_index._invalidate_search_cache() is False
+    assert 'Sin caché L2' in caplog.text
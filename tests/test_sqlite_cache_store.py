@@ -0,0 +1,54 @@
+
+import time
+from cache_manager import CacheManager
+from sqlite_cache_store import RELEASE_LOCK_SCRIPT, SQLiteCacheStore
+
+def test_store_redis_subset(tmp_path):
+    store = SQLiteCacheStore(str(tmp_path / "l2.sqlite3"))
+    store.setex("a", 60, b"1")
+    store.setex("b", 0.05, "x")
+    assert store.set("lock", "t1", nx=True, px=1000)
+    assert store.set("lock", "t2", nx=True, px=1000) is None
+    time.sleep(0.06)
+    assert store.mget(["a", "b", "c"]) == [b"1", None, None]
+    assert store.incr("gen") == 1 and store.incr("gen") == 2
+    assert store.eval(RELEASE_LOCK_SCRIPT, 1, "lock", "otro") == 0
+    assert store.eval(RELEASE_LOCK_SCRIPT, 1, "lock", "t1") == 1
+    assert store.exists("lock") == 0
+
+    pipeline = store.pipeline(transaction=False)
+    pipeline.setex("p1", 60, b"x")
+    pipeline.setex("p2", 60, b"y")
+    pipeline.execute()
+    assert store.mget(["p1", "p2"]) == [b"x", b"y"]
+
+def test_store_evicts_least_recently_used(tmp_path):
+    store = SQLiteCacheStore(str(tmp_path / "l2.sqlite3"), max_bytes=10_000, touch_interval=0)
+    for i in range(10):
+        store.setex(f"k{i}", 60, b"x" * 1000)
+        time.sleep(0.002)
+    store.get("k0")  # Acceso reciente: sobrevive al desalojo
+    store.setex("k10", 60, b"x" * 1000)
+    store.prune()
+    assert store.info()['bytes'] <= 10_000
+    assert store.get("k0") is not None and store.get("k1") is None
+
+def test_workers_share_values_and_invalidations(tmp_path):
+    path = str(tmp_path / "l2.sqlite3")
+    writer, reader = CacheManager(prefix="t"), CacheManager(prefix="t")
+    writer.init_sqlite(path)
+    reader.init_sqlite(path)
+    try:
+        writer.set("chapter:Juan:3", {'success': True}, tags=["book:Juan"])
+        assert reader.get("chapter:Juan:3", tags=["book:Juan"]) == {'success': True}
+        assert reader.local_cache.currsize > 0
+
+        writer.invalidate(tag="book:Juan")
+        deadline = time.monotonic() + 3
+        while reader.get("chapter:Juan:3", tags=["book:Juan"]) is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert reader.get("chapter:Juan:3", tags=["book:Juan"]) is None
+        assert reader.health()['l2_backend'] == 'sqlite'
+    finally:
+        writer.stop_invalidation_listener()
+        reader.stop_invalidation_listener()
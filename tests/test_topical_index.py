@@ -0,0 +1,67 @@
+
+import pytest
+from bible_books import encode_verse_key, decode_verse_key
+from topical_index import TopicalIndex, expand_topic
+
+VERSES = [
+    ("Juan", 3, 16, "Porque de tal manera amó Dios al mundo"),
+    ("Hebreos", 11, 1, "Es, pues, la fe la certeza de lo que se espera"),
+    ("Romanos", 5, 1, "Justificados, pues, por la fe, tenemos paz para con Dios"),
+    ("Éxodo", 20, 8, "Acuérdate del día de reposo para santificarlo"),
+]
+
+CHUNKS = [
+    ("egw", "El Camino a Cristo", 0, "La oración es el acto de abrir nuestro corazón a Dios"),
+    ("egw", "El Camino a Cristo", 1, "La fe es confiar en Dios, creer que nos ama"),
+    ("other", "BTAMS-Tomo1", 4, "El sábado es el día de reposo del séptimo día"),
+]
+
+@pytest.fixture
+def index():
+    return TopicalIndex.build(VERSES, CHUNKS, max_verses=5, max_chunks=5)
+
+def test_verse_key_roundtrip():
+    key = encode_verse_key("Juan", 3, 16)
+    assert decode_verse_key(key) == ("Juan", 3, 16)
+    with pytest.raises(ValueError):
+        encode_verse_key("Libro Inexistente", 1, 1)
+
+def test_lookup_ranks_verses_and_writings(index):
+    result = index.lookup("fe")
+    references = [v['reference'] for v in result['verses']]
+    assert set(references) == {"Hebreos 11:1", "Romanos 5:1"}
+    assert result['writings'][0]['book'] == "El Camino a Cristo"
+    assert result['writings'][0]['chunk'] == 1
+
+def test_lookup_is_accent_insensitive(index):
+    result = index.lookup("Sabado")
+    assert result['topic'] == "sábado"
+    assert result['verses'][0]['reference'] == "Éxodo 20:8"
+    assert result['writings'][0]['source'] == "other"
+    assert index.lookup("tema desconocido") is None
+
+def test_match_prefers_longest_topic(index):
+    assert index.match("¿Qué dice la Biblia sobre el Espíritu Santo?") == "espíritu santo"
+    assert index.match("Háblame de la oración") == "oración"
+    assert index.match("Hola") is None
+
+def test_save_and_load(index, tmp_path):
+    path = tmp_path / "topics.npz"
+    index.save(str(path))
+    loaded = TopicalIndex.load(str(path))
+    assert loaded.lookup("oración") == index.lookup("oración")
+
+def test_expand_topic():
+    assert expand_topic("Oración").startswith("oración")
+    assert expand_topic("gracia") == "gracia"
+
+def test_match_requires_whole_words(index):
+    assert index.match("¿Qué pasó en esa fecha? Tomé café") is None
+    assert index.match("Un hombre de fe") == "fe"
+    assert index.match("Espíritu y santidad") is None
+
+def test_lookup_rejects_non_positive_limits(index):
+    with pytest.raises(ValueError):
+        index.lookup("fe", max_verses=0)
+    with pytest.raises(ValueError):
+        index.lookup("fe", max_chunks=-1)
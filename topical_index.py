@@ -0,0 +1,351 @@
+"""
+TopicalIndex - Índice temático precalculado que enlaza temas con versículos y chunks de la base de conocimientos
+"""
+import heapq
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+from math import log
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from bible_books import decode_verse_key, encode_verse_key, format_verse_key
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.environ.get("TOPICAL_INDEX_PATH", "instance/topical_index.npz")
+
+# Vocabulario curado: el primer término es el tema en sí y pesa el doble al puntuar.
+TOPIC_VOCABULARY: Dict[str, List[str]] = {
+    'fe': ['fe', 'creencia', 'confianza', 'creer'],
+    'oración': ['oración', 'orar', 'comunicación', 'petición', 'ruego'],
+    'segundo advenimiento': ['venida', 'segunda', 'regreso', 'advenimiento', 'nubes'],
+    'sábado': ['sábado', 'reposo', 'séptimo', 'mandamiento'],
+    'salvación': ['salvación', 'redención', 'justificación', 'salvo', 'redimidos'],
+    'muerte': ['muerte', 'muertos', 'resurrección', 'sepulcro', 'duermen'],
+    'profecía': ['profecía', 'profeta', 'visión', 'tiempo', 'fin'],
+    'amor': ['amor', 'amar', 'misericordia', 'bondad'],
+    'esperanza': ['esperanza', 'esperar', 'promesa', 'consuelo'],
+    'perdón': ['perdón', 'perdonar', 'pecado', 'arrepentimiento'],
+    'santuario': ['santuario', 'tabernáculo', 'sacerdote', 'expiación'],
+    'bautismo': ['bautismo', 'bautizar', 'bautizado', 'agua'],
+    'espíritu santo': ['espíritu', 'santo', 'consolador', 'poder'],
+    'juicio': ['juicio', 'juzgar', 'tribunal', 'justicia'],
+    'ley': ['ley', 'mandamientos', 'estatutos', 'obediencia'],
+    'salud': ['salud', 'sanar', 'cuerpo', 'templo', 'alimento'],
+}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Pasa a minúsculas y elimina acentos para comparar términos."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+_NORMALIZED_TOPICS = {normalize_text(topic): topic for topic in TOPIC_VOCABULARY}
+
+
+def expand_topic(topic: str) -> str:
+    """Devuelve la consulta expandida de un tema del vocabulario (o el tema tal cual)."""
+    known_topic = _NORMALIZED_TOPICS.get(normalize_text(topic.strip()))
+    return ' '.join(TOPIC_VOCABULARY[known_topic]) if known_topic else topic
+
+
+def _score_tokens(tokens: Counter, length: int, weights: Dict[str, float]) -> float:
+    """Puntúa un documento por frecuencia ponderada de términos normalizada por longitud."""
+    score = sum(tokens[term] * weight for term, weight in weights.items() if term in tokens)
+    return score / (1.0 + log(1 + length)) if score else 0.0
+
+
+class _TopKCollector:
+    """Mantiene los k documentos mejor puntuados por tema usando min-heaps."""
+
+    def __init__(self, topics: List[str], k: int):
+        self.k = k
+        self.heaps: Dict[str, List[Tuple[float, int, Any]]] = {t: [] for t in topics}
+        self._seq = 0
+
+    def offer(self, topic: str, score: float, item: Any):
+        heap = self.heaps[topic]
+        self._seq += 1
+        entry = (score, -self._seq, item)
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def ranked(self, topic: str) -> List[Tuple[float, Any]]:
+        return [(score, item) for score, _, item in sorted(self.heaps[topic], reverse=True)]
+
+
+class TopicalIndex:
+    """
+    Índice temático almacenado como arreglos compactos (formato CSR).
+
+    Cada tema apunta a un rango de versículos (claves int32 de bible_books) y a un rango
+    de chunks de la base de conocimientos. El texto de los chunks referenciados se guarda
+    en un único blob UTF-8 para que Nevin pueda usarlos sin búsqueda en vivo.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.topics: List[str] = [str(t) for t in arrays['topics']]
+        self.verse_offsets = arrays['verse_offsets']
+        self.verse_keys = arrays['verse_keys']
+        self.verse_scores = arrays['verse_scores']
+        self.chunk_offsets = arrays['chunk_offsets']
+        self.chunk_refs = arrays['chunk_refs']
+        self.chunk_scores = arrays['chunk_scores']
+        self.chunk_books: List[str] = [str(b) for b in arrays['chunk_books']]
+        self.chunk_book_ids = arrays['chunk_book_ids']
+        self.chunk_ids = arrays['chunk_ids']
+        self.chunk_text_offsets = arrays['chunk_text_offsets']
+        self.chunk_text_blob = arrays['chunk_text_blob']
+        self._topic_positions = {normalize_text(t): i for i, t in enumerate(self.topics)}
+        # Temas como secuencias de palabras completas ("fe" no coincide con "fecha" ni "café")
+        self._topic_tokens = {t: tuple(_TOKEN_RE.findall(t)) for t in self._topic_positions}
+        # Temas más largos primero para que "segundo advenimiento" gane sobre términos sueltos
+        self._match_order = sorted(self._topic_positions,
+                                   key=lambda t: (len(self._topic_tokens[t]), len(t)), reverse=True)
+
+    @classmethod
+    def build(cls,
+              verses: Iterable[Tuple[str, int, int, str]],
+              chunks: Iterable[Tuple[str, str, int, str]],
+              vocabulary: Optional[Dict[str, List[str]]] = None,
+              max_verses: int = 50,
+              max_chunks: int = 20) -> 'TopicalIndex':
+        """
+        Construye el índice a partir de los versículos y chunks disponibles.
+
+        Args:
+            verses: Tuplas (libro, capítulo, versículo, texto en español)
+            chunks: Tuplas (source, libro, posición en el índice FAISS, texto)
+            vocabulary: Tema -> términos; por defecto TOPIC_VOCABULARY
+            max_verses: Versículos a conservar por tema
+            max_chunks: Chunks a conservar por tema
+        """
+        vocabulary = vocabulary or TOPIC_VOCABULARY
+        topics = list(vocabulary)
+        weights = {
+            topic: {normalize_text(term): (2.0 if i == 0 else 1.0)
+                    for i, term in enumerate(terms)}
+            for topic, terms in vocabulary.items()
+        }
+
+        def collect(documents, k, key_fn):
+            collector = _TopKCollector(topics, k)
+            for document in documents:
+                tokens = _TOKEN_RE.findall(normalize_text(document[-1]))
+                if not tokens:
+                    continue
+                counts = Counter(tokens)
+                item = key_fn(document)
+                if item is None:
+                    continue
+                for topic in topics:
+                    score = _score_tokens(counts, len(tokens), weights[topic])
+                    if score > 0:
+                        collector.offer(topic, score, item)
+            return collector
+
+        def verse_item(verse):
+            book, chapter, number, _ = verse
+            try:
+                return encode_verse_key(book, chapter, number)
+            except ValueError:
+                return None
+
+        verse_hits = collect(verses, max_verses, verse_item)
+        chunk_hits = collect(chunks, max_chunks,
+                             lambda c: (f"{c[0]}/{c[1]}", int(c[2]), c[3]))
+
+        verse_offsets, verse_keys, verse_scores = [0], [], []
+        chunk_offsets, chunk_refs, chunk_scores = [0], [], []
+        unique_chunks: Dict[Tuple[str, int], int] = {}
+        chunk_books: Dict[str, int] = {}
+        chunk_book_ids, chunk_ids, texts = [], [], []
+
+        for topic in topics:
+            for score, key in verse_hits.ranked(topic):
+                verse_keys.append(key)
+                verse_scores.append(score)
+            verse_offsets.append(len(verse_keys))
+
+            for score, (book, idx, content) in chunk_hits.ranked(topic):
+                ref = unique_chunks.get((book, idx))
+                if ref is None:
+                    ref = unique_chunks[(book, idx)] = len(chunk_ids)
+                    chunk_book_ids.append(chunk_books.setdefault(book, len(chunk_books)))
+                    chunk_ids.append(idx)
+                    texts.append(content.encode('utf-8'))
+                chunk_refs.append(ref)
+                chunk_scores.append(score)
+            chunk_offsets.append(len(chunk_refs))
+
+        text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        if texts:
+            text_offsets[1:] = np.cumsum([len(t) for t in texts])
+
+        return cls({
+            'topics': np.array(topics, dtype=str),
+            'verse_offsets': np.array(verse_offsets, dtype=np.int32),
+            'verse_keys': np.array(verse_keys, dtype=np.int32),
+            'verse_scores': np.array(verse_scores, dtype=np.float16),
+            'chunk_offsets': np.array(chunk_offsets, dtype=np.int32),
+            'chunk_refs': np.array(chunk_refs, dtype=np.int32),
+            'chunk_scores': np.array(chunk_scores, dtype=np.float16),
+            'chunk_books': np.array(list(chunk_books), dtype=str),
+            'chunk_book_ids': np.array(chunk_book_ids, dtype=np.int16),
+            'chunk_ids': np.array(chunk_ids, dtype=np.int32),
+            'chunk_text_offsets': text_offsets,
+            'chunk_text_blob': np.frombuffer(b''.join(texts), dtype=np.uint8),
+        })
+
+    def save(self, path: str = DEFAULT_INDEX_PATH):
+        """Guarda el índice en un archivo .npz sin pickle."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            path,
+            topics=np.array(self.topics, dtype=str),
+            verse_offsets=self.verse_offsets,
+            verse_keys=self.verse_keys,
+            verse_scores=self.verse_scores,
+            chunk_offsets=self.chunk_offsets,
+            chunk_refs=self.chunk_refs,
+            chunk_scores=self.chunk_scores,
+            chunk_books=np.array(self.chunk_books, dtype=str),
+            chunk_book_ids=self.chunk_book_ids,
+            chunk_ids=self.chunk_ids,
+            chunk_text_offsets=self.chunk_text_offsets,
+            chunk_text_blob=self.chunk_text_blob,
+        )
+        logger.info(f"Índice temático guardado en {path}: {len(self.topics)} temas")
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> 'TopicalIndex':
+        """Carga un índice guardado con save()."""
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in arrays.files})
+
+    def match(self, text: str) -> Optional[str]:
+        """Devuelve el primer tema del vocabulario mencionado en el texto (palabras completas), si existe."""
+        tokens = tuple(_TOKEN_RE.findall(normalize_text(text)))
+        for topic in self._match_order:
+            topic_tokens = self._topic_tokens[topic]
+            size = len(topic_tokens)
+            if size and any(tokens[i:i + size] == topic_tokens for i in range(len(tokens) - size + 1)):
+                return self.topics[self._topic_positions[topic]]
+        return None
+
+    def _chunk_text(self, ref: int) -> str:
+        start, end = self.chunk_text_offsets[ref], self.chunk_text_offsets[ref + 1]
+        return self.chunk_text_blob[start:end].tobytes().decode('utf-8')
+
+    def lookup(self,
+               topic: str,
+               max_verses: Optional[int] = None,
+               max_chunks: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene los versículos y escritos asociados a un tema.
+
+        Returns:
+            Diccionario con el tema, versículos y escritos ordenados por relevancia,
+            o None si el tema no forma parte del vocabulario
+
+        Raises:
+            ValueError: Si max_verses o max_chunks es menor que 1
+        """
+        for name, limit in (('max_verses', max_verses), ('max_chunks', max_chunks)):
+            if limit is not None and limit < 1:
+                raise ValueError(f"{name} debe ser al menos 1: {limit}")
+
+        position = self._topic_positions.get(normalize_text(topic.strip()))
+        if position is None:
+            return None
+
+        v_start, v_end = self.verse_offsets[position], self.verse_offsets[position + 1]
+        if max_verses is not None:
+            v_end = min(v_end, v_start + max_verses)
+        verses = []
+        for key, score in zip(self.verse_keys[v_start:v_end], self.verse_scores[v_start:v_end]):
+            book, chapter, verse = decode_verse_key(key)
+            verses.append({
+                'reference': format_verse_key(key),
+                'book': book,
+                'chapter': chapter,
+                'verse': verse,
+                'score': float(score)
+            })
+
+        c_start, c_end = self.chunk_offsets[position], self.chunk_offsets[position + 1]
+        if max_chunks is not None:
+            c_end = min(c_end, c_start + max_chunks)
+        writings = []
+        for ref, score in zip(self.chunk_refs[c_start:c_end], self.chunk_scores[c_start:c_end]):
+            source, _, book = self.chunk_books[self.chunk_book_ids[ref]].partition('/')
+            writings.append({
+                'source': source,
+                'book': book,
+                'chunk': int(self.chunk_ids[ref]),
+                'content': self._chunk_text(ref),
+                'score': float(score)
+            })
+
+        return {
+            'topic': self.topics[position],
+            'verses': verses,
+            'writings': writings
+        }
+
+
+# Instancia global
+topical_index = None
+
+
+def get_topical_index(path: str = DEFAULT_INDEX_PATH) -> Optional[TopicalIndex]:
+    """Obtiene el índice temático global; None si aún no se ha construido."""
+    global topical_index
+    if topical_index is None:
+        if not os.path.exists(path):
+            logger.info(f"Índice temático no encontrado en {path}")
+            return None
+        try:
+            topical_index = TopicalIndex.load(path)
+        except Exception as e:
+            logger.error(f"Error cargando índice temático: {str(e)}")
+            return None
+    return topical_index
+
+
+def build_from_sources(path: str = DEFAULT_INDEX_PATH) -> bool:
+    """Construye el índice desde la base de datos bíblica y los índices FAISS."""
+    from app import create_app
+    from models import BibleVerse
+    from Nevin_AI.knowledge_base_manager import KnowledgeBaseManager
+
+    app = create_app()
+    if not app:
+        logger.error("No se pudo crear la aplicación Flask")
+        return False
+
+    with app.app_context():
+        verses = ((v.book, v.chapter, v.verse, v.spanish_text)
+                  for v in BibleVerse.query.yield_per(2000))
+        kb_manager = KnowledgeBaseManager(egw_dir="Nevin_AI/nevin_knowledge")
+        kb_manager.initialize()
+        index = TopicalIndex.build(verses, kb_manager.iter_chunks())
+
+    index.save(path)
+    return True
+
+
+if __name__ == "__main__":
+    if not build_from_sources():
+        exit(1)